@@ -1,13 +1,19 @@
+from datetime import datetime
 from flask import Flask, jsonify, request
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from backend.config import Config
 from backend.db import db, migrate
-from backend.models import CrawledData
-import subprocess
-import os
-import signal
+from backend.jobs import ACTIVE_STATUSES, JobError, JobManager, cancel_job, create_job
+from backend.models import CrawledData, CrawlJob
+from backend.pagination import PaginationError, count_rows, keyset_page, page_args
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from backend.routes.visited_links import visited_links_bp
 from backend.routes.product_links import product_links_bp
+from backend.routes.export import export_bp
+from backend.routes.ingest import ingest_bp
+from backend.routes.metrics import metrics_bp
+from backend.routes.jobs import jobs_bp
 
 app = Flask(__name__)
 
@@ -23,11 +29,33 @@ ADMIN_PASSWORD = "password123"
 app.config.from_object(Config)  # Load Database Config
 app.register_blueprint(visited_links_bp)
 app.register_blueprint(product_links_bp) 
+app.register_blueprint(export_bp)
+app.register_blueprint(ingest_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(jobs_bp)
 db.init_app(app)
 migrate.init_app(app, db)
 
-# Store the Scrapy process
-scrapy_process = None
+# Crawls are queued in crawl_jobs and run by the job manager's worker pool
+job_manager = JobManager.from_app(app)
+
+
+@app.before_request
+def start_job_dispatcher():
+    if app.config["CRAWL_JOB_DISPATCHER"]:
+        job_manager.ensure_started()
+
+
+@app.cli.command("backfill-created-at")
+def backfill_created_at():
+    """Fill NULL created_at values, which keyset pagination no longer allows; run before `flask db upgrade`."""
+    for table in ("crawled_data", "product_links", "crawl_jobs"):
+        # The epoch keeps undated rows at the end of the newest-first listings, where NULLS LAST had them
+        result = db.session.execute(text(
+            f"UPDATE {table} SET created_at = :epoch WHERE created_at IS NULL"
+        ), {"epoch": datetime(1970, 1, 1)})
+        print(f"✅ {table}: backfilled {result.rowcount} rows")
+    db.session.commit()
 
 
 @app.route("/")
@@ -74,89 +102,98 @@ def add_data():
     )
     
     db.session.add(new_entry)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"error": "URL already exists"}), 409
     
     return jsonify({"message": "Data added successfully"}), 201
 
 @app.route("/get_data", methods=["GET"])
 @jwt_required()
 def get_data():
-    """API to fetch all crawled data"""
+    """API to fetch crawled data, newest first. Pass next_cursor back as ?cursor= for the next page."""
     domain_filter = request.args.get("domain")  # Optional domain filter
-    page = request.args.get("page", default=1, type=int)  # Pagination
-    limit = request.args.get("limit", default=10, type=int)
-
-    query = CrawledData.query
+    try:
+        limit, cursor, count_mode = page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Only the listed columns; content can be large, fetch it per page with ?include_content=1
+    columns = [
+        CrawledData.created_at, CrawledData.id, CrawledData.domain,
+        CrawledData.url, CrawledData.title, CrawledData.status_code,
+    ]
+    include_content = request.args.get("include_content", default=0, type=int)
+    if include_content:
+        columns.append(CrawledData.content)
+    query = CrawledData.query.with_entities(*columns)
 
     if domain_filter:
         query = query.filter(CrawledData.domain == domain_filter)
 
-    data = query.paginate(page=page, per_page=limit, error_out=False)
+    try:
+        rows, next_cursor = keyset_page(query, CrawledData, limit, cursor)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
 
-    result = [
-        {
+    result = []
+    for entry in rows:
+        row = {
             "id": entry.id,
             "domain": entry.domain,
             "url": entry.url,
             "title": entry.title,
-            "content": entry.content,
             "status_code": entry.status_code,
             "created_at": entry.created_at
         }
-        for entry in data.items
-    ]
-    
+        if include_content:
+            row["content"] = entry.content
+        result.append(row)
+
     return jsonify({
-        "total": data.total,
-        "page": page,
+        "total": count_rows(query, CrawledData, count_mode),
         "limit": limit,
+        "next_cursor": next_cursor,
         "results": result
     })
 
 @app.route("/start-crawler", methods=["POST"])
 @jwt_required()
 def start_crawler():
-    """Start the Scrapy crawler via API"""
+    """Queue a crawl job (same body as POST /jobs); it runs alongside any other jobs."""
 
     unauthorized = admin_required()
     if unauthorized:
         return unauthorized
 
-    global scrapy_process
-
-    # Prevent multiple instances from running
-    if scrapy_process and scrapy_process.poll() is None:
-        return jsonify({"error": "Crawler is already running!"}), 400
-    
-    data = request.json
-    domains = data.get("domains", [])
-
-    if not domains or not isinstance(domains, list):
-        return jsonify({"error": "Invalid input. Provide a list of domains."}), 400
-    
-    domains_str = ",".join(domains)
-
+    data = request.get_json(silent=True) or {}
     try:
-        # Start the crawler in a background process with domains
-        scrapy_process = subprocess.Popen(["scrapy", "crawl", "product_spider", "-a", f"domains={domains_str}"])
-        return jsonify({"message": "Crawler started successfully!", "domains": domains}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        job = create_job(data, app.config["CRAWL_MAX_WORKERS"])
+    except JobError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"message": "Crawl job queued", "job_id": job.id, "domains": job.domains}), 200
 
 
 @app.route("/stop-crawler", methods=["POST"])
 @jwt_required()
 def stop_crawler():
-    """Stop the Scrapy crawler if running"""
+    """Cancel one job ({"job_id": N}) or, without a body, every pending and running job"""
     unauthorized = admin_required()
     if unauthorized:
         return unauthorized
-    
-    global scrapy_process
-    if scrapy_process and scrapy_process.poll() is None:
-        os.kill(scrapy_process.pid, signal.SIGTERM)  # Gracefully terminate
-        return jsonify({"message": "Crawler stopped successfully"}), 200
+
+    data = request.get_json(silent=True) or {}
+    if "job_id" in data:
+        if isinstance(data["job_id"], bool) or not isinstance(data["job_id"], int):
+            return jsonify({"error": "job_id must be an integer"}), 400
+        job_ids = [data["job_id"]]
     else:
+        job_ids = [job.id for job in CrawlJob.query.filter(CrawlJob.status.in_(ACTIVE_STATUSES))]
+    cancelled = [job.id for job in map(cancel_job, job_ids) if job is not None and job.status in ("cancelled", "running")]
+    if not cancelled:
         return jsonify({"error": "No running crawler process"}), 400
+    return jsonify({"message": "Crawler stop requested", "job_ids": cancelled}), 200
 if __name__ == "__main__":
     app.run(debug=False, port=5000)
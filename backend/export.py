@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from backend.db import db
+from backend.models import PRODUCT_SOURCES, CrawledData, ProductLinks
+
+FORMATS = ("ndjson", "csv")
+FETCH_SIZE = 5000  # Rows per round-trip of the server-side cursor
+
+# Export name -> (model, exported columns)
+EXPORTS = {
+    "product-links": (
+        ProductLinks,
+        ("id", "domain", "url", "source", "name", "price", "currency", "availability", "confirmed_at", "created_at"),
+    ),
+    "visited-links": (CrawledData, ("id", "domain", "url", "title", "status_code", "created_at")),
+}
+
+
+class ExportError(ValueError):
+    """Raised for an unknown export, format or malformed filter."""
+
+
+def parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError as e:
+        raise ExportError(f"Invalid timestamp: {value}") from e
+
+
+def check_source(name, source):
+    if source and name != "product-links":
+        raise ExportError("source only applies to the product-links export")
+    if source and source not in PRODUCT_SOURCES:
+        raise ExportError(f"source must be one of {', '.join(PRODUCT_SOURCES)}")
+
+
+def iter_rows(name, domain=None, since=None, until=None, source=None):
+    """
+    Yield batches of row tuples from a server-side cursor, in id order.
+
+    Like the product-links listing, product links that structured data rejected
+    are left out unless ``source`` is "rejected" or "all".
+    """
+    if name not in EXPORTS:
+        raise ExportError(f"Unknown export: {name}")
+    check_source(name, source)
+    model, columns = EXPORTS[name]
+
+    query = select(*(getattr(model, column) for column in columns)).order_by(model.id)
+    if domain:
+        query = query.where(model.domain == domain)
+    if since:
+        query = query.where(model.created_at >= since)
+    if until:
+        query = query.where(model.created_at < until)
+    if name == "product-links":
+        if not source:
+            query = query.where(model.source != "rejected")
+        elif source != "all":
+            query = query.where(model.source == source)
+
+    # yield_per streams through a named (server-side) cursor on PostgreSQL
+    result = db.session.execute(query.execution_options(yield_per=FETCH_SIZE))
+    for batch in result.partitions():
+        yield batch
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def iter_export(name, fmt="ndjson", domain=None, since=None, until=None, source=None, compress=False):
+    """
+    Stream an export as byte chunks, one chunk per cursor batch.
+
+    Memory stays bounded by FETCH_SIZE rows whatever the table size, so the
+    export runs at disk / network speed. ``compress`` gzips the stream on the fly.
+    """
+    # Validate eagerly, so callers can still answer with an error before streaming starts
+    if name not in EXPORTS:
+        raise ExportError(f"Unknown export: {name}")
+    if fmt not in FORMATS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    check_source(name, source)
+    return _stream(name, fmt, iter_rows(name, domain, since, until, source), compress)
+
+
+def _stream(name, fmt, rows, compress):
+    _, columns = EXPORTS[name]
+    gzipper = zlib.compressobj(wbits=31) if compress else None  # wbits=31: gzip container
+
+    def encode(text):
+        data = text.encode("utf-8")
+        return gzipper.compress(data) if gzipper else data
+
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        yield encode(buffer.getvalue())
+        for batch in rows:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(
+                [value.isoformat() if isinstance(value, datetime) else value for value in row] for row in batch
+            )
+            yield encode(buffer.getvalue())
+    else:
+        for batch in rows:
+            lines = (json.dumps(dict(zip(columns, row)), default=_json_default) for row in batch)
+            yield encode("\n".join(lines) + "\n")
+
+    if gzipper:
+        yield gzipper.flush()
@@ -0,0 +1,237 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from urllib.parse import urlparse
+
+import psycopg2
+
+from backend.db import db
+
+BATCH_SIZE = 5000
+MAX_ERRORS = 100  # Rejection details returned per request; counts are always complete
+READ_SIZE = 64 * 1024
+MAX_RECORD_SIZE = 16 * 1024 * 1024  # Characters buffered for one array element before the body is refused
+
+COLUMNS = ("domain", "url", "title", "content", "status_code", "created_at")
+MAX_LENGTHS = {"domain": 255, "url": 500, "title": 255}
+
+# One staging table per connection; rows are emptied after every batch's commit
+CREATE_STAGING = """
+    CREATE TEMP TABLE IF NOT EXISTS crawled_data_staging (
+        domain VARCHAR(255), url VARCHAR(500), title VARCHAR(255),
+        content TEXT, status_code INTEGER, created_at TIMESTAMP
+    ) ON COMMIT DELETE ROWS
+"""
+COPY_STAGING = f"COPY crawled_data_staging ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+# DISTINCT ON drops repeats inside the batch; xmax = 0 tells inserted rows from updated ones
+MERGE_SKIP = f"""
+    INSERT INTO crawled_data ({', '.join(COLUMNS)})
+    SELECT DISTINCT ON (url) {', '.join(COLUMNS)} FROM crawled_data_staging ORDER BY url
+    ON CONFLICT (url) DO NOTHING
+    RETURNING TRUE
+"""
+MERGE_UPDATE = f"""
+    INSERT INTO crawled_data ({', '.join(COLUMNS)})
+    SELECT DISTINCT ON (url) {', '.join(COLUMNS)} FROM crawled_data_staging ORDER BY url
+    ON CONFLICT (url) DO UPDATE SET
+        title = COALESCE(EXCLUDED.title, crawled_data.title),
+        content = COALESCE(EXCLUDED.content, crawled_data.content),
+        status_code = COALESCE(EXCLUDED.status_code, crawled_data.status_code)
+    RETURNING (xmax = 0)
+"""
+
+
+class IngestError(ValueError):
+    """Raised when the request body cannot be read as NDJSON or a JSON array."""
+
+
+def iter_ndjson(stream):
+    """Yield (line number, record or parse error) for each non-empty line."""
+    for number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line)
+        except ValueError as e:
+            yield number, e
+
+
+def iter_json_array(stream):
+    """Yield (index, record) from a top-level JSON array without loading the whole body."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()  # Chunks may split a multi-byte character
+    buffer = ""
+    started = False
+    index = 0
+    eof = False
+    while True:
+        # Skip whitespace and separators up to the next value
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer and not eof:
+                chunk = stream.read(READ_SIZE)
+                eof = not chunk
+                buffer += utf8.decode(chunk, final=eof)
+                continue
+            if not buffer.startswith("["):
+                raise IngestError("Body must be a JSON array or NDJSON")
+            buffer, started = buffer[1:], True
+            continue
+        if buffer.startswith(","):
+            buffer = buffer[1:]
+            continue
+        if buffer.startswith("]"):
+            return
+        try:
+            record, end = decoder.raw_decode(buffer)
+        except ValueError as e:
+            # The value may continue in the next chunk, unless the error is well before the end of what was read
+            truncated = e.pos >= len(buffer) - 10 or e.msg.startswith("Unterminated string")
+            if eof or not truncated:
+                raise IngestError(f"Malformed JSON array near record {index}: {e.msg}")
+            if len(buffer) > MAX_RECORD_SIZE:
+                raise IngestError(f"Record {index} is larger than {MAX_RECORD_SIZE} characters")
+            chunk = stream.read(READ_SIZE)
+            eof = not chunk
+            buffer += utf8.decode(chunk, final=eof)
+            continue
+        yield index, record
+        index += 1
+        buffer = buffer[end:]
+
+
+def validate(record):
+    """Return a row tuple for COPY, or raise ValueError with the reason."""
+    if not isinstance(record, dict):
+        raise ValueError("record must be an object")
+    url = record.get("url")
+    if not isinstance(url, str) or not url.strip():
+        raise ValueError("url is required")
+    url = url.strip()
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.netloc:
+        raise ValueError("url must be an absolute http(s) URL")
+    domain = record.get("domain") or parsed.netloc
+
+    row = {
+        "domain": domain,
+        "url": url,
+        "title": record.get("title"),
+        "content": record.get("content"),
+        "status_code": record.get("status_code"),
+        "created_at": record.get("created_at"),
+    }
+    for field in ("domain", "title", "content"):
+        if row[field] is not None and not isinstance(row[field], str):
+            raise ValueError(f"{field} must be a string")
+    for field, limit in MAX_LENGTHS.items():
+        if row[field] is not None and len(row[field]) > limit:
+            raise ValueError(f"{field} longer than {limit} characters")
+    if row["status_code"] is not None and (isinstance(row["status_code"], bool) or not isinstance(row["status_code"], int)):
+        raise ValueError("status_code must be an integer")
+    if row["created_at"] is None:
+        row["created_at"] = datetime.utcnow().isoformat()
+    else:
+        try:
+            row["created_at"] = datetime.fromisoformat(row["created_at"]).isoformat()
+        except (TypeError, ValueError):
+            raise ValueError("created_at must be an ISO timestamp")
+    return tuple(row[column] for column in COLUMNS)
+
+
+def _csv_value(value):
+    # COPY's csv format reads an empty field as NULL
+    return "" if value is None else value
+
+
+class BulkIngester:
+    """
+    Streams records into crawled_data in batches: validate, COPY into a temp
+    staging table, then one INSERT ... SELECT ... ON CONFLICT per batch. Each
+    batch is its own transaction and reports accepted / duplicate / rejected.
+    ``update=True`` merges title, content and status_code into existing rows
+    (they still count as duplicates).
+
+    A batch the database refuses stops the load: batches committed before it
+    stay, its number is reported as ``failed_batch``, and ``retryable`` tells a
+    server-side failure (retry from that batch) from data PostgreSQL rejected.
+    """
+
+    def __init__(self, update=False, batch_size=BATCH_SIZE):
+        self.update = update
+        self.batch_size = batch_size
+
+    def ingest(self, records):
+        """Consume (position, record) pairs; return the per-batch and total counts."""
+        summary = {
+            "accepted": 0, "duplicate": 0, "rejected": 0, "complete": True,
+            "failed_batch": None, "retryable": False, "batches": [], "errors": [],
+        }
+        conn = None
+        try:
+            conn = db.engine.raw_connection()
+            with conn.cursor() as cursor:
+                cursor.execute(CREATE_STAGING)
+            conn.commit()
+
+            rows, rejected = [], 0
+            try:
+                for position, record in records:
+                    try:
+                        if isinstance(record, Exception):
+                            raise ValueError(f"invalid JSON: {record}")
+                        rows.append(validate(record))
+                    except ValueError as e:
+                        rejected += 1
+                        if len(summary["errors"]) < MAX_ERRORS:
+                            summary["errors"].append({"record": position, "error": str(e)})
+                    if len(rows) + rejected >= self.batch_size:
+                        self._flush(conn, rows, rejected, summary)
+                        rows, rejected = [], 0
+            except IngestError as e:
+                # Unreadable body: keep what was parsed so far and report where it stopped
+                summary["complete"] = False
+                summary["errors"].append({"record": None, "error": str(e)})
+            if rows or rejected:
+                self._flush(conn, rows, rejected, summary)
+        except Exception as e:
+            # The database failed a batch (or the connection): report the batches committed before it
+            summary["complete"] = False
+            summary["failed_batch"] = len(summary["batches"]) + 1
+            summary["retryable"] = not isinstance(e, psycopg2.DataError)
+            summary["errors"].append({"record": None, "error": f"batch {summary['failed_batch']} failed: {e}"})
+        finally:
+            if conn is not None:
+                conn.close()
+        return summary
+
+    def _flush(self, conn, rows, rejected, summary):
+        inserted = duplicate = 0
+        if rows:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows([_csv_value(v) for v in row] for row in rows)
+            buffer.seek(0)
+            try:
+                with conn.cursor() as cursor:
+                    cursor.copy_expert(COPY_STAGING, buffer)
+                    cursor.execute(MERGE_UPDATE if self.update else MERGE_SKIP)
+                    inserted = sum(1 for (is_insert,) in cursor.fetchall() if is_insert)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            duplicate = len(rows) - inserted
+
+        summary["batches"].append({
+            "batch": len(summary["batches"]) + 1,
+            "accepted": inserted,
+            "duplicate": duplicate,
+            "rejected": rejected,
+        })
+        summary["accepted"] += inserted
+        summary["duplicate"] += duplicate
+        summary["rejected"] += rejected
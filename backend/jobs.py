@@ -0,0 +1,316 @@
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+
+import redis
+from sqlalchemy import text
+
+from backend.db import db
+from backend.models import CrawlJob, ProductLinks
+from product_crawler.utils.canonicalizer import UrlCanonicalizer
+from product_crawler.utils.jobs import job_key_prefix, read_progress
+from product_crawler.utils.url_templates import read_templates
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Where scrapy.cfg lives
+SPIDERS = ("product_spider", "dynamic_spider", "sitemap_spider")
+ACTIVE_STATUSES = ("pending", "running")
+CLAIM_LOCK_ID = 0x6A6F6273  # pg_advisory_xact_lock key serializing claims across API processes
+PRODUCT_MILESTONES = (10, 100, 1000)
+MAX_PRODUCT_MILESTONE = 100_000
+TEMPLATE_STATUSES = ("product", "capped", "learning", "productive", "low_yield")
+
+
+class JobError(ValueError):
+    """Raised when a crawl job request is invalid."""
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by someone else
+    return True
+
+
+def redis_client(config):
+    return redis.Redis(host=config["REDIS_HOST"], port=config["REDIS_PORT"], db=0, decode_responses=True)
+
+
+def job_progress(job, config):
+    """Live progress of a running job from its Redis namespace; the stored one once it is over."""
+    if job.status != "running":
+        return job.progress
+    try:
+        return read_progress(redis_client(config), job_key_prefix(job.id), config["FRONTIER_QUEUE_NAME"])
+    except redis.RedisError as e:
+        return {"error": str(e)}
+
+
+def job_templates(job, config):
+    """
+    URL templates of a job with their admission counts, product yield and budget
+    status, plus per-status totals: where the job's crawl budget went. Read from
+    the job's Redis namespace, which outlives the job.
+    """
+    policy, templates = read_templates(redis_client(config), f"{job_key_prefix(job.id)}templates")
+    totals = {}
+    for row in templates:
+        total = totals.setdefault(row["status"], {"templates": 0, "admitted": 0, "pages": 0, "found": 0, "dropped": 0})
+        total["templates"] += 1
+        for field in ("admitted", "pages", "found", "dropped"):
+            total[field] += row[field]
+    return policy, templates, totals
+
+
+def time_to_first_products(job, milestones=PRODUCT_MILESTONES):
+    """
+    Seconds from a job's start until the Nth product link it stored, for each milestone N
+    (None while not reached). Only product links new to product_links count: URLs known
+    from earlier crawls are not stored again.
+    """
+    seconds = {n: None for n in milestones}
+    if job.started_at is None or not milestones:
+        return seconds
+    # product_links.domain is the host of the canonical URL, as the spider stores it
+    canonicalizer = UrlCanonicalizer()
+    domains = sorted({
+        urlparse(canonicalizer.canonicalize(d if "://" in d else f"http://{d}").url).netloc for d in job.domains
+    })
+    query = ProductLinks.query.with_entities(ProductLinks.created_at).filter(
+        ProductLinks.domain.in_(domains), ProductLinks.created_at >= job.started_at,
+        ProductLinks.source != "rejected",  # Pages whose structured data says they are not products
+    )
+    if job.finished_at is not None:
+        query = query.filter(ProductLinks.created_at <= job.finished_at)
+    times = [row.created_at for row in query.order_by(ProductLinks.created_at, ProductLinks.id).limit(max(milestones))]
+    for n in milestones:
+        if len(times) >= n:
+            seconds[n] = (times[n - 1] - job.started_at).total_seconds()
+    return seconds
+
+
+def create_job(data, max_workers):
+    """Validate an API request body and queue the job it describes."""
+    domains = data.get("domains")
+    if not domains or not isinstance(domains, list) or not all(isinstance(d, str) and d.strip() for d in domains):
+        raise JobError("Invalid input. Provide a list of domains.")
+    spider = data.get("spider", "product_spider")
+    if spider not in SPIDERS:
+        raise JobError(f"spider must be one of {', '.join(SPIDERS)}")
+    workers = data.get("workers", 1)
+    if isinstance(workers, bool) or not isinstance(workers, int) or not 1 <= workers <= max_workers:
+        raise JobError(f"workers must be an integer between 1 and {max_workers}")
+
+    job = CrawlJob(
+        spider=spider,
+        domains=[d.strip() for d in domains],
+        workers=workers,
+        incremental=bool(data.get("incremental", False)),
+        status="pending",
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def cancel_job(job_id):
+    """Cancel a job: a pending one at once, a running one when a dispatcher signals its workers."""
+    job = CrawlJob.query.filter_by(id=job_id).with_for_update().first()
+    if job is None:
+        return None
+    if job.status == "pending":
+        job.status = "cancelled"
+        job.finished_at = datetime.utcnow()
+    elif job.status == "running" and job.cancel_requested_at is None:
+        job.cancel_requested_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+
+class JobManager:
+    """
+    Runs queued crawl jobs as Scrapy worker processes, up to ``max_workers`` at once on this machine.
+
+    Every tick (``poll_interval`` seconds) the dispatcher:
+
+    - records jobs whose workers exited (completed, failed or cancelled);
+    - signals the workers of jobs with a pending cancel (SIGTERM, then SIGKILL after ``kill_timeout``);
+    - starts the oldest pending jobs while their workers fit in the free slots.
+
+    Job state lives in the crawl_jobs table, so several API processes can share the
+    queue: claims are serialized with a PostgreSQL advisory lock. Workers run in their
+    own session and survive an API restart; the next dispatcher on the host adopts
+    them by PID. Each job's workers share its Redis namespace (``job:<id>:``).
+    """
+
+    def __init__(self, app, max_workers=1, poll_interval=2.0, kill_timeout=60.0, log_dir="logs"):
+        self.app = app
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self.kill_timeout = kill_timeout
+        self.log_dir = log_dir if os.path.isabs(log_dir) else os.path.join(PROJECT_DIR, log_dir)
+        self.host = socket.gethostname()
+        self.processes = {}  # job id -> [Popen] started by this dispatcher
+        self.terminated = set()  # Job ids whose workers already got SIGTERM
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    @classmethod
+    def from_app(cls, app):
+        config = app.config
+        return cls(
+            app,
+            max_workers=config["CRAWL_MAX_WORKERS"],
+            poll_interval=config["CRAWL_JOB_POLL_INTERVAL"],
+            kill_timeout=config["CRAWL_JOB_KILL_TIMEOUT"],
+            log_dir=config["CRAWL_JOB_LOG_DIR"],
+        )
+
+    def ensure_started(self):
+        """Start the dispatcher thread once; cheap enough to call on every request."""
+        if self.thread is not None:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run_forever, name="crawl-job-dispatcher", daemon=True)
+                self.thread.start()
+
+    def run_forever(self):
+        logger.info(f"🧵 Crawl job dispatcher running on {self.host} with {self.max_workers} worker slots")
+        while not self.stopping.is_set():
+            with self.app.app_context():
+                try:
+                    self.tick()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("❌ Crawl job dispatcher tick failed")
+            self.stopping.wait(self.poll_interval)
+
+    def tick(self):
+        self.reap()
+        self.signal_cancelled()
+        self.dispatch()
+
+    def running_here(self):
+        return CrawlJob.query.filter_by(status="running", host=self.host).all()
+
+    def reap(self):
+        """Finish running jobs whose workers have all exited."""
+        for job in self.running_here():
+            processes = self.processes.get(job.id)
+            if processes is not None:
+                exit_codes = [process.poll() for process in processes]
+                if any(code is None for code in exit_codes):
+                    continue
+            elif any(pid_alive(pid) for pid in job.pids or []):
+                continue  # Adopted from an earlier dispatcher; no exit codes to read
+            else:
+                exit_codes = None
+            self.finish(job, exit_codes)
+            self.processes.pop(job.id, None)
+            self.terminated.discard(job.id)
+
+    def finish(self, job, exit_codes):
+        config = self.app.config
+        try:
+            job.progress = read_progress(redis_client(config), job_key_prefix(job.id), config["FRONTIER_QUEUE_NAME"])
+        except redis.RedisError as e:
+            logger.warning(f"⚠️ Could not read final progress of job {job.id}: {e}")
+        job.exit_codes = exit_codes
+        job.finished_at = datetime.utcnow()
+        if job.cancel_requested_at is not None:
+            job.status = "cancelled"
+        elif exit_codes is not None:
+            job.status = "completed" if all(code == 0 for code in exit_codes) else "failed"
+            if job.status == "failed":
+                job.error = f"Worker exit codes: {exit_codes}"
+        elif job.progress and not job.progress["frontier_depth"] and not job.progress["in_flight"]:
+            job.status = "completed"  # Exited while no dispatcher watched, but the frontier is drained
+        else:
+            job.status = "failed"
+            job.error = "Workers exited while no dispatcher was watching and the frontier is not drained"
+        db.session.commit()
+        logger.info(f"🏁 Crawl job {job.id} {job.status}")
+
+    def signal_cancelled(self):
+        now = datetime.utcnow()
+        for job in self.running_here():
+            if job.cancel_requested_at is None:
+                continue
+            if job.id not in self.terminated:
+                sig = signal.SIGTERM  # Scrapy shuts down gracefully on the first one
+                self.terminated.add(job.id)
+            elif (now - job.cancel_requested_at).total_seconds() > self.kill_timeout:
+                sig = signal.SIGKILL
+            else:
+                continue
+            for pid in job.pids or []:
+                try:
+                    os.kill(pid, sig)
+                except ProcessLookupError:
+                    pass
+
+    def dispatch(self):
+        """Start pending jobs, oldest first, while their workers fit in the free slots."""
+        while True:
+            if db.engine.dialect.name == "postgresql":
+                db.session.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": CLAIM_LOCK_ID})
+            busy = sum(job.workers for job in self.running_here())
+            job = (
+                CrawlJob.query.filter_by(status="pending")
+                .order_by(CrawlJob.id)
+                .with_for_update(skip_locked=True)
+                .first()
+            )
+            if job is None or job.workers > self.max_workers - busy:
+                db.session.rollback()  # Releases the advisory lock
+                return
+            try:
+                processes = self.spawn(job)
+            except OSError as e:
+                job.status = "failed"
+                job.error = f"Could not start workers: {e}"
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                continue
+            self.processes[job.id] = processes
+            job.status = "running"
+            job.host = self.host
+            job.pids = [process.pid for process in processes]
+            job.started_at = datetime.utcnow()
+            db.session.commit()
+            logger.info(f"🚀 Crawl job {job.id} started {len(processes)} {job.spider} workers: {job.pids}")
+
+    def spawn(self, job):
+        os.makedirs(self.log_dir, exist_ok=True)
+        command = [
+            sys.executable, "-m", "scrapy", "crawl", job.spider,
+            "-a", f"domains={','.join(job.domains)}",
+            "-a", f"job_id={job.id}",
+        ]
+        if job.incremental:
+            command += ["-a", "incremental=1"]
+        processes = []
+        try:
+            for n in range(job.workers):
+                with open(os.path.join(self.log_dir, f"job-{job.id}-{n}.log"), "ab") as log:
+                    processes.append(subprocess.Popen(
+                        command, cwd=PROJECT_DIR, stdout=log, stderr=subprocess.STDOUT,
+                        start_new_session=True,  # Keep running through an API restart or Ctrl-C
+                    ))
+        except OSError:
+            for process in processes:
+                process.kill()
+            raise
+        return processes
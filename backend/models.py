@@ -1,8 +1,15 @@
 from backend.db import db
 from datetime import datetime
+from sqlalchemy import func
 
 class CrawledData(db.Model):
     __tablename__ = "crawled_data"
+    # Keyset pagination walks (created_at, id) backwards, optionally within one domain. created_at is
+    # NOT NULL so the walk is a plain index range scan (run `flask backfill-created-at` before upgrading)
+    __table_args__ = (
+        db.Index("ix_crawled_data_created_at_id", "created_at", "id"),
+        db.Index("ix_crawled_data_domain_created_at_id", "domain", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     domain = db.Column(db.String(255), nullable=False)
@@ -10,12 +17,60 @@ class CrawledData(db.Model):
     title = db.Column(db.String(255))
     content = db.Column(db.Text)
     status_code = db.Column(db.Integer)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+    # Incremental recrawl state
+    etag = db.Column(db.String(255))
+    last_modified = db.Column(db.String(64))
+    content_hash = db.Column(db.String(64))
+    last_crawled_at = db.Column(db.DateTime)
+    next_crawl_at = db.Column(db.DateTime, index=True)
+    crawl_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    change_count = db.Column(db.Integer, nullable=False, default=0, server_default="0")
 
 class ProductLinks(db.Model):
     __tablename__ = "product_links"
+    __table_args__ = (
+        db.Index("ix_product_links_created_at_id", "created_at", "id"),
+        db.Index("ix_product_links_domain_created_at_id", "domain", "created_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     domain = db.Column(db.String(255), nullable=False)
     url = db.Column(db.String(500), unique=True, nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+    # How the link was judged a product: "url" (URL rules only), "json-ld", "microdata", "opengraph",
+    # or "rejected" when the page's structured data describes something else
+    source = db.Column(db.String(16), nullable=False, default="url", server_default="url")
+    name = db.Column(db.String(500))
+    price = db.Column(db.Numeric(12, 2))
+    currency = db.Column(db.String(3))
+    availability = db.Column(db.String(32))
+    confirmed_at = db.Column(db.DateTime)
+
+# ?source= values of the product-links listing and export: a ProductLinks.source, or "all".
+# Without one, rejected links are left out
+PRODUCT_SOURCES = ("url", "json-ld", "microdata", "opengraph", "rejected", "all")
+
+class CrawlJob(db.Model):
+    """A crawl requested through the API, run by the job manager in backend/jobs.py."""
+    __tablename__ = "crawl_jobs"
+    __table_args__ = (
+        db.Index("ix_crawl_jobs_created_at_id", "created_at", "id"),
+        db.Index("ix_crawl_jobs_status_host", "status", "host"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    spider = db.Column(db.String(64), nullable=False, default="product_spider")
+    domains = db.Column(db.JSON, nullable=False)
+    workers = db.Column(db.Integer, nullable=False, default=1)  # Scrapy processes sharing the job's frontier
+    incremental = db.Column(db.Boolean, nullable=False, default=False)
+    status = db.Column(db.String(16), nullable=False, default="pending")  # pending, running, completed, failed, cancelled
+    host = db.Column(db.String(255))  # Machine running the workers
+    pids = db.Column(db.JSON)
+    exit_codes = db.Column(db.JSON)
+    error = db.Column(db.Text)
+    progress = db.Column(db.JSON)  # Last progress read from Redis, kept once the job is over
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, server_default=func.now())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    cancel_requested_at = db.Column(db.DateTime)
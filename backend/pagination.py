@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import func, text, tuple_
+
+from backend.db import db
+
+MAX_LIMIT = 1000
+COUNT_MODES = ("none", "estimate", "exact")
+
+
+class PaginationError(ValueError):
+    """Raised for a malformed cursor or unknown count mode; routes answer it with a 400."""
+
+
+def encode_cursor(created_at, row_id):
+    payload = json.dumps([created_at.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise PaginationError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(query, model, limit, cursor=None):
+    """
+    Return (rows, next_cursor) for one page ordered by (created_at, id), newest first.
+
+    The query must select ``created_at`` and ``id`` (any other columns may follow).
+    created_at is NOT NULL, so the row-value predicate and the DESC, DESC order are
+    a backward range scan of the (created_at, id) indexes: page 10,000 costs the
+    same as page 1.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < (created_at, row_id))
+
+    # Fetch one extra row to learn whether another page follows
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def count_rows(query, model, mode):
+    """
+    Total for a listing, or None. ``exact`` runs COUNT(*); ``estimate`` reads the
+    planner's row estimate (pg_class.reltuples for the whole table, EXPLAIN for a
+    filtered query), which is instant but approximate.
+    """
+    if mode == "none":
+        return None
+    if mode == "exact":
+        return query.order_by(None).count()
+
+    if query.whereclause is None:
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {"table": model.__tablename__},
+        ).scalar()
+        if estimate is not None and estimate >= 0:  # -1 until the table has been analyzed
+            return estimate
+
+    statement = query.with_entities(func.count()).order_by(None).statement
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True})
+    plan = db.session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    # The count aggregate sits on top; its input node carries the row estimate
+    node = plan[0]["Plan"]
+    return int(node["Plans"][0]["Plan Rows"] if node.get("Plans") else node["Plan Rows"])
+
+
+def page_args(args, default_limit=10):
+    """Read limit / cursor / count from the query string."""
+    limit = max(1, min(args.get("limit", default=default_limit, type=int), MAX_LIMIT))
+    count_mode = args.get("count", default="none")
+    if count_mode not in COUNT_MODES:
+        raise PaginationError(f"count must be one of {', '.join(COUNT_MODES)}")
+    return limit, args.get("cursor"), count_mode
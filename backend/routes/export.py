@@ -0,0 +1,76 @@
+import click
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.export import EXPORTS, FORMATS, ExportError, iter_export, parse_timestamp
+from backend.models import PRODUCT_SOURCES
+
+# cli_group=None puts the export command at the top level: `flask export ...`
+export_bp = Blueprint("export", __name__, cli_group=None)
+
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def admin_required():
+    """Checks if the logged-in user is the admin."""
+    current_user = get_jwt_identity()
+    if current_user != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+
+@export_bp.route("/export/<name>", methods=["GET"])
+@jwt_required()
+def export(name):
+    """
+    Stream every product link or visited link as NDJSON or CSV, optionally gzipped.
+
+    Query parameters: format=ndjson|csv, gzip=1, domain, since / until (ISO created_at range),
+    source (product links only; rejected links are left out unless source=rejected or all).
+    """
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    fmt = request.args.get("format", default="ndjson")
+    compress = request.args.get("gzip", default=0, type=int) == 1
+    try:
+        chunks = iter_export(
+            name,
+            fmt,
+            domain=request.args.get("domain"),
+            since=parse_timestamp(request.args.get("since")),
+            until=parse_timestamp(request.args.get("until")),
+            source=request.args.get("source"),
+            compress=compress,
+        )
+    except ExportError as e:
+        return jsonify({"error": str(e)}), 400
+
+    filename = f"{name}.{fmt}" + (".gz" if compress else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    mimetype = "application/gzip" if compress else CONTENT_TYPES[fmt]
+    # stream_with_context keeps the DB session open while the cursor is drained
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+
+@export_bp.cli.command("export")
+@click.argument("name", type=click.Choice(sorted(EXPORTS)))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="ndjson", show_default=True)
+@click.option("--gzip", "compress", is_flag=True, help="Gzip the output.")
+@click.option("--domain", help="Only rows of this domain.")
+@click.option("--since", help="Only rows created at or after this ISO timestamp.")
+@click.option("--until", help="Only rows created before this ISO timestamp.")
+@click.option("--source", type=click.Choice(PRODUCT_SOURCES),
+              help="Only product links of this source (default: all but rejected; \"all\" includes them).")
+@click.option("-o", "--output", type=click.File("wb"), default="-", help="Output file (default: stdout).")
+def export_command(name, fmt, compress, domain, since, until, source, output):
+    """Stream product-links or visited-links to a file in constant memory."""
+    try:
+        chunks = iter_export(
+            name, fmt, domain=domain, since=parse_timestamp(since), until=parse_timestamp(until), source=source,
+            compress=compress,
+        )
+    except ExportError as e:
+        raise click.BadParameter(str(e))
+    for chunk in chunks:
+        output.write(chunk)
+    output.flush()
+    click.echo(f"✅ Exported {name}", err=True)
@@ -0,0 +1,43 @@
+from flask import Blueprint, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.ingest import BulkIngester, iter_json_array, iter_ndjson
+
+ingest_bp = Blueprint("ingest", __name__)
+
+
+def admin_required():
+    """Checks if the logged-in user is the admin."""
+    current_user = get_jwt_identity()
+    if current_user != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+
+@ingest_bp.route("/ingest", methods=["POST"])
+@jwt_required()
+def ingest():
+    """
+    Bulk-load crawled data pushed by external crawlers.
+
+    The body is NDJSON (Content-Type: application/x-ndjson) or a JSON array of
+    objects with the /add_data fields. It is read as a stream and loaded in batches;
+    ?on_conflict=update merges into existing URLs instead of skipping them.
+    Unless every batch was loaded, the per-batch reports come back with a 400
+    (unreadable or refused data) or a 500 (database failure at failed_batch).
+    """
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    on_conflict = request.args.get("on_conflict", default="skip")
+    if on_conflict not in ("skip", "update"):
+        return jsonify({"error": "on_conflict must be skip or update"}), 400
+
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        records = iter_ndjson(request.stream)
+    else:
+        records = iter_json_array(request.stream)
+
+    summary = BulkIngester(update=on_conflict == "update").ingest(records)
+    if summary["complete"]:
+        return jsonify(summary), 200
+    # Malformed or rejected input is the client's to fix; a failing database is not
+    return jsonify(summary), 500 if summary["retryable"] else 400
@@ -0,0 +1,220 @@
+import redis
+from flask import Blueprint, current_app, jsonify, request
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from backend.db import db
+from backend.jobs import (
+    MAX_PRODUCT_MILESTONE,
+    PRODUCT_MILESTONES,
+    TEMPLATE_STATUSES,
+    JobError,
+    JobManager,
+    cancel_job,
+    create_job,
+    job_progress,
+    job_templates,
+    time_to_first_products,
+)
+from backend.models import CrawlJob
+from backend.pagination import MAX_LIMIT, PaginationError, count_rows, keyset_page, page_args
+
+# `flask jobs run` runs the dispatcher in its own process
+jobs_bp = Blueprint("jobs", __name__, cli_group="jobs")
+
+
+def admin_required():
+    """Checks if the logged-in user is the admin."""
+    current_user = get_jwt_identity()
+    if current_user != "admin":
+        return jsonify({"error": "Unauthorized"}), 403
+
+
+def serialize_job(job):
+    return {
+        "id": job.id,
+        "spider": job.spider,
+        "domains": job.domains,
+        "workers": job.workers,
+        "incremental": job.incremental,
+        "status": job.status,
+        "host": job.host,
+        "pids": job.pids,
+        "exit_codes": job.exit_codes,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "cancel_requested_at": job.cancel_requested_at,
+    }
+
+
+@jobs_bp.route("/jobs", methods=["POST"])
+@jwt_required()
+def submit_job():
+    """
+    Queue a crawl: {"domains": [...], "spider": "product_spider", "workers": 1, "incremental": false}.
+
+    ``workers`` Scrapy processes share the job's frontier; the job starts as soon
+    as that many worker slots are free on the dispatcher's machine.
+    """
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    try:
+        job = create_job(request.get_json(silent=True) or {}, current_app.config["CRAWL_MAX_WORKERS"])
+    except JobError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(serialize_job(job)), 201
+
+
+@jobs_bp.route("/jobs", methods=["GET"])
+@jwt_required()
+def list_jobs():
+    """Crawl jobs, newest first, optionally filtered by ?status=. Paginated like the link listings."""
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    try:
+        limit, cursor, count_mode = page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    query = CrawlJob.query
+    status = request.args.get("status")
+    if status:
+        query = query.filter(CrawlJob.status == status)
+
+    try:
+        rows, next_cursor = keyset_page(query, CrawlJob, limit, cursor)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "total": count_rows(query, CrawlJob, count_mode),
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "results": [serialize_job(job) for job in rows],
+    })
+
+
+@jobs_bp.route("/jobs/<int:job_id>", methods=["GET"])
+@jwt_required()
+def get_job(job_id):
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    job = db.session.get(CrawlJob, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({**serialize_job(job), "progress": job_progress(job, current_app.config)})
+
+
+@jobs_bp.route("/jobs/<int:job_id>/progress", methods=["GET"])
+@jwt_required()
+def get_job_progress(job_id):
+    """Frontier depth, URLs in flight and pages crawled so far (live while the job runs)."""
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    job = db.session.get(CrawlJob, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"id": job.id, "status": job.status, "progress": job_progress(job, current_app.config)})
+
+
+@jobs_bp.route("/jobs/<int:job_id>/time-to-first-products", methods=["GET"])
+@jwt_required()
+def get_time_to_first_products(job_id):
+    """
+    Seconds from the job's start to its first N product links, for ?n=10,100,1000
+    (the default). Compares crawl orderings run over run on the same shop.
+    """
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    try:
+        milestones = sorted({int(n) for n in request.args["n"].split(",")}) if request.args.get("n") else PRODUCT_MILESTONES
+    except ValueError:
+        return jsonify({"error": "n must be a comma-separated list of integers"}), 400
+    if not all(1 <= n <= MAX_PRODUCT_MILESTONE for n in milestones):
+        return jsonify({"error": f"n must be between 1 and {MAX_PRODUCT_MILESTONE}"}), 400
+
+    job = db.session.get(CrawlJob, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    seconds = time_to_first_products(job, milestones)
+    return jsonify({
+        "id": job.id,
+        "status": job.status,
+        "started_at": job.started_at,
+        "seconds_to_products": {str(n): value for n, value in seconds.items()},
+    })
+
+
+@jobs_bp.route("/jobs/<int:job_id>/templates", methods=["GET"])
+@jwt_required()
+def get_job_templates(job_id):
+    """
+    URL templates of a job (e.g. shop.com/category/*?page) with the URLs each
+    admitted, its product links, pages crawled, new product links found per page
+    and URLs dropped by its budget, most admitted first. Filter with ?status=
+    (product, capped, learning, productive, low_yield) and ?domain=; ?limit=
+    defaults to 100.
+    """
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    status = request.args.get("status")
+    if status and status not in TEMPLATE_STATUSES:
+        return jsonify({"error": f"status must be one of {', '.join(TEMPLATE_STATUSES)}"}), 400
+    limit = max(1, min(request.args.get("limit", default=100, type=int), MAX_LIMIT))
+
+    job = db.session.get(CrawlJob, job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    try:
+        policy, templates, totals = job_templates(job, current_app.config)
+    except redis.RedisError as e:
+        return jsonify({"error": str(e)}), 500
+
+    domain = request.args.get("domain")
+    if domain:
+        templates = [row for row in templates if row["template"].split("/", 1)[0] == domain]
+    if status:
+        templates = [row for row in templates if row["status"] == status]
+    return jsonify({
+        "id": job.id,
+        "status": job.status,
+        "policy": policy,
+        "by_status": totals,
+        "total": len(templates),
+        "limit": limit,
+        "results": templates[:limit],
+    })
+
+
+@jobs_bp.route("/jobs/<int:job_id>/cancel", methods=["POST"])
+@jwt_required()
+def cancel(job_id):
+    """Cancel a pending job, or ask the dispatcher to stop a running one's workers."""
+    unauthorized = admin_required()
+    if unauthorized:
+        return unauthorized
+
+    job = cancel_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status not in ("cancelled", "running"):
+        return jsonify({"error": f"Job is already {job.status}"}), 409
+    return jsonify(serialize_job(job)), 202 if job.status == "running" else 200
+
+
+@jobs_bp.cli.command("run")
+def run_dispatcher():
+    """Run the crawl job dispatcher in the foreground (set CRAWL_JOB_DISPATCHER=0 for the API)."""
+    JobManager.from_app(current_app._get_current_object()).run_forever()
@@ -0,0 +1,39 @@
+import redis
+from flask import Blueprint, Response, current_app, jsonify
+from backend.models import CrawlJob
+from product_crawler.utils.jobs import job_key_prefix
+from product_crawler.utils.metrics import load_snapshots, render_prometheus
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+def redis_client():
+    config = current_app.config
+    return redis.Redis(host=config["REDIS_HOST"], port=config["REDIS_PORT"], db=0, decode_responses=True)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Crawl metrics for Prometheus: every live worker's snapshot (stage latency
+    histograms, pages per domain, Redis / DB round-trips, Playwright pages) plus
+    the frontier depth, for crawls started by hand and for each running job
+    (every series of a job labelled job="<id>"). Left unauthenticated so scrapers need no token.
+    """
+    namespaces = [({}, "")] + [
+        ({"job": str(job.id)}, job_key_prefix(job.id))
+        for job in CrawlJob.query.filter_by(status="running").with_entities(CrawlJob.id)
+    ]
+    try:
+        client = redis_client()
+        snapshots, gauges = [], []
+        for labels, key_prefix in namespaces:
+            queue = f"{key_prefix}{current_app.config['FRONTIER_QUEUE_NAME']}"
+            snapshots += load_snapshots(client, key_prefix, labels)
+            gauges.append(("crawler_frontier_depth", labels, int(client.get(f"{queue}:size") or 0)))
+            gauges.append(("crawler_frontier_leased", labels, client.zcard(f"{queue}:leases")))
+        body = render_prometheus(snapshots, extra_gauges=gauges)
+    except redis.RedisError as e:
+        return jsonify({"error": str(e)}), 500
+
+    return Response(body, content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from backend.models import ProductLinks  # Import the correct model
+from backend.models import PRODUCT_SOURCES, ProductLinks  # Import the correct model
+from backend.pagination import PaginationError, count_rows, keyset_page, page_args
 from backend import db
 
 product_links_bp = Blueprint("product_links", __name__)
@@ -15,19 +16,38 @@ def admin_required():
 @product_links_bp.route("/product-links", methods=["GET"])
 @jwt_required()
 def get_product_links():
-    """API to fetch all stored product links from the database."""
+    """
+    API to fetch stored product links from the database. Links whose page
+    structured data rejected are left out unless ?source=rejected or ?source=all.
+    """
 
     unauthorized = admin_required()
     if unauthorized:
         return unauthorized
 
     try:
-        # Pagination
-        page = request.args.get("page", default=1, type=int)
-        limit = request.args.get("limit", default=10, type=int)
+        # Keyset pagination: pass next_cursor back as ?cursor=; ?count=exact|estimate for a total
+        limit, cursor, count_mode = page_args(request.args)
+
+        source = request.args.get("source")
+        if source and source not in PRODUCT_SOURCES:
+            return jsonify({"error": f"source must be one of {', '.join(PRODUCT_SOURCES)}"}), 400
 
         # Query product links
-        query = ProductLinks.query.paginate(page=page, per_page=limit, error_out=False)
+        query = ProductLinks.query.with_entities(
+            ProductLinks.created_at, ProductLinks.id, ProductLinks.domain, ProductLinks.url,
+            ProductLinks.source, ProductLinks.name, ProductLinks.price, ProductLinks.currency,
+            ProductLinks.availability,
+        )
+        domain_filter = request.args.get("domain")
+        if domain_filter:
+            query = query.filter(ProductLinks.domain == domain_filter)
+        if not source:
+            query = query.filter(ProductLinks.source != "rejected")
+        elif source != "all":
+            query = query.filter(ProductLinks.source == source)
+
+        rows, next_cursor = keyset_page(query, ProductLinks, limit, cursor)
 
         # Convert to JSON
         result = [
@@ -35,17 +55,24 @@ def get_product_links():
                 "id": entry.id,
                 "domain": entry.domain,
                 "url": entry.url,
-                "created_at": entry.created_at.isoformat(),
+                "source": entry.source,
+                "name": entry.name,
+                "price": str(entry.price) if entry.price is not None else None,
+                "currency": entry.currency,
+                "availability": entry.availability,
+                "created_at": entry.created_at.isoformat() if entry.created_at else None,
             }
-            for entry in query.items
+            for entry in rows
         ]
 
         return jsonify({
-            "total": query.total,
-            "page": page,
+            "total": count_rows(query, ProductLinks, count_mode),
             "limit": limit,
+            "next_cursor": next_cursor,
             "results": result
         }), 200
 
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
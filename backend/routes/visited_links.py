@@ -1,6 +1,7 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from backend.models import CrawledData
+from backend.pagination import PaginationError, count_rows, keyset_page, page_args
 from backend import db
 
 visited_links_bp = Blueprint("visited_links", __name__)
@@ -14,35 +15,39 @@ def admin_required():
 @visited_links_bp.route("/visited-links", methods=["GET"])
 @jwt_required()
 def get_visited_links():
-    """Retrieve paginated visited links from PostgreSQL."""
+    """Retrieve visited links from PostgreSQL, newest first, one keyset page at a time."""
 
     unauthorized = admin_required()
     if unauthorized:
         return unauthorized
     
     try:
-        # Get pagination parameters (default: page 1, limit 10)
-        page = request.args.get("page", default=1, type=int)
-        limit = request.args.get("limit", default=10, type=int)
+        # Get pagination parameters (default: first page, limit 10, no total)
+        limit, cursor, count_mode = page_args(request.args)
 
-        # Query visited links with pagination
-        pagination = CrawledData.query.with_entities(
-            CrawledData.url, CrawledData.domain, CrawledData.created_at
-        ).paginate(page=page, per_page=limit, error_out=False)
+        query = CrawledData.query.with_entities(
+            CrawledData.created_at, CrawledData.id, CrawledData.url, CrawledData.domain
+        )
+        domain_filter = request.args.get("domain")
+        if domain_filter:
+            query = query.filter(CrawledData.domain == domain_filter)
 
-        # Convert paginated results to JSON format
+        rows, next_cursor = keyset_page(query, CrawledData, limit, cursor)
+
+        # Convert the page to JSON format
         response = {
-            "total_records": pagination.total,
-            "total_pages": pagination.pages,
-            "current_page": page,
+            "total_records": count_rows(query, CrawledData, count_mode),
             "per_page": limit,
+            "next_cursor": next_cursor,
             "visited_links": [
-                {"url": url, "domain": domain, "created_at": created_at.isoformat()}
-                for url, domain, created_at in pagination.items
+                {"url": row.url, "domain": row.domain, "created_at": row.created_at.isoformat() if row.created_at else None}
+                for row in rows
             ]
         }
 
         return jsonify(response), 200
 
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
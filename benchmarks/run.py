@@ -0,0 +1,281 @@
+"""
+Crawler benchmark: run a spider against the synthetic shop and record throughput.
+
+    python -m benchmarks.run --spider product_spider --products 200 --timeout 120
+    python -m benchmarks.run --redis localhost:6379 --flush --database-url postgresql://...
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+Without ``--redis`` a fakeredis server is started as a stand-in, and without
+``--database-url`` rows go to StatementCountingPipeline, which batches exactly
+like the bulk writer but does not write. Results (pages/s, products per minute,
+seconds to the first 10/100/1000 product links, Redis round-trips and SQL
+statements per page, peak RSS, stage latencies) are written to
+benchmarks/results/ as JSON, one file per run.
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import redis
+
+from benchmarks.shop_server import ShopConfig, add_shop_arguments
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+# Time-to-first-N product links reported per run (crawl ordering shows up here first)
+PRODUCT_MILESTONES = (10, 100, 1000)
+
+# Metrics compared run over run, and whether higher is better
+COMPARED = {
+    "pages_per_second": True,
+    "products_per_minute": True,
+    "seconds_to_100_products": False,
+    "redis_roundtrips_per_page": False,
+    "sql_statements_per_page": False,
+    "peak_rss_mb": False,
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(host, port, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on {host}:{port} after {timeout}s")
+
+
+def start_process(module, *args):
+    """Run a helper module in its own process, so it does not count towards the crawler's RSS."""
+    return subprocess.Popen([sys.executable, "-m", module, *args], stdout=subprocess.DEVNULL)
+
+
+def shop_args(config):
+    args = []
+    for name, value in config.to_dict().items():
+        args += [f"--{name.replace('_', '-')}", str(value)]
+    return args
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def histogram_summary(bounds, value):
+    """Count, mean and bucket-resolution p50 / p95 of a published histogram."""
+    count = value["count"]
+    summary = {"count": count, "mean": value["sum"] / count if count else 0.0}
+    for name, q in (("p50", 0.5), ("p95", 0.95)):
+        seen = 0
+        summary[name] = None
+        for bound, bucket in zip(bounds + [float("inf")], value["counts"]):
+            seen += bucket
+            if count and seen >= q * count:
+                summary[name] = bound
+                break
+    return summary
+
+
+def crawl(args, redis_host, redis_port, seed):
+    """Run one crawl in this process and return (crawler, seconds from open to each product link, Redis round-trips)."""
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    from scrapy.utils.project import get_project_settings
+
+    from product_crawler.items import ProductLinkItem
+    from product_crawler.utils.metrics import CountingConnection
+
+    settings = get_project_settings()
+    settings.setdict({
+        "REDIS_HOST": redis_host,
+        "REDIS_PORT": redis_port,
+        "FRONTIER_HOST_DELAY": 0.0,  # One host: politeness would cap the run at 1 page/s
+        "CONCURRENT_REQUESTS": args.concurrency,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": args.concurrency,
+        "CLOSESPIDER_TIMEOUT": args.timeout,
+        "LOG_LEVEL": args.log_level,
+        "METRICS_PUBLISH_INTERVAL": 60.0,
+        "LINKS_EXPORT_FILE": "",  # The visited-link dump is for real crawls; don't overwrite it from a benchmark
+    }, priority="cmdline")
+    if args.database_url:
+        settings.set("DATABASE_URL", args.database_url, priority="cmdline")
+    else:
+        settings.set("ITEM_PIPELINES", {"benchmarks.standins.StatementCountingPipeline": 300}, priority="cmdline")
+    for override in args.set:
+        name, _, value = override.partition("=")
+        settings.set(name, value, priority="cmdline")
+    if not args.render:
+        settings.set("DOWNLOAD_HANDLERS", {}, priority="cmdline")  # Plain HTTP; no browser needed
+
+    opened_at = None
+    product_times = []
+
+    def spider_opened(spider):
+        nonlocal opened_at
+        opened_at = time.monotonic()
+
+    def count_item(item, response, spider):
+        if isinstance(item, ProductLinkItem):
+            product_times.append(time.monotonic() - opened_at)
+
+    process = CrawlerProcess(settings, install_root_handler=args.log_level != "CRITICAL")
+    crawler = process.create_crawler(args.spider)
+    crawler.signals.connect(spider_opened, signal=signals.spider_opened)
+    crawler.signals.connect(count_item, signal=signals.item_scraped)
+    roundtrips_before = CountingConnection.roundtrips
+    process.crawl(crawler, domains=seed)
+    process.start()
+    return crawler, product_times, CountingConnection.roundtrips - roundtrips_before
+
+
+def summarize(args, shop, crawler, product_times, redis_roundtrips):
+    stats = crawler.stats.get_stats()
+    snapshot = crawler.spider.metrics.snapshot()
+    counters = {}
+    for name, _, value in snapshot["counters"]:
+        counters[name] = counters.get(name, 0) + value
+
+    elapsed = (stats["finish_time"] - stats["start_time"]).total_seconds()
+    products = len(product_times)
+    pages = counters.get("crawler_pages_total", 0)
+    per_page = (lambda total: total / pages if pages else None)
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "spider": args.spider,
+        "render": args.render,
+        "concurrency": args.concurrency,
+        "settings": args.set,
+        "redis": args.redis or "fakeredis",
+        "database": "postgresql" if args.database_url else "statement-counter",
+        "shop": shop.to_dict(),
+        "shop_pages": shop.total_pages(),
+        "shop_products": len(shop.leaves()) * shop.products,
+        "finish_reason": stats.get("finish_reason"),
+        "elapsed_seconds": elapsed,
+        "pages": pages,
+        "pages_per_second": pages / elapsed if elapsed else None,
+        "products": products,
+        "products_per_minute": products / elapsed * 60 if elapsed else None,
+        **{
+            f"seconds_to_{n}_products": product_times[n - 1] if products >= n else None
+            for n in PRODUCT_MILESTONES
+        },
+        "redis_roundtrips": redis_roundtrips,
+        "redis_roundtrips_per_page": per_page(redis_roundtrips),
+        "sql_statements": counters.get("crawler_db_roundtrips_total", 0),
+        "sql_statements_per_page": per_page(counters.get("crawler_db_roundtrips_total", 0)),
+        "peak_rss_mb": peak_rss_mb(),
+        "near_duplicates": stats.get("neardup/duplicates", 0),
+        "near_duplicate_links_skipped": stats.get("neardup/links_skipped", 0),
+        "template_links_dropped": stats.get("templates/dropped_links", 0),
+        "stages": {
+            labels["stage"]: histogram_summary(snapshot["buckets"], value)
+            for _, labels, value in snapshot["histograms"]
+        },
+    }
+
+
+def compare(current, previous):
+    print(f"\n📊 Compared with {previous.get('timestamp')} ({previous.get('commit')}):")
+    for key, higher_is_better in COMPARED.items():
+        old, new = previous.get(key), current.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old * 100
+        better = (change > 0) == higher_is_better
+        marker = "✅" if better or abs(change) < 1 else "⚠️"
+        print(f"  {marker} {key}: {old:.2f} → {new:.2f} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark a spider against the synthetic shop.")
+    parser.add_argument("--spider", default="product_spider")
+    parser.add_argument("--redis", help="host:port of a Redis to use (default: start a fakeredis stand-in)")
+    parser.add_argument("--flush", action="store_true", help="FLUSHDB the given Redis before the run")
+    parser.add_argument("--database-url", help="PostgreSQL to write to (default: count statements only)")
+    parser.add_argument("--render", action="store_true", help="Keep the Playwright download handler")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=int, default=300, help="Stop the crawl after this many seconds")
+    parser.add_argument("--log-level", default="ERROR")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<time>-<spider>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("-s", "--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="Override a crawler setting, e.g. -s FRONTIER_BEST_FIRST=False")
+    add_shop_arguments(parser)
+    args = parser.parse_args()
+
+    shop = ShopConfig.from_args(args)
+    helpers = []
+    try:
+        shop_port = free_port()
+        helpers.append(start_process("benchmarks.shop_server", "--port", str(shop_port), *shop_args(shop)))
+        wait_for_port("127.0.0.1", shop_port)
+
+        if args.redis:
+            redis_host, _, redis_port = args.redis.partition(":")
+            redis_port = int(redis_port or 6379)
+            client = redis.Redis(host=redis_host, port=redis_port)
+            if args.flush:
+                client.flushdb()
+            elif client.dbsize():
+                parser.error(f"Redis at {args.redis} is not empty; pass --flush to clear it")
+        else:
+            redis_host, redis_port = "127.0.0.1", free_port()
+            helpers.append(start_process("benchmarks.standins", "redis", "--port", str(redis_port)))
+            wait_for_port(redis_host, redis_port)
+
+        print(f"🏁 Crawling {shop.total_pages()} pages with {args.spider}...", flush=True)
+        crawler, product_times, roundtrips = crawl(args, redis_host, redis_port, f"http://127.0.0.1:{shop_port}")
+    finally:
+        for helper in helpers:
+            helper.terminate()
+            helper.wait()
+
+    result = summarize(args, shop, crawler, product_times, roundtrips)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{args.spider}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print(
+        f"✅ {result['pages']} pages in {result['elapsed_seconds']:.1f}s "
+        f"({result['pages_per_second']:.1f} pages/s, {result['products_per_minute']:.0f} products/min), "
+        f"{result['redis_roundtrips_per_page'] or 0:.1f} Redis round-trips and "
+        f"{result['sql_statements_per_page'] or 0:.2f} SQL statements per page, "
+        f"peak RSS {result['peak_rss_mb']:.0f} MB"
+    )
+    milestones = [f"{n}: {result[f'seconds_to_{n}_products']:.1f}s" for n in PRODUCT_MILESTONES
+                  if result[f"seconds_to_{n}_products"] is not None]
+    if milestones:
+        print(f"⏱️ First product links after {', '.join(milestones)}")
+    print(f"💾 Saved {output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Synthetic e-commerce site for crawler benchmarks.
+
+Generates a deterministic shop from a few knobs: a category tree, paginated
+product listings, product pages, robots.txt, a gzipped sitemap index, a share
+of JavaScript-rendered and infinite-scroll listings (their products are not
+reachable from the static HTML) and optionally a blog that links to no product
+and sort orders that only reorder a static listing page, and an endless events
+calendar (a crawl trap). Nothing is stored; every page is computed from its
+URL, so the shop can be as large as needed.
+
+    python -m benchmarks.shop_server --port 8900 --categories 4 --fanout 3 --depth 2 --products 40
+"""
+import argparse
+import gzip
+import json
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SITEMAP_CHUNK = 1000  # URLs per child sitemap
+BLOG_PAGE_SIZE = 10  # Posts per blog listing page
+
+
+class ShopConfig:
+    def __init__(self, categories=4, fanout=3, depth=2, products=40, page_size=12, js_ratio=0.2,
+                 scroll_ratio=0.2, sitemap_coverage=0.5, related=3, latency_ms=0, blog_posts=0,
+                 sort_orders=0, calendar=0):
+        self.categories = categories
+        self.fanout = fanout
+        self.depth = depth
+        self.products = products
+        self.page_size = page_size
+        self.js_ratio = js_ratio
+        self.scroll_ratio = scroll_ratio
+        self.sitemap_coverage = sitemap_coverage
+        self.related = related
+        self.latency_ms = latency_ms
+        self.blog_posts = blog_posts
+        self.sort_orders = sort_orders
+        self.calendar = calendar
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(**{name: getattr(args, name) for name in vars(cls()).keys()})
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    def leaves(self):
+        """Category paths of every leaf, e.g. "2-0" for the first child of the third top-level category."""
+        paths = [str(i) for i in range(self.categories)]
+        for _ in range(self.depth - 1):
+            paths = [f"{path}-{child}" for path in paths for child in range(self.fanout)]
+        return paths
+
+    def children(self, path):
+        """Sub-categories of a category path ("" is the home page), or [] for a leaf."""
+        level = 0 if not path else path.count("-") + 1
+        if level >= self.depth:
+            return []
+        if not path:
+            return [str(i) for i in range(self.categories)]
+        return [f"{path}-{child}" for child in range(self.fanout)]
+
+    def is_leaf(self, path):
+        return path.count("-") + 1 == self.depth
+
+    def is_category(self, path):
+        parts = path.split("-")
+        if len(parts) > self.depth or not all(part.isdigit() for part in parts):
+            return False
+        return int(parts[0]) < self.categories and all(int(part) < self.fanout for part in parts[1:])
+
+    def listing_kind(self, path):
+        """"static", "js" or "scroll", picked deterministically per leaf."""
+        roll = zlib.crc32(path.encode()) % 1000 / 1000
+        if roll < self.js_ratio:
+            return "js"
+        if roll < self.js_ratio + self.scroll_ratio:
+            return "scroll"
+        return "static"
+
+    def in_sitemap(self, product_id):
+        return zlib.crc32(product_id.encode()) % 1000 / 1000 < self.sitemap_coverage
+
+    def products_of(self, path):
+        return [f"{path}-{i}" for i in range(self.products)]
+
+    def total_pages(self):
+        """HTML pages: categories, listings (with sort orders), products and blog; not the endless calendar."""
+        pages = 1  # home
+        stack = [""]
+        while stack:
+            for child in self.children(stack.pop()):
+                if self.is_leaf(child):
+                    if self.listing_kind(child) == "static":
+                        pages += -(-self.products // self.page_size) * (1 + self.sort_orders)
+                    else:
+                        pages += 1  # JavaScript and infinite-scroll listings are one page fed by the API
+                else:
+                    pages += 1
+                    stack.append(child)
+        blog = -(-self.blog_posts // BLOG_PAGE_SIZE) + self.blog_posts
+        return pages + len(self.leaves()) * self.products + blog
+
+
+def html(title, body, head=""):
+    return f"<!DOCTYPE html><html><head><title>{title}</title>{head}</head><body>{body}</body></html>"
+
+
+def links(urls):
+    return "".join(f'<li><a href="{url}">{url.rsplit("/", 1)[-1]}</a></li>' for url in urls)
+
+
+class ShopHandler(BaseHTTPRequestHandler):
+    config = ShopConfig()
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def send(self, body, content_type="text/html; charset=utf-8", status=200):
+        if self.config.latency_ms:
+            time.sleep(self.config.latency_ms / 1000)
+        data = body if isinstance(body, bytes) else body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip("/") or "/"
+        query = parse_qs(parsed.query)
+        page = int(query.get("page", ["1"])[0])
+        sort = query.get("sort", [None])[0]
+
+        if path == "/robots.txt":
+            host = self.headers.get("Host")
+            return self.send(f"User-agent: *\nDisallow: /cart\nSitemap: http://{host}/sitemap.xml\n", "text/plain")
+        if path == "/sitemap.xml":
+            return self.send(self.sitemap_index(), "application/xml")
+        if path.startswith("/sitemaps/products-") and path.endswith(".xml.gz"):
+            chunk = int(path[len("/sitemaps/products-"):-len(".xml.gz")])
+            return self.send(gzip.compress(self.product_sitemap(chunk).encode()), "application/gzip")
+        body = None
+        if path == "/":
+            body = self.category_page("")
+        elif path.startswith("/category/"):
+            body = self.category_page(path[len("/category/"):], page, sort)
+        elif path.startswith("/api/category/"):
+            return self.send(self.listing_json(path[len("/api/category/"):], page), "application/json")
+        elif path.startswith("/product/"):
+            body = self.product_page(path[len("/product/"):])
+        elif path == "/blog":
+            body = self.blog_page(page)
+        elif path.startswith("/blog/"):
+            body = self.blog_post(path[len("/blog/"):])
+        elif path.startswith("/events/") and self.config.calendar:
+            body = self.calendar_page(path[len("/events/"):].split("/"))
+        elif path == "/cart":
+            body = html("Cart", "<p>Empty</p>")
+        if body is None:
+            return self.send(html("Not found", "<p>Not found</p>"), status=404)
+        return self.send(body)
+
+    def base_url(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def sitemap_index(self):
+        ids = [pid for leaf in self.config.leaves() for pid in self.config.products_of(leaf) if self.config.in_sitemap(pid)]
+        chunks = -(-len(ids) // SITEMAP_CHUNK)
+        entries = "".join(
+            f"<sitemap><loc>{self.base_url()}/sitemaps/products-{i}.xml.gz</loc></sitemap>" for i in range(chunks)
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</sitemapindex>'
+
+    def product_sitemap(self, chunk):
+        ids = [pid for leaf in self.config.leaves() for pid in self.config.products_of(leaf) if self.config.in_sitemap(pid)]
+        entries = "".join(
+            f"<url><loc>{self.base_url()}/product/{pid}</loc></url>"
+            for pid in ids[chunk * SITEMAP_CHUNK:(chunk + 1) * SITEMAP_CHUNK]
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{entries}</urlset>'
+
+    def category_page(self, path, page=1, sort=None):
+        if path and not self.config.is_category(path):
+            return None
+        sorts = [f"s{n}" for n in range(self.config.sort_orders)]
+        if sort is not None and sort not in sorts:
+            return None
+        nav = '<a href="/">Home</a> <a href="/cart">Cart</a>'
+        if self.config.blog_posts:
+            nav += ' <a href="/blog">Blog</a>'
+        if self.config.calendar:
+            nav += ' <a href="/events/2026/1">Events</a>'
+        children = self.config.children(path)
+        if children:
+            return html(f"Category {path or 'home'}", nav + "<ul>" + links(f"/category/{c}" for c in children) + "</ul>")
+
+        products = self.config.products_of(path)
+        size = self.config.page_size
+        kind = self.config.listing_kind(path)
+        if kind == "js":
+            # Anchors only exist after the script runs
+            payload = json.dumps([f"/product/{pid}" for pid in products])
+            script = (
+                f"<script>const urls = {payload};"
+                "document.getElementById('grid').innerHTML = urls.map(u => `<li><a href=\"${u}\">${u}</a></li>`).join('');"
+                "</script>"
+            )
+            return html(f"Category {path}", nav + '<ul id="grid"></ul>' + script)
+        if kind == "scroll":
+            # First page inline, the rest appended from the JSON API as the user scrolls
+            script = (
+                f"<script>let page = 1; const last = {-(-len(products) // size)};"
+                "window.addEventListener('scroll', async () => {"
+                "if (page >= last || window.innerHeight + window.scrollY < document.body.offsetHeight - 50) return;"
+                f"page += 1; const r = await fetch('/api/category/{path}?page=' + page);"
+                "const urls = await r.json();"
+                "document.getElementById('grid').insertAdjacentHTML('beforeend',"
+                " urls.map(u => `<li><a href=\"${u}\">${u}</a></li>`).join(''));});"
+                "</script>"
+            )
+            first = links(f"/product/{pid}" for pid in products[:size])
+            return html(f"Category {path}", nav + f'<ul id="grid" style="min-height:3000px">{first}</ul>' + script)
+
+        # Static listing with numbered pagination. A sort order shows the same page slice
+        # rotated (a near-duplicate); its pager keeps the order, and choosing an order
+        # goes back to page 1, so sorted pages past the first are only linked from sorted pages.
+        pages = -(-len(products) // size)
+        if sort is not None and (kind != "static" or not 1 <= page <= pages):
+            return None
+        shown = products[(page - 1) * size:page * size]
+        if sort is not None:
+            shift = (sorts.index(sort) + 1) % len(shown)
+            shown = shown[shift:] + shown[:shift]
+        order = f"&sort={sort}" if sort else ""
+        items = links(f"/product/{pid}" for pid in shown)
+        pager = "".join(f'<a href="/category/{path}?page={n}{order}">{n}</a> ' for n in range(1, pages + 1) if n != page)
+        sorter = "".join(f'<a href="/category/{path}?sort={s}">{s}</a> ' for s in sorts if s != sort)
+        return html(f"Category {path} page {page}", nav + f"<nav>{sorter}</nav><ul>{items}</ul><nav>{pager}</nav>")
+
+    def listing_json(self, path, page):
+        size = self.config.page_size
+        leaf = self.config.is_category(path) and self.config.is_leaf(path)
+        products = self.config.products_of(path) if leaf else []
+        return json.dumps([f"/product/{pid}" for pid in products[(page - 1) * size:page * size]])
+
+    def blog_page(self, page):
+        pages = -(-self.config.blog_posts // BLOG_PAGE_SIZE)
+        if not 1 <= page <= pages:
+            return None
+        posts = range((page - 1) * BLOG_PAGE_SIZE, min(page * BLOG_PAGE_SIZE, self.config.blog_posts))
+        pager = "".join(f'<a href="/blog?page={n}">{n}</a> ' for n in range(1, pages + 1) if n != page)
+        return html(f"Blog page {page}", f"<ul>{links(f'/blog/post-{n}' for n in posts)}</ul><nav>{pager}</nav>")
+
+    def blog_post(self, slug):
+        index = slug[len("post-"):]
+        if not slug.startswith("post-") or not index.isdigit() or int(index) >= self.config.blog_posts:
+            return None
+        related = [f"/blog/post-{(int(index) + step) % self.config.blog_posts}" for step in range(1, 4)]
+        body = f'<a href="/blog">Blog</a><h1>Post {index}</h1><p>Nothing to buy here.</p><ul>{links(related)}</ul>'
+        return html(f"Post {index}", body)
+
+    def calendar_page(self, parts):
+        """A month links its days and the months around it, a day the next day; no end in either direction."""
+        if not 2 <= len(parts) <= 3 or not all(part.isdigit() for part in parts):
+            return None
+        year, month = int(parts[0]), int(parts[1])
+        if not 1 <= month <= 12:
+            return None
+        if len(parts) == 3:
+            day = int(parts[2])
+            if not 1 <= day <= 28:
+                return None
+            following = f"/events/{year}/{month}/{day + 1}" if day < 28 else f"/events/{year + month // 12}/{month % 12 + 1}/1"
+            body = f'<a href="/events/{year}/{month}">Month</a><h1>Events on {year}-{month}-{day}</h1><p>No events.</p><a href="{following}">Next day</a>'
+            return html(f"Events {year}-{month}-{day}", body)
+        previous = f"/events/{year - (month == 1)}/{(month - 2) % 12 + 1}"
+        following = f"/events/{year + month // 12}/{month % 12 + 1}"
+        days = links(f"/events/{year}/{month}/{day}" for day in range(1, 29))
+        body = f'<h1>Events in {year}-{month}</h1><ul>{days}</ul><a href="{previous}">Previous</a> <a href="{following}">Next</a>'
+        return html(f"Events {year}-{month}", body)
+
+    def product_page(self, product_id):
+        category, _, index = product_id.rpartition("-")
+        if not self.config.is_category(category) or not self.config.is_leaf(category) or not index.isdigit() or int(index) >= self.config.products:
+            return None
+        related = [
+            f"/product/{category}-{(int(index) + step) % self.config.products}"
+            for step in range(1, self.config.related + 1)
+        ]
+        body = (
+            f'<a href="/category/{category}">Back</a> <a href="/cart">Add to cart</a>'
+            f"<h1>Product {product_id}</h1><p>Synthetic product {product_id} in category {category}.</p>"
+            f"<ul>{links(related)}</ul>"
+        )
+        # Structured data as shop platforms emit it
+        price = zlib.crc32(product_id.encode()) % 20000 / 100
+        markup = json.dumps({
+            "@context": "https://schema.org",
+            "@type": "Product",
+            "name": f"Product {product_id}",
+            "sku": product_id,
+            "offers": {
+                "@type": "Offer",
+                "price": f"{price:.2f}",
+                "priceCurrency": "EUR",
+                "availability": "https://schema.org/InStock" if int(index) % 7 else "https://schema.org/OutOfStock",
+            },
+        })
+        head = (
+            f'<script type="application/ld+json">{markup}</script>'
+            f'<meta property="og:type" content="product"><meta property="og:title" content="Product {product_id}">'
+        )
+        return html(f"Product {product_id}", body, head)
+
+
+def make_server(config, host="127.0.0.1", port=0):
+    handler = type("ConfiguredShopHandler", (ShopHandler,), {"config": config})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def add_shop_arguments(parser):
+    defaults = ShopConfig()
+    parser.add_argument("--categories", type=int, default=defaults.categories, help="Top-level categories")
+    parser.add_argument("--fanout", type=int, default=defaults.fanout, help="Sub-categories per category")
+    parser.add_argument("--depth", type=int, default=defaults.depth, help="Category levels (1 = flat)")
+    parser.add_argument("--products", type=int, default=defaults.products, help="Products per leaf category")
+    parser.add_argument("--page-size", type=int, default=defaults.page_size, help="Products per listing page")
+    parser.add_argument("--js-ratio", type=float, default=defaults.js_ratio, help="Share of JS-rendered listings")
+    parser.add_argument("--scroll-ratio", type=float, default=defaults.scroll_ratio, help="Share of infinite-scroll listings")
+    parser.add_argument("--sitemap-coverage", type=float, default=defaults.sitemap_coverage, help="Share of products in the sitemap")
+    parser.add_argument("--related", type=int, default=defaults.related, help="Related-product links per product page")
+    parser.add_argument("--latency-ms", type=int, default=defaults.latency_ms, help="Artificial delay per response")
+    parser.add_argument("--blog-posts", type=int, default=defaults.blog_posts, help="Blog posts without product links")
+    parser.add_argument("--calendar", type=int, default=defaults.calendar, help="1 adds an endless events calendar (crawl trap)")
+    parser.add_argument("--sort-orders", type=int, default=defaults.sort_orders, help="Sort orders per static listing (near-duplicate pages)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic shop for crawler benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_shop_arguments(parser)
+    args = parser.parse_args()
+
+    config = ShopConfig.from_args(args)
+    server = make_server(config, args.host, args.port)
+    print(f"🛒 Serving {config.total_pages()} pages on http://{args.host}:{server.server_port}", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
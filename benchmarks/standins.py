@@ -0,0 +1,79 @@
+"""
+In-process stand-ins for the services a benchmark run needs, so it can run on
+a laptop without Redis or PostgreSQL.
+
+- ``python -m benchmarks.standins redis --port 6399`` serves fakeredis over TCP
+  (needs ``pip install fakeredis lupa``; the Bloom dedup backend needs a real
+  Redis because fakeredis has no ``redis.sha1hex``).
+- ``StatementCountingPipeline`` batches exactly like the bulk writer but only
+  counts the SQL statements it would send.
+"""
+import argparse
+import socket
+import time
+
+from twisted.internet import task
+
+from product_crawler.pipelines import PostgresBulkWriterPipeline
+
+
+class StatementCountingPipeline(PostgresBulkWriterPipeline):
+    """PostgresBulkWriterPipeline without a database: flushes are counted, not written."""
+
+    def open_spider(self, spider):
+        self.logger = spider.logger
+        self.metrics = getattr(spider, "metrics", None)
+        self.flush_loop = task.LoopingCall(self.flush)
+        self.flush_loop.start(self.flush_interval, now=False)
+
+    def _write(self, *row_groups):
+        self.record_flush(time.perf_counter(), *row_groups)
+
+    def close_spider(self, spider):
+        if self.flush_loop and self.flush_loop.running:
+            self.flush_loop.stop()
+        return self.flush()
+
+
+def serve_fake_redis(host, port):
+    import redis
+    from fakeredis import TcpFakeServer
+
+    server = TcpFakeServer((host, port), server_type="redis")
+
+    # fakeredis' TCP handler drops the connection after any error reply; Redis keeps it
+    # open, and redis-py relies on that to answer NOSCRIPT with SCRIPT LOAD.
+    def setup(handler):
+        base.setup(handler)
+        # Redis disables Nagle; without this, pipelined replies stall on delayed ACKs (~40 ms)
+        handler.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        read_response = handler.current_client.read_response
+
+        def read_response_or_error():
+            try:
+                return read_response()
+            except redis.ResponseError as e:
+                return e
+
+        handler.current_client.read_response = read_response_or_error
+
+    base = server.RequestHandlerClass
+    server.RequestHandlerClass = type("RedisLikeRequestHandler", (base,), {"setup": setup})
+    print(f"🧪 fakeredis listening on {host}:{port}", flush=True)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stand-in services.")
+    sub = parser.add_subparsers(dest="service", required=True)
+    redis_parser = sub.add_parser("redis", help="Serve fakeredis over TCP")
+    redis_parser.add_argument("--host", default="127.0.0.1")
+    redis_parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+
+    if args.service == "redis":
+        serve_fake_redis(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import scrapy
+
+
+class CrawledDataItem(scrapy.Item):
+    """A row for the crawled_data table."""
+    domain = scrapy.Field()
+    url = scrapy.Field()
+    title = scrapy.Field()
+    content = scrapy.Field()
+    status_code = scrapy.Field()
+    created_at = scrapy.Field()
+
+
+class ProductLinkItem(scrapy.Item):
+    """A row for the product_links table."""
+    domain = scrapy.Field()
+    url = scrapy.Field()
+    created_at = scrapy.Field()
+
+
+class ProductItem(scrapy.Item):
+    """A product page confirmed or rejected by its structured data; upserted onto its product_links row."""
+    domain = scrapy.Field()
+    url = scrapy.Field()
+    name = scrapy.Field()
+    price = scrapy.Field()
+    currency = scrapy.Field()
+    availability = scrapy.Field()
+    source = scrapy.Field()  # json-ld, microdata, opengraph, or rejected
+    confirmed_at = scrapy.Field()
+
+
+class CrawlResultItem(scrapy.Item):
+    """Fetch outcome for a crawled_data row: validators, content hash and revisit schedule."""
+    domain = scrapy.Field()
+    url = scrapy.Field()
+    title = scrapy.Field()
+    status_code = scrapy.Field()
+    etag = scrapy.Field()
+    last_modified = scrapy.Field()
+    content_hash = scrapy.Field()
+    changed = scrapy.Field()
+    last_crawled_at = scrapy.Field()
+    next_crawl_at = scrapy.Field()
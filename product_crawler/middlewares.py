@@ -0,0 +1,81 @@
+import time
+from urllib.parse import urlparse
+
+import redis
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import task
+
+from product_crawler.utils.metrics import CountingConnection
+
+
+class CrawlMetricsMiddleware:
+    """
+    Downloader middleware feeding the spider's CrawlMetrics.
+
+    Times every frontier page's download (``render`` when it went through
+    Playwright), counts pages per domain, and every METRICS_PUBLISH_INTERVAL
+    seconds publishes the worker's snapshot to Redis with the Redis round-trip
+    and Playwright page counts of the process. Parse stages and DB writes are
+    timed where they happen (ProductSpider.parse_page, the bulk writer).
+    """
+
+    def __init__(self, crawler, interval):
+        self.crawler = crawler
+        self.interval = interval
+        self.publisher = None
+        self.last_roundtrips = CountingConnection.roundtrips
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("METRICS_ENABLED", True):
+            raise NotConfigured
+        middleware = cls(crawler, crawler.settings.getfloat("METRICS_PUBLISH_INTERVAL", 15.0))
+        crawler.signals.connect(middleware.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def process_request(self, request, spider):
+        request.meta["metrics_started"] = time.perf_counter()
+
+    def process_response(self, request, response, spider):
+        metrics = getattr(spider, "metrics", None)
+        if metrics is None or "frontier_url" not in request.meta:
+            return response  # robots.txt and other side requests are not pages
+
+        rendered = bool(request.meta.get("playwright"))
+        started = request.meta.get("metrics_started")
+        if started is not None:
+            metrics.observe("render" if rendered else "download", time.perf_counter() - started)
+        domain = urlparse(response.url).netloc
+        metrics.inc("crawler_pages_total", domain=domain)
+        if rendered:
+            metrics.inc("crawler_playwright_pages_total", domain=domain)
+        return response
+
+    def spider_opened(self, spider):
+        if getattr(spider, "metrics", None) is None:
+            return
+        self.publisher = task.LoopingCall(self.publish, spider)
+        self.publisher.start(self.interval, now=False)
+
+    def spider_closed(self, spider):
+        if self.publisher is not None and self.publisher.running:
+            self.publisher.stop()
+            self.publish(spider)
+
+    def publish(self, spider):
+        metrics = spider.metrics
+        roundtrips = CountingConnection.roundtrips
+        metrics.inc("crawler_redis_roundtrips_total", roundtrips - self.last_roundtrips)
+        self.last_roundtrips = roundtrips
+
+        stats = self.crawler.stats
+        opened = stats.get_value("playwright/page_count", 0)
+        closed = stats.get_value("playwright/page_count/closed", 0)
+        metrics.set_gauge("crawler_playwright_open_pages", max(opened - closed, 0))
+        metrics.set_gauge("crawler_playwright_max_concurrent_pages", stats.get_value("playwright/page_count/max_concurrent", 0))
+        try:
+            metrics.publish()
+        except redis.RedisError as e:
+            spider.logger.warning(f"⚠️ Failed to publish crawl metrics: {e}")
@@ -0,0 +1,259 @@
+import json
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+from itemadapter import ItemAdapter
+from twisted.internet import defer, task, threads
+
+from product_crawler.items import CrawledDataItem, CrawlResultItem, ProductItem, ProductLinkItem
+
+
+CRAWLED_DATA_INSERT = """
+    INSERT INTO crawled_data (domain, url, title, content, status_code, created_at)
+    VALUES %s
+    ON CONFLICT (url) DO NOTHING;
+"""
+
+# Fetch results update the placeholder row; NULL validators (e.g. on a 304) keep the stored ones
+CRAWL_RESULTS_UPSERT = """
+    INSERT INTO crawled_data (
+        domain, url, title, status_code, etag, last_modified, content_hash,
+        last_crawled_at, next_crawl_at, crawl_count, change_count, created_at
+    )
+    VALUES %s
+    ON CONFLICT (url) DO UPDATE SET
+        title = COALESCE(EXCLUDED.title, crawled_data.title),
+        status_code = EXCLUDED.status_code,
+        etag = COALESCE(EXCLUDED.etag, crawled_data.etag),
+        last_modified = COALESCE(EXCLUDED.last_modified, crawled_data.last_modified),
+        content_hash = COALESCE(EXCLUDED.content_hash, crawled_data.content_hash),
+        last_crawled_at = EXCLUDED.last_crawled_at,
+        next_crawl_at = EXCLUDED.next_crawl_at,
+        crawl_count = crawled_data.crawl_count + 1,
+        change_count = crawled_data.change_count + EXCLUDED.change_count;
+"""
+
+PRODUCT_LINKS_INSERT = """
+    INSERT INTO product_links (domain, url, created_at)
+    VALUES %s
+    ON CONFLICT (url) DO NOTHING;
+"""
+
+# Structured-data verdicts update the row the URL rules inserted, or add products the rules missed
+PRODUCTS_UPSERT = """
+    INSERT INTO product_links (domain, url, name, price, currency, availability, source, confirmed_at, created_at)
+    VALUES %s
+    ON CONFLICT (url) DO UPDATE SET
+        name = EXCLUDED.name,
+        price = EXCLUDED.price,
+        currency = EXCLUDED.currency,
+        availability = EXCLUDED.availability,
+        source = EXCLUDED.source,
+        confirmed_at = EXCLUDED.confirmed_at;
+"""
+
+# Row groups in flush order, with the table name used for stats and the dead-letter file
+TABLES = ("crawled_data", "crawl_results", "product_links", "products")
+STATEMENTS = (CRAWLED_DATA_INSERT, CRAWL_RESULTS_UPSERT, PRODUCT_LINKS_INSERT, PRODUCTS_UPSERT)
+
+
+class PostgresBulkWriterPipeline:
+    """
+    Buffers crawled_data and product_links rows and writes them with execute_values.
+
+    Placeholder rows for newly admitted URLs are inserted with ON CONFLICT DO
+    NOTHING; fetch results (CrawlResultItem) are upserted onto the same rows,
+    and so are structured-data verdicts (ProductItem) onto product_links rows.
+
+    A flush happens when either buffer reaches PIPELINE_BATCH_SIZE rows, every
+    PIPELINE_FLUSH_INTERVAL seconds, and on spider close. The blocking psycopg2
+    work runs in the reactor thread pool; a DeferredLock keeps the single
+    connection from being used by two flushes at once.
+
+    A batch that fails is retried PIPELINE_WRITE_RETRIES times, reconnecting if
+    the connection was lost, then written one row per transaction. Rows that still
+    fail are appended to PIPELINE_DEAD_LETTER_FILE and counted under the
+    ``pipeline/rows_failed`` stats.
+    """
+
+    def __init__(self, database_url, batch_size=500, flush_interval=5.0, write_retries=2, retry_delay=1.0,
+                 dead_letter_path="failed_rows.jsonl", stats=None):
+        self.database_url = database_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_retries = write_retries
+        self.retry_delay = retry_delay
+        self.dead_letter_path = dead_letter_path
+        self.stats = stats
+        self.crawled_rows = []
+        self.result_rows = {}  # url -> row; one upsert per URL per flush
+        self.product_rows = []
+        self.confirmed_rows = {}  # url -> row; one upsert per URL per flush
+        self.conn = None
+        self.lock = defer.DeferredLock()
+        self.flush_loop = None
+        self.logger = None
+        self.metrics = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            database_url=settings.get("DATABASE_URL"),
+            batch_size=settings.getint("PIPELINE_BATCH_SIZE", 500),
+            flush_interval=settings.getfloat("PIPELINE_FLUSH_INTERVAL", 5.0),
+            write_retries=settings.getint("PIPELINE_WRITE_RETRIES", 2),
+            retry_delay=settings.getfloat("PIPELINE_RETRY_DELAY", 1.0),
+            dead_letter_path=settings.get("PIPELINE_DEAD_LETTER_FILE", "failed_rows.jsonl"),
+            stats=crawler.stats,
+        )
+
+    def open_spider(self, spider):
+        self.logger = spider.logger
+        self.metrics = getattr(spider, "metrics", None)
+        self.conn = psycopg2.connect(self.database_url)
+        self.flush_loop = task.LoopingCall(self.flush)
+        self.flush_loop.start(self.flush_interval, now=False)
+
+    def process_item(self, item, spider):
+        adapter = ItemAdapter(item)
+        if isinstance(item, CrawledDataItem):
+            self.crawled_rows.append((
+                adapter["domain"], adapter["url"], adapter.get("title"),
+                adapter.get("content"), adapter.get("status_code"), adapter["created_at"],
+            ))
+        elif isinstance(item, CrawlResultItem):
+            self.result_rows[adapter["url"]] = (
+                adapter["domain"], adapter["url"], adapter.get("title"), adapter["status_code"],
+                adapter.get("etag"), adapter.get("last_modified"), adapter.get("content_hash"),
+                adapter["last_crawled_at"], adapter["next_crawl_at"],
+                1, 1 if adapter["changed"] else 0, adapter["last_crawled_at"],
+            )
+        elif isinstance(item, ProductLinkItem):
+            self.product_rows.append((adapter["domain"], adapter["url"], adapter["created_at"]))
+        elif isinstance(item, ProductItem):
+            self.confirmed_rows[adapter["url"]] = (
+                adapter["domain"], adapter["url"], adapter.get("name"), adapter.get("price"),
+                adapter.get("currency"), adapter.get("availability"), adapter["source"],
+                adapter["confirmed_at"], adapter["confirmed_at"],
+            )
+        else:
+            return item
+
+        buffered = (self.crawled_rows, self.result_rows, self.product_rows, self.confirmed_rows)
+        if max(map(len, buffered)) >= self.batch_size:
+            # Returning the flush Deferred applies backpressure to the scraper while it runs
+            d = self.flush()
+            d.addCallback(lambda _: item)
+            return d
+        return item
+
+    def flush(self):
+        """Hand the current buffers to a worker thread and start new ones."""
+        crawled_rows, self.crawled_rows = self.crawled_rows, []
+        result_rows, self.result_rows = list(self.result_rows.values()), {}
+        product_rows, self.product_rows = self.product_rows, []
+        confirmed_rows, self.confirmed_rows = list(self.confirmed_rows.values()), {}
+        if not crawled_rows and not result_rows and not product_rows and not confirmed_rows:
+            return defer.succeed(None)
+        return self.lock.run(
+            threads.deferToThread, self._write, crawled_rows, result_rows, product_rows, confirmed_rows
+        )
+
+    def _write(self, *row_groups):
+        started = time.perf_counter()
+        for attempt in range(self.write_retries + 1):
+            if attempt:
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+            try:
+                self._execute_batch(row_groups)
+            except Exception as e:
+                self.stats.inc_value("pipeline/batch_errors")
+                self.logger.warning(f"⚠️ Database error while flushing (attempt {attempt + 1}): {e}")
+                self._reset()
+                continue
+            self.record_flush(started, *row_groups)
+            crawled_rows, result_rows, product_rows, confirmed_rows = row_groups
+            self.logger.info(
+                f"💾 Flushed {len(crawled_rows)} crawled rows, {len(result_rows)} fetch results, "
+                f"{len(product_rows)} product links and {len(confirmed_rows)} structured-data verdicts"
+            )
+            return
+        self.logger.error("❌ Flush still failing after retries; writing its rows one by one")
+        self._write_rows(row_groups)
+
+    def _execute_batch(self, row_groups):
+        with self.conn.cursor() as cursor:
+            # Products last, so a verdict lands on a row admitted in the same flush
+            for statement, rows in zip(STATEMENTS, row_groups):
+                if rows:
+                    execute_values(cursor, statement, rows, page_size=self.batch_size)
+        self.conn.commit()
+
+    def _write_rows(self, row_groups):
+        """Write a failed batch one row per transaction, so a bad row only loses itself."""
+        pending = [
+            (table, statement, row) for table, statement, rows in zip(TABLES, STATEMENTS, row_groups) for row in rows
+        ]
+        failed = []
+        written = 0
+        for position, (table, statement, row) in enumerate(pending):
+            try:
+                with self.conn.cursor() as cursor:
+                    execute_values(cursor, statement, [row])
+                self.conn.commit()
+                written += 1
+            except Exception as e:
+                failed.append((table, row, str(e).strip()))
+                if not self._reset():
+                    # The database is gone: keep the rest of the batch rather than failing it row by row
+                    failed += [(table, row, "database unreachable") for table, _, row in pending[position + 1:]]
+                    break
+        if self.metrics is not None:
+            self.metrics.inc("crawler_db_roundtrips_total", 2 * (written + len(failed)))
+        self.stats.inc_value("pipeline/rows_recovered", written)
+        if failed:
+            self._dead_letter(failed)
+
+    def _reset(self):
+        """Roll back the failed transaction, reconnecting if the connection was lost; False if that fails."""
+        try:
+            if not self.conn.closed:
+                self.conn.rollback()
+                return True
+        except psycopg2.Error:
+            pass
+        try:
+            self.conn = psycopg2.connect(self.database_url)
+            return True
+        except psycopg2.Error as e:
+            self.logger.error(f"❌ Could not reconnect to the database: {e}")
+            return False
+
+    def _dead_letter(self, failed):
+        """Append rows that could not be written to the dead-letter file (JSON lines) and count them."""
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for table, row, error in failed:
+                f.write(json.dumps({"table": table, "row": row, "error": error}, default=str) + "\n")
+        for table, _, _ in failed:
+            self.stats.inc_value(f"pipeline/rows_failed/{table}")
+            if self.metrics is not None:
+                self.metrics.inc("crawler_db_rows_failed_total", table=table)
+        self.stats.inc_value("pipeline/rows_failed", len(failed))
+        self.logger.error(f"❌ {len(failed)} rows could not be written; saved to {self.dead_letter_path}")
+
+    def record_flush(self, started, *row_groups):
+        if self.metrics is None:
+            return
+        # execute_values sends one statement per page of rows, plus the commit
+        statements = sum(-(-len(rows) // self.batch_size) for rows in row_groups)
+        self.metrics.inc("crawler_db_roundtrips_total", statements + 1)
+        self.metrics.observe("db_flush", time.perf_counter() - started)
+
+    def close_spider(self, spider):
+        if self.flush_loop and self.flush_loop.running:
+            self.flush_loop.stop()
+        d = self.flush()
+        d.addBoth(lambda _: self.lock.run(threads.deferToThread, self.conn.close))
+        return d
@@ -0,0 +1,89 @@
+from collections import deque
+
+import redis
+
+
+class RedisFrontierScheduler:
+    """
+    Scrapy scheduler that pulls from the spider's Redis frontier only as download slots free up.
+
+    The engine asks for a request whenever the downloader and scraper have room.
+    The scheduler then leases at most ``min(SCHEDULER_PREFETCH, free download slots)``
+    URLs from ready hosts in one round-trip. The frontier stays in Redis, so worker
+    memory stays flat however large the crawl grows, and a stopped crawl resumes
+    from Redis.
+
+    Requests the spider yields itself (a re-render of a leased URL, for example)
+    already hold a lease. They wait in a small in-memory queue and go out before
+    any new URL is leased. While URLs wait only on host politeness delays, the
+    engine is woken when the next host is due (at most SCHEDULER_IDLE_POLL_INTERVAL
+    seconds later), instead of at its 5 second heartbeat.
+    """
+
+    def __init__(self, crawler, prefetch=8, idle_poll_interval=0.5):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.prefetch = max(1, prefetch)
+        self.idle_poll_interval = idle_poll_interval
+        self.spider = None
+        self.local = deque()  # Requests yielded by callbacks
+        self.prefetched = deque()  # Leased (url, depth) pairs not handed to the engine yet
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            crawler,
+            prefetch=settings.getint("SCHEDULER_PREFETCH", 8),
+            idle_poll_interval=settings.getfloat("SCHEDULER_IDLE_POLL_INTERVAL", 0.5),
+        )
+
+    def open(self, spider):
+        self.spider = spider
+
+    def close(self, reason):
+        """Give back leases of URLs that were never downloaded, so other workers pick them up at once."""
+        urls = [url for url, _ in self.prefetched]
+        urls += [request.meta["frontier_url"] for request in self.local if "frontier_url" in request.meta]
+        if not urls:
+            return
+        try:
+            # One script puts each URL back with its score and depth and drops its lease
+            returned = self.spider.frontier.return_leases(urls)
+        except redis.RedisError as e:
+            self.spider.logger.warning(f"⚠️ Could not return {len(urls)} leased URLs, they requeue on lease expiry: {e}")
+            return
+        self.spider.leased_urls.difference_update(urls)
+        self.spider.logger.info(f"↩️ Returned {returned} leased URLs to the frontier")
+
+    def has_pending_requests(self):
+        return bool(self.local) or bool(self.prefetched) or len(self.spider.frontier) > 0
+
+    def enqueue_request(self, request):
+        self.local.append(request)
+        self.stats.inc_value("scheduler/enqueued/memory", spider=self.spider)
+        return True
+
+    def next_request(self):
+        if self.local:
+            self.stats.inc_value("scheduler/dequeued/memory", spider=self.spider)
+            return self.local.popleft()
+
+        while True:
+            if not self.prefetched:
+                downloader = self.crawler.engine.downloader
+                free_slots = downloader.total_concurrency - len(downloader.active)
+                self.prefetched.extend(self.spider.lease_urls(max(1, min(self.prefetch, free_slots))))
+            if not self.prefetched:
+                wait = self.spider.frontier.seconds_until_ready()
+                if wait is not None:
+                    # Hosts are waiting on their delays: wake up when the next one is due, not at the 5 s heartbeat
+                    self.crawler.engine.slot.nextcall.schedule(min(max(wait, 0.01), self.idle_poll_interval))
+                return None
+            request = self.spider.frontier_request(*self.prefetched.popleft())
+            if request is not None:
+                self.stats.inc_value("scheduler/dequeued/redis", spider=self.spider)
+                return request
+
+    def __len__(self):
+        return len(self.local) + len(self.prefetched) + len(self.spider.frontier)
@@ -0,0 +1,49 @@
+from product_crawler.spiders.product_spider import ProductSpider
+from product_crawler.utils.render_detector import RenderDetector
+
+
+class DynamicSpider(ProductSpider):
+    """
+    Hybrid variant of ProductSpider: fetch with Scrapy's plain HTTP handler first
+    and only re-fetch through Playwright when the static HTML looks incomplete.
+    """
+    name = "dynamic_spider"
+
+    def setup(self, settings):
+        super().setup(settings)
+        self.render_detector = RenderDetector.from_settings(self.redis_client, settings)
+
+    def wants_render(self, url):
+        """Render only domains that have been learned to need JavaScript."""
+        return self.render_detector.domain_needs_js(url)
+
+    def build_request(self, url, render=None, depth=None):
+        if render is None and self.render_detector.probe(url):
+            # A static attempt on a JS domain: its verdict lets the domain be re-learned
+            self.crawler.stats.inc_value("hybrid/probes")
+            render = False
+        return super().build_request(url, render=render, depth=depth)
+
+    async def parse_page(self, response):
+        if "recrawl" in response.meta:
+            pass  # Conditional revisits are judged by their validators, not by the static HTML
+        elif not response.meta.get("playwright"):  # Already asked for a render (even if no page came back)
+            reason = self.render_detector.needs_rendering(response)
+            if reason:
+                self.crawler.stats.inc_value(f"hybrid/escalated/{reason}")
+                self.logger.info(f"🎭 Escalating to Playwright ({reason}): {response.url}")
+                request = self.build_request(
+                    response.meta.get("frontier_url", response.request.url),
+                    render=True,
+                    depth=response.meta.get("crawl_depth"),
+                )
+                # Revisits are plain GETs: store the hash they will be compared with, not the rendered DOM's
+                request.meta["static_hash"] = self.recrawl.content_hash(response)
+                yield request
+                return
+            self.crawler.stats.inc_value("hybrid/static")
+        else:
+            self.crawler.stats.inc_value("hybrid/rendered")
+
+        async for result in super().parse_page(response):
+            yield result
@@ -1,37 +1,41 @@
 import scrapy
-import requests
-from lxml import etree
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet import defer, task, threads
+import asyncio
 from datetime import datetime
 import json
-import re
+import os
+import socket
 import redis
-from urllib.parse import urlparse, urljoin
-from urllib.robotparser import RobotFileParser
-from scrapy.linkextractors import LinkExtractor
+from urllib.parse import urlparse
 from playwright.async_api import async_playwright
-import psycopg2
+from product_crawler.items import CrawledDataItem, ProductItem, ProductLinkItem
+from product_crawler.utils.canonicalizer import UrlCanonicalizer, differs_by_pagination, rel_canonical
+from product_crawler.utils.dedup import SetDedup, dedup_from_settings
+from product_crawler.utils.frontier import RedisFrontier
+from product_crawler.utils.jobs import job_key_prefix
+from product_crawler.utils.link_extractor import DOM_LINKS_JS, LinkCollector
+from product_crawler.utils.link_scorer import LinkScorer
+from product_crawler.utils.metrics import CountingConnection, CrawlMetrics
+from product_crawler.utils.near_duplicates import NearDuplicateIndex
+from product_crawler.utils.recrawl import RecrawlState
+from product_crawler.utils.render_profile import RenderProfile
+from product_crawler.utils.robots import RobotsService, origin_of
+from product_crawler.utils.scope import ScopeMatcher
+from product_crawler.utils.scroller import InfiniteScroller
+from product_crawler.utils.sitemap_stream import SitemapStreamer
+from product_crawler.utils.structured_data import extract_product
+from product_crawler.utils.url_classifier import UrlClassifier
+from product_crawler.utils.url_templates import TemplateBudget
 
 
 class ProductSpider(scrapy.Spider):
     name = "product_spider"
 
-    def __init__(self, domains=None, *args, **kwargs):
+    def __init__(self, domains=None, incremental=None, job_id=None, *args, **kwargs):
         super(ProductSpider, self).__init__(*args, **kwargs)
-        
-        # Redis connection
-        self.redis_client = redis.Redis(host="localhost", port=6379, db=0, decode_responses=True)
-        # creating the DB connection
-        self.db_conn = psycopg2.connect(
-            dbname="web_crawler",
-            user="crawler_user",
-            password="strong_password",
-            host="localhost",
-            port="5432"
-        )
-        self.db_cursor = self.db_conn.cursor()
-
-        # Initialize robots.txt cache dictionary
-        self.robots_rules = {}
 
         # Get domains from command-line argument (passed via -a option)
         if domains:
@@ -43,328 +47,665 @@ class ProductSpider(scrapy.Spider):
         self.seed_domains = {urlparse(url).netloc for url in self.seed_urls}
         self.visited_links = set(self.seed_urls)
 
-        # Map domains to robots.txt rules
-        for domain in self.seed_domains:
-            domain_url = f"https://{domain}/"
-            self.robots_rules[domain_url] = self.parse_robots_txt(domain_url)
-
         print(self.seed_urls)
         print(self.seed_domains)
+        # Crawl jobs started by the Flask job manager (-a job_id=N) keep their crawl state under job:<N>:
+        self.job_id = job_id
+        self.key_prefix = job_key_prefix(job_id)
+
         # Queue Names
-        self.QUEUE_NAME = "crawl_queue"  # Redis list (BFS queue)
-        self.PROCESSING_SET = "processing_set"  # Redis set (tracking in-progress URLs)
+        self.QUEUE_NAME = f"{self.key_prefix}crawl_queue"  # Prefix of the per-host Redis frontier (best-first queues)
+        self.PROCESSING_SET = f"{self.key_prefix}processing_set"  # Legacy Redis set of in-progress URLs (now leases)
         # On the way to remove visited_links python set
-        self.VISITED_SET = "visited_links"  # Redis Set for visited links
+        self.VISITED_SET = f"{self.key_prefix}visited_links"  # Redis Set for visited links
 
         # for url in self.seed_urls:
         #     self.redis_client.sadd("visited_links", url)
 
-        # Initialize queue
-        self.initialize_queue()
-
-    def parse_robots_txt(self, domain_url):
-        """Fetch and parse robots.txt for a domain."""
-        robots_url = f"{domain_url}robots.txt"
-        rp = RobotFileParser()
-        rp.set_url(robots_url)
-        try:
-            rp.read()
-            self.logger.info(f"✅ Loaded robots.txt for {domain_url}")
-        except requests.exceptions.RequestException as e:
-            self.logger.warning(f"⚠️ Network error fetching robots.txt for {domain_url}: {e}")
-            return None  # Allow crawling if robots.txt is unavailable
-        except Exception as e:
-            self.logger.warning(f"⚠️ Failed to fetch robots.txt for {domain_url}: {e}")
-            return None  # Return None if robots.txt cannot be read
-        return rp  # Return parsed RobotFileParser object
-
-
-    def is_allowed_by_robots(self, url):
-        """Check if a URL is allowed based on cached robots.txt rules."""
-        domain = urlparse(url).netloc
-        domain_url = f"https://{domain}/"
+        # Sitemaps are streamed in the background while the crawl runs
+        self.sitemap_ingestion = None
+
+        # Incremental runs revisit due URLs from crawled_data (-a incremental=1 or RECRAWL_ENABLED)
+        self.incremental = str(incremental).lower() in ("1", "true", "yes") if incremental else None
+        self.due_url_loading = None
+
+    @classmethod
+    def update_settings(cls, settings):
+        super().update_settings(settings)
+        # Browser args follow the render settings as overridden (-s, job settings), not settings.py's values
+        settings.set(
+            "PLAYWRIGHT_LAUNCH_OPTIONS",
+            RenderProfile.launch_options(settings),
+            priority=settings.getpriority("PLAYWRIGHT_LAUNCH_OPTIONS") or "spider",
+        )
 
-        # Lookup in cached robots.txt rules
-        rp = self.robots_rules.get(domain_url, None)
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.setup(crawler.settings)
+        # robots.txt rules shared by all workers through Redis, fetched with the crawler's downloader
+        spider.robots = RobotsService.from_crawler(crawler, spider.redis_client, spider.frontier)
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(spider.spider_opened, signal=signals.spider_opened)
 
-        # If no robots.txt found, assume allowed
-        if rp is None:
-            return True  
+        # Initialize queue
+        spider.initialize_queue()
+        return spider
+
+    def setup(self, settings):
+        """Create the Redis-backed services that depend on crawler settings."""
+        # Identifies this process' leases when several workers share the frontier
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        # Redis connection, counting round-trips for the metrics endpoint
+        self.redis_client = redis.Redis(connection_pool=redis.ConnectionPool(
+            connection_class=CountingConnection,
+            host=settings.get("REDIS_HOST", "localhost"),
+            port=settings.getint("REDIS_PORT", 6379),
+            db=0,
+            decode_responses=True,
+        ))
+
+        # Per-stage latencies and counters, published by CrawlMetricsMiddleware
+        self.metrics = CrawlMetrics.from_settings(settings, self.worker_id, key_prefix=self.key_prefix)
+
+        # URL canonicalization ahead of dedup and classification; seeds get the same form as their links
+        self.canonicalizer = UrlCanonicalizer.from_settings(settings)
+        self.use_rel_canonical = settings.getbool("CANONICAL_USE_REL", True)
+        self.seed_urls = [self.canonicalizer.canonicalize(url).url for url in self.seed_urls]
+        self.seed_domains = {urlparse(url).netloc for url in self.seed_urls}
 
-        return rp.can_fetch("*", url)  # Check if URL is allowed
+        # Seeds indexed by origin and path, so scope checks do not scan every seed
+        self.scope = ScopeMatcher(self.seed_urls)
+
+        # Product URL classifier with per-domain overrides
+        self.classifier = UrlClassifier.from_settings(settings)
+        # ...confirmed or overruled by the JSON-LD / microdata / OpenGraph markup of crawled pages
+        self.use_structured_data = settings.getbool("STRUCTURED_DATA_ENABLED", True)
+        self.links_export_file = settings.get("LINKS_EXPORT_FILE", "all_extracted_links.json")
+
+        # Visited-set backend (exact set, 64-bit fingerprints or Bloom filter)
+        self.dedup = dedup_from_settings(self.redis_client, settings, key_prefix=self.key_prefix)
+        self.frontier = RedisFrontier(
+            self.redis_client, self.QUEUE_NAME, self.dedup,
+            host_delay=settings.getfloat("FRONTIER_HOST_DELAY", 1.0),
+            worker_id=self.worker_id,
+            lease_seconds=settings.getint("FRONTIER_LEASE_SECONDS", 300),
+            exploration_share=settings.getfloat("FRONTIER_EXPLORATION_SHARE", 0.1),
+        )
+        # Priorities of links before admission: product rules, URL/anchor tokens, depth, pattern yields
+        self.scorer = LinkScorer.from_settings(self.classifier, self.redis_client, settings, key_prefix=self.key_prefix)
+        self.leased_urls = set()  # URLs this worker currently holds leases on
+        self.lease_heartbeat = task.LoopingCall(self.heartbeat_leases)
+        self.lease_heartbeat_interval = settings.getfloat("FRONTIER_HEARTBEAT_INTERVAL", 60.0)
+
+        # Per-template admission counts and product yields; traps (calendars, endless pagination) get capped
+        self.templates = TemplateBudget.from_settings(self.redis_client, settings, key_prefix=self.key_prefix)
+
+        # SimHash index of processed pages; near-duplicate pages are not expanded
+        self.near_dups = NearDuplicateIndex.from_settings(self.redis_client, settings, key_prefix=self.key_prefix)
+
+        # Headless rendering profile that blocks heavy and tracking sub-requests
+        self.render_profile = RenderProfile.from_settings(settings)
+
+        # URLs per frontier admission while streaming sitemaps
+        self.sitemap_batch_size = settings.getint("SITEMAP_BATCH_SIZE", 1000)
+        # Set by the first worker of a job to stream the sitemaps, so the others skip them
+        self.SITEMAP_LOCK = f"{self.key_prefix}sitemaps_ingested"
+        self.sitemap_lock_seconds = settings.getint("SITEMAP_LOCK_SECONDS", 86400)
+
+        # Event-driven infinite scrolling with per-page and per-domain time budgets
+        self.scroller = InfiniteScroller.from_settings(self.redis_client, settings, key_prefix=self.key_prefix)
+
+        # Conditional revisits of known URLs and their adaptive revisit schedule
+        if self.incremental is None:
+            self.incremental = settings.getbool("RECRAWL_ENABLED")
+        self.database_url = settings.get("DATABASE_URL")
+        self.recrawl = RecrawlState.from_settings(self.redis_client, settings, key_prefix=self.key_prefix)
+
+    async def ingest_sitemaps(self):
+        """Stream sitemap URLs for every seed origin into the frontier, in worker threads."""
+        from twisted.internet import reactor
+
+        if not self.redis_client.set(self.SITEMAP_LOCK, self.worker_id, nx=True, ex=self.sitemap_lock_seconds):
+            self.logger.info("ℹ️ Sitemaps are already being ingested by another worker of this crawl")
+            return
 
-    def fetch_sitemap_links(self, domain):
-        """Fetch all links from sitemap.xml (if available)"""
-        sitemap_url = f"https://{domain}/sitemap.xml"
-        self.logger.info(f"🔍 Checking for sitemap: {sitemap_url}")
+        origins = sorted({origin_of(url) for url in self.seed_urls})
+        await self.robots.load(origins)  # robots.txt lists the sitemaps
 
-        try:
-            response = requests.get(sitemap_url, timeout=5)
-            if response.status_code == 200 and "xml" in response.headers.get("Content-Type", ""):
-                tree = etree.fromstring(response.content)
-                sitemap_links = tree.xpath("//url/loc/text()")  # Extract <loc> links
-                
-                self.logger.info(f"✅ Found {len(sitemap_links)} links in sitemap.xml for {domain}")
-                return [link.rstrip("/") for link in sitemap_links]
-            else:
-                self.logger.warning(f"⚠️ Sitemap not found or not accessible: {sitemap_url}")
-                return []
-        except requests.exceptions.RequestException as e:
-            self.logger.warning(f"⚠️ Failed to fetch sitemap for {domain}: {e}")
-            return []
-        except Exception as e:
-            self.logger.error(f"❌ Unexpected error processing sitemap for {domain}: {e}")
-            return []
+        streamer = SitemapStreamer(
+            sink=lambda batch: threads.blockingCallFromThread(reactor, self.admit_sitemap_batch, batch),
+            batch_size=self.sitemap_batch_size,
+        )
+        ingestions = []
+        for origin in origins:
+            sitemap_urls = self.robots.sitemaps(origin) or [f"{origin}/sitemap.xml"]
+            self.logger.info(f"🔍 Streaming sitemaps for {origin}: {sitemap_urls}")
+            d = threads.deferToThread(streamer.ingest, sitemap_urls)
+            d.addCallback(lambda count, origin=origin: self.logger.info(f"✅ Read {count} sitemap URLs for {origin}"))
+            d.addErrback(lambda failure, origin=origin: self.logger.error(
+                f"❌ Unexpected error processing sitemaps for {origin}: {failure.value}"))
+            ingestions.append(d)
+        self.sitemap_ingestion = defer.DeferredList(ingestions)
+
+    def admit_sitemap_batch(self, urls):
+        """Reactor-side sink for SitemapStreamer; the worker thread blocks until the batch is admitted."""
+        async def admit():
+            canonical = self.canonicalize_links(urls)
+            # Sitemap URLs have no anchor text or parent page; score them as links from the seed
+            priorities = self.scorer.score(dict.fromkeys(canonical, ""), depth=1)
+            admitted = await self.enqueue_urls(canonical, priorities, depth=1)
+            items = list(self.items_for_admitted(admitted))
+            self.templates.record_admitted(admitted, [item["url"] for item in items if isinstance(item, ProductLinkItem)])
+            await maybe_deferred_to_future(self.process_items(items))
+        return defer.Deferred.fromFuture(asyncio.ensure_future(admit()))
+
+    def load_due_urls(self):
+        """Claim URLs due for a revisit in PostgreSQL and queue them on the frontier. Blocking; runs in a worker thread."""
+        count = 0
+        for batch in self.recrawl.iter_due(self.database_url, self.seed_domains):
+            self.frontier.requeue(batch)  # Already in the visited set, so bypass dedup
+            count += len(batch)
+        return count
+
+    def process_items(self, items):
+        """Send items produced outside a callback through the item pipelines."""
+        scraper = self.crawler.engine.scraper
+        return defer.DeferredList([scraper.start_itemproc(item, response=None) for item in items])
 
     def initialize_queue(self):
         """Ensure BFS resumes if stopped, by restoring unprocessed URLs to the queue."""
         self.logger.info("🔄 Checking Redis for unprocessed URLs...")
-        unfinished_urls = self.redis_client.smembers(self.PROCESSING_SET)
-
-        # Restore unfinished URLs to the queue
-        for url in unfinished_urls:
-            self.redis_client.lpush(self.QUEUE_NAME, url)
-        self.redis_client.delete(self.PROCESSING_SET)  # Clear processing set
-        self.logger.info(f"✅ Requeued {len(unfinished_urls)} URLs for BFS restart")
-
-        # Fetch and prioritize sitemap links first
-        for domain in self.seed_domains:
-            sitemap_links = self.fetch_sitemap_links(domain)  # Fetch sitemap.xml links
-            for link in sitemap_links:
-                self.redis_client.lpush(self.QUEUE_NAME, link)  # PRIORITIZE Sitemap links
-                self.redis_client.sadd("visited_links", link)
-
-        # Enqueue seed URLs if queue is empty
-        if self.redis_client.llen(self.QUEUE_NAME) == 0:
-            for url in self.seed_urls:
-                self.redis_client.lpush(self.QUEUE_NAME, url)
-                self.redis_client.sadd("visited_links", url)
+
+        # Requeue only URLs whose lease expired; live workers keep their in-flight URLs
+        reaped = self.frontier.reap_expired()
+        self.logger.info(f"✅ Requeued {reaped} URLs with expired leases for BFS restart")
+
+        # Carry over the single-worker processing set used before leases existed
+        if self.redis_client.type(self.PROCESSING_SET) == "set":
+            unfinished_urls = self.redis_client.smembers(self.PROCESSING_SET)
+            self.frontier.requeue(unfinished_urls)
+            self.redis_client.delete(self.PROCESSING_SET)
+            self.logger.info(f"✅ Requeued {len(unfinished_urls)} URLs from the legacy processing set")
+
+        # Carry over a queue left behind by the old single-list frontier
+        legacy = self.frontier.import_legacy_queue()
+        if legacy:
+            self.logger.info(f"✅ Moved {legacy} URLs from the legacy crawl_queue list to per-host queues")
+
+        # And the FIFO host lists used before best-first ordering
+        moved = self.frontier.import_host_lists()
+        if moved:
+            self.logger.info(f"✅ Moved {moved} URLs from FIFO host lists to scored host queues")
+
+        # Enqueue seed URLs if queue is empty and no other worker is mid-crawl
+        if len(self.frontier) == 0 and self.frontier.leased_count() == 0:
+            self.frontier.push(self.seed_urls, depth=0)
             self.logger.info("🚀 BFS queue initialized with seed URLs")
 
+    def spider_idle(self):
+        """Keep the spider alive while more URLs may still reach the frontier."""
+        if self.frontier.reap_expired() or len(self.frontier):
+            raise DontCloseSpider  # The scheduler picks them up
+        if self.sitemap_ingestion is not None and not self.sitemap_ingestion.called:
+            raise DontCloseSpider  # Sitemaps are still streaming in
+        if self.due_url_loading is not None and not self.due_url_loading.called:
+            raise DontCloseSpider  # Due URLs are still being loaded
+        if self.leased_urls:
+            # Nothing is in flight while the spider is idle, so these leases leaked (a callback raised)
+            self.logger.warning(f"⚠️ Releasing {len(self.leased_urls)} leases of URLs that failed to process")
+            for url in list(self.leased_urls):
+                self.mark_url_done(url)
+        if self.frontier.leased_count():
+            raise DontCloseSpider  # Other workers are still parsing pages that may add links
+
     def start_requests(self):
+        # Requests come from the Redis frontier through RedisFrontierScheduler (SCHEDULER setting)
         self.logger.info("🚀 Starting BFS crawler with Redis queue")
-        return self.perform_bfs()
+        return []
 
     def generate_crawled_data(self, url):
-        """Generate values for crawled_data insertion."""
-        
-        domain = urlparse(url).netloc  # Extract domain
-        title = None  # Placeholder, will be updated after crawling
-        content = None  # Placeholder, will be updated after crawling
-        status_code = None  # Placeholder, will be updated after crawling
-        created_at = datetime.utcnow()
-
-        return (domain, url, title, content, status_code, created_at)
-    def enqueue_url(self, url):
-        """Add a URL to Redis queue if not already visited or in queue."""
-    
-            # Check if the URL is already in the visited set in Redis
-        if self.redis_client.sismember("visited_links", url):
-            return  # Skip already visited URLs
+        """Generate a crawled_data item for a newly admitted URL."""
         
-        # ✅ Check robots.txt before enqueueing
-        if not self.is_allowed_by_robots(url):
-            self.logger.warning(f"🚫 Blocked by robots.txt: {url}")
-            return
-            
-        # Mark the URL as visited by adding it to Redis set
-        self.redis_client.sadd("visited_links", url)
+        return CrawledDataItem(
+            domain=urlparse(url).netloc,  # Extract domain
+            url=url,
+            title=None,  # Placeholder, will be updated after crawling
+            content=None,  # Placeholder, will be updated after crawling
+            status_code=None,  # Placeholder, will be updated after crawling
+            created_at=datetime.utcnow(),
+        )
 
-        # Push the URL into the BFS queue
-        self.redis_client.lpush(self.QUEUE_NAME, url)
+    async def enqueue_url(self, url):
+        """Add a URL to Redis queue if not already visited or in queue."""
+        return await self.enqueue_urls([url])
 
-        # Generate data for insertion
-        crawled_data = self.generate_crawled_data(url)
+    async def enqueue_urls(self, urls, priorities=None, depth=None):
+        """
+        Admit a batch of URLs to the Redis queue in one round-trip and return the new ones.
 
-        # Insert the URL into PostgreSQL (avoid duplicates)
-        try:
-            insert_query = """
-                INSERT INTO crawled_data (domain, url, title, content, status_code, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (url) DO NOTHING;
-            """
-            self.db_cursor.execute(insert_query, crawled_data)
-            self.db_conn.commit()
-        except Exception as e:
-            self.logger.error(f"❌ Database error while inserting {url}: {e}")
+        ``priorities`` (from the link scorer) order them in their host queues; ``depth``
+        is their click depth, handed back with the URL when it is leased.
+        """
+        urls = list(urls)
+        candidates = []
+        # ✅ Check robots.txt before enqueueing, for the whole batch at once
+        for url, allowed in zip(urls, await self.robots.allowed(urls)):
+            if not allowed:
+                self.logger.warning(f"🚫 Blocked by robots.txt: {url}")
+                continue
+            candidates.append(url)
+
+        # Dedup, mark visited and push atomically on the Redis side
+        admitted = self.frontier.admit(candidates, priorities, depth)
+        if admitted:
+            self.logger.info(f"➕ Added {len(admitted)} URLs to queue")
+        return admitted
+
+    def canonicalize_links(self, links):
+        """Canonicalize discovered links, counting per rule how many URLs it rewrote and collapsed."""
+        urls, rewritten, collapsed = self.canonicalizer.canonicalize_all(links)
+        stats = self.crawler.stats
+        for rule, count in rewritten.items():
+            stats.inc_value(f"canonical/rewritten/{rule}", count)
+        for rule, count in collapsed.items():
+            stats.inc_value(f"canonical/collapsed/{rule}", count)
+        return urls
+
+    def is_canonical_duplicate(self, response):
+        """
+        Claim the page's ``<link rel="canonical">`` URL in the visited set.
 
-        # checking if the url is a product page
-        if self.is_product_page(url):
-            self.store_product_link(url)
+        Returns True when another page already claimed it (or it was crawled
+        itself): this page is a variant of one whose links are already being
+        followed. A newly claimed canonical URL is never fetched on its own.
+        Pages of a listing pointing their canonical at its first page are not
+        variants, and are always expanded.
+        """
+        declared = rel_canonical(response)
+        if not declared:
+            return False
+        url = response.meta.get("frontier_url", response.url)
+        canonical = self.canonicalizer.canonicalize(declared).url
+        if canonical == url or urlparse(canonical).netloc != urlparse(url).netloc:
+            return False  # Self-referencing, or a cross-domain canonical the crawl does not own
+        if differs_by_pagination(url, canonical):
+            self.crawler.stats.inc_value("canonical/rel_canonical/paginated")
+            return False
+        if self.dedup.add_new([canonical]):
+            self.crawler.stats.inc_value("canonical/rel_canonical/claimed")
+            return False
+        self.crawler.stats.inc_value("canonical/rel_canonical/collapsed")
+        return True
+
+    def is_near_duplicate(self, response, links, rendered):
+        """
+        Fingerprint the page's content and claim it in the near-duplicate index.
 
-        self.logger.info(f"➕ Added to queue: {url}")
+        Returns True when an already processed page has nearly the same content
+        (a sort, view or print variant, for example). Its links are then not
+        expanded; the work skipped is counted in the ``neardup/*`` stats.
+        """
+        if not self.near_dups.enabled:
+            return False
+        stats = self.crawler.stats
+        with self.metrics.timer("fingerprint"):
+            fingerprint = self.near_dups.fingerprint(response)
+            if fingerprint is None:
+                stats.inc_value("neardup/not_fingerprinted")
+                return False
+            original = self.near_dups.check(fingerprint)
+        if original is None:
+            stats.inc_value("neardup/unique")
+            return False
+
+        domain = urlparse(response.url).netloc
+        stats.inc_value("neardup/duplicates")
+        stats.inc_value("neardup/links_skipped", len(links))
+        self.metrics.inc("crawler_near_duplicates_total", domain=domain)
+        self.metrics.inc("crawler_near_duplicate_links_skipped_total", len(links), domain=domain)
+        if rendered:
+            stats.inc_value("neardup/renders_cut")  # No scrolling or DOM link collection (nor network-idle wait, if static)
+        self.logger.info(f"👯 Near-duplicate of an earlier page ({fingerprint} ~ {original}), not expanding: {response.url}")
+        return True
+
+    def items_for_admitted(self, urls):
+        """Yield the crawled_data and product_links items for newly admitted URLs."""
+        for url in urls:
+            yield self.generate_crawled_data(url)
+
+        # checking which urls are product pages, labelling the whole batch in one pass
+        for result in self.classifier.classify(urls):
+            if result.is_product:
+                self.logger.debug(f"🏷️ Product URL {result.url} matched rule '{result.include_rule}'")
+                yield self.generate_product_link(result.url)
 
     def is_product_page(self, url):
         """
         Determines if a given URL is a product page based on its structure and keywords.
         """
-        product_patterns = [
-            r"/product/[\w-]+",      # /product/iphone-13
-            r"/p/[\w-]+",            # /p/iphone-13
-            r"/item/[\w-]+",         # /item/12345
-            r"/dp/[\w-]+",           # Amazon-style /dp/B09G3HRMVS
-            r"/store/[\w-]+",        # /store/shoes
-            r"/products/[\w-]+",     # /products/laptop
-            r"\?product_id=\d+",     # ?product_id=12345
-            r"\?sku=[\w-]+",         # ?sku=ABC123
-        ]
-        
-        # Exclude common non-product pages
-        exclude_patterns = [
-            r"/cart", r"/checkout", r"/login", r"/register",
-            r"/search", r"/category", r"/shop$", r"/collections"
-        ]
-
-        # Check if the URL contains product-related keywords
-        for pattern in product_patterns:
-            if re.search(pattern, url, re.IGNORECASE):
-                # Ensure it's not a false positive (e.g., a category page)
-                if not any(re.search(excl, url, re.IGNORECASE) for excl in exclude_patterns):
-                    return True
-        return False
-
-    def store_product_link(self, url):
+        return self.classifier.is_product_url(url)
+
+    def generate_product_link(self, url):
         """
-        Stores the detected product URLs in a JSON file.
+        Generate a product_links item; the bulk writer pipeline stores it in PostgreSQL.
         """
-        # Extract domain from URL
-        domain = urlparse(url).netloc
-
-        try:
-            # Insert product link into PostgreSQL (Avoid duplicates using ON CONFLICT)
-            insert_query = """
-                INSERT INTO product_links (domain, url, created_at)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (url) DO NOTHING;
-            """
-            self.db_cursor.execute(insert_query, (domain, url, datetime.utcnow()))
-            self.db_conn.commit()
-
-            self.logger.info(f"✅ Product link stored in DB: {url}")
-
-        except Exception as e:
-            self.logger.error(f"❌ Error storing product link in DB: {str(e)}")
-
-    def dequeue_url(self):
-        """Fetch a URL for processing and move it to processing set."""
-        url = self.redis_client.rpop(self.QUEUE_NAME)  # Dequeue URL
-        if url:
-            self.redis_client.sadd(self.PROCESSING_SET, url)  # Mark as processing
-        return url
-
-    def mark_url_done(self, url):
-        """Remove URL from processing set after successful processing."""
-        self.redis_client.srem(self.PROCESSING_SET, url)
-
-    def get_seed_url_for_link(self, link):
-        """Find which seed domain a link belongs to."""
-        for seed in self.seed_urls:
-            if link.startswith(seed):
-                return seed  
-        return None  
-
-    def perform_bfs(self):
-        self.logger.info(f"🟢 Queue size before BFS iteration: {self.redis_client.llen(self.QUEUE_NAME)}")
-        
-        while self.redis_client.llen(self.QUEUE_NAME) > 0:
-            next_url = self.dequeue_url()
-            if not next_url:
-                break  # Stop BFS if queue is empty
-
-            domain = urlparse(next_url).netloc
-            corresponding_seed = self.get_seed_url_for_link(next_url)
-            
-            if not corresponding_seed:
-                self.logger.info(f"🚫 Skipping external domain: {next_url}")
-                continue
-
-
-
-            self.logger.info(f"🌍 Crawling: {next_url}")
+        return ProductLinkItem(
+            domain=urlparse(url).netloc,  # Extract domain from URL
+            url=url,
+            created_at=datetime.utcnow(),
+        )
 
-            yield scrapy.Request(
-                url=next_url, 
-                callback=self.parse_page, 
-                meta={"playwright": True, "playwright_include_page": True}, 
-                dont_filter=True
+    def confirm_product(self, response):
+        """
+        Judge the page by its JSON-LD, microdata and OpenGraph markup. Returns a
+        ProductItem when the markup confirms a product (whether or not the URL rules
+        matched it), or rejects a URL the rules took for a product; None otherwise.
+        """
+        if not self.use_structured_data:
+            return None
+        with self.metrics.timer("structured_data"):
+            found = extract_product(response)
+        if found.is_product is None:
+            return None
+
+        url = response.meta.get("frontier_url", response.url)
+        domain = urlparse(url).netloc
+        matched = self.classifier.is_product_url(url)
+        if found.is_product:
+            self.crawler.stats.inc_value(f"structured/confirmed/{found.source}")
+            self.metrics.inc("crawler_structured_products_total", source=found.source, domain=domain)
+            if not matched:
+                self.crawler.stats.inc_value("structured/missed_by_rules")
+                self.logger.info(f"🏷️ Product found by its {found.source} markup, not by the URL rules: {url}")
+            return ProductItem(
+                domain=domain,
+                url=url,
+                name=found.name[:500] if found.name else None,
+                price=found.price,
+                currency=found.currency,
+                availability=found.availability,
+                source=found.source,
+                confirmed_at=datetime.utcnow(),
             )
+        if not matched:
+            return None
+        self.crawler.stats.inc_value("structured/rejected")
+        self.metrics.inc("crawler_structured_products_total", source="rejected", domain=domain)
+        self.logger.info(f"🚫 Not a product page ({found.source}: {found.reason}): {url}")
+        return ProductItem(domain=domain, url=url, source="rejected", confirmed_at=datetime.utcnow())
+
+    def lease_urls(self, count):
+        """Lease up to ``count`` URLs from hosts that are ready now, as (url, depth) pairs."""
+        leased = self.frontier.dequeue_many(count)
+        self.leased_urls.update(url for url, _ in leased)  # Kept alive by heartbeat_leases until done
+        return leased
 
+    def mark_url_done(self, url):
+        """Release the URL's lease after processing."""
+        self.leased_urls.discard(url)
+        self.frontier.release(url)
 
-    async def scroll_page(self, page, timeout=5000, max_attempts=10):
-        previous_height = await page.evaluate("document.body.scrollHeight")
-        attempts = 0
-
-        while attempts < max_attempts:
-            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            await page.wait_for_timeout(2000)  # Allow time for new content to load
-
-            new_height = await page.evaluate("document.body.scrollHeight")
+    def heartbeat_leases(self):
+        """Extend this worker's leases and requeue URLs abandoned by dead workers."""
+        try:
+            self.frontier.heartbeat(self.leased_urls)
+            reaped = self.frontier.reap_expired()
+            if reaped:
+                self.logger.info(f"♻️ Requeued {reaped} URLs with expired leases")
+        except redis.RedisError as e:
+            self.logger.warning(f"⚠️ Lease heartbeat failed: {e}")
+
+    async def spider_opened(self, spider):
+        self.lease_heartbeat.start(self.lease_heartbeat_interval, now=False)
+
+        if self.incremental:
+            self.due_url_loading = threads.deferToThread(self.load_due_urls)
+            self.due_url_loading.addCallback(lambda count: self.logger.info(f"♻️ Queued {count} URLs due for a revisit"))
+            self.due_url_loading.addErrback(lambda failure: self.logger.error(
+                f"❌ Failed to load URLs due for a revisit: {failure.value}"))
+
+        # Feed sitemap links into the frontier (needs the engine for robots.txt checks)
+        await self.ingest_sitemaps()
+
+    def handle_error(self, failure):
+        """Release the lease of a request that failed after Scrapy's own retries, recording failed revisits."""
+        request = failure.request
+        url = request.meta.get("frontier_url", request.url)
+        self.logger.error(f"❌ Request failed: {request.url} ({failure.value!r})")
+        self.mark_url_done(url)
+        if "recrawl" not in request.meta:
+            return None
+        # Without a result the row stays due and its parked validators are never dropped
+        self.recrawl.forget(url)
+        response = getattr(failure.value, "response", None)
+        self.crawler.stats.inc_value("recrawl/failed")
+        return [self.recrawl.error_item(url, request.meta["recrawl"], getattr(response, "status", None))]
+
+    def frontier_request(self, url, depth=None):
+        """Request for a leased frontier URL, or None (lease released) if it is out of scope."""
+        if self.scope.seed_for(url) is None:
+            self.logger.info(f"🚫 Skipping external domain: {url}")
+            self.mark_url_done(url)
+            return None
+        self.logger.info(f"🌍 Crawling: {url}")
+        return self.build_request(url, depth=depth)
+
+    def wants_render(self, url):
+        """Whether pages of this URL's domain are rendered with Playwright; always, for this spider."""
+        return True
+
+    def build_request(self, url, render=None, depth=None):
+        """Build the Scrapy request for a frontier URL, rendered unless it is a conditional revisit."""
+        meta = {"frontier_url": url, "crawl_depth": depth}
+        headers = {}
+        validators = self.recrawl.validators(url) if self.incremental else None
+        if validators is not None:
+            # Revisits start with a plain conditional GET; parse_page re-renders only if the page changed
+            meta.update(recrawl=validators, handle_httpstatus_list=[304])
+            headers = self.recrawl.conditional_headers(validators)
+            render = False
+        elif render is None:
+            render = self.wants_render(url)
+        if render:
+            meta.update({
+                "playwright": True,
+                "playwright_include_page": True,
+                "playwright_page_init_callback": self.render_profile.install,
+            })
+        return scrapy.Request(
+            url=url, 
+            callback=self.parse_page, 
+            errback=self.handle_error,
+            headers=headers,
+            meta=meta, 
+            dont_filter=True
+        )
 
-            if new_height == previous_height:
-                attempts += 1  # Increase attempt count if no new content
-                await page.wait_for_timeout(timeout)  # Wait before checking again
-            else:
-                attempts = 0  # Reset attempts if content is loaded
+    async def scroll_page(self, page, url):
+        """Scroll dynamically until no new anchors appear, within the page and domain budgets."""
+        steps = await self.scroller.scroll(page, url)
+        if steps:
+            self.logger.info(f"📜 Scrolled {url} in {len(steps)} steps, new links per step: {steps}")
+        return steps
+
+    def record_render_stats(self, response):
+        """Add the render profile's per-request counters to the crawl stats."""
+        render_stats = response.meta.get("render_stats")
+        if not render_stats:
+            return
+        stats = self.crawler.stats
+        for name in ("allowed_requests", "allowed_bytes", "blocked_requests", "blocked_bytes"):
+            stats.inc_value(f"render/{name}", render_stats[name])
+        for reason, count in render_stats["blocked_by_reason"].items():
+            stats.inc_value(f"render/blocked/{reason}", count)
+        self.logger.debug(f"🧱 Render profile for {response.url}: {render_stats}")
+
+    async def close_page(self, page, response):
+        try:
+            await page.close()
+        except Exception as e:
+            self.logger.warning(f"⚠️ Failed to close Playwright page: {e}")
+        self.record_render_stats(response)
 
-            previous_height = new_height
+    def check_revisit(self, response):
+        """
+        Record the outcome of a conditional revisit and return (item, changed).
 
-            # Stop scrolling if no new content appears after multiple attempts
-            if attempts >= max_attempts:
-                break
-        
+        A 304 or an unchanged content hash means the page is skipped: no render, no
+        link extraction. The validators are dropped from Redis either way, so a
+        follow-up rendered request for a changed page is built as a normal one.
+        A page whose stored hash cannot be compared is processed as changed, but
+        not counted as a change in its revisit schedule.
+        """
+        validators = response.meta["recrawl"]
+        self.recrawl.forget(response.meta["frontier_url"])
+        changed = self.recrawl.is_changed(response, validators)
+        if changed is None:
+            self.crawler.stats.inc_value("recrawl/incomparable")
+            return self.recrawl.result_item(response, validators, changed=False), True
+        self.crawler.stats.inc_value("recrawl/changed" if changed else "recrawl/unchanged")
+        return self.recrawl.result_item(response, validators, changed), changed
 
     async def parse_page(self, response):
         page = response.meta.get("playwright_page", None)
-        static_links, js_links, sitemap_links = set(), set(), set()
 
+        # Incremental revisit: stop here unless the page changed since the last crawl
+        if "recrawl" in response.meta:
+            url = response.meta["frontier_url"]
+            item, changed = self.check_revisit(response)
+            yield item
+            if not changed:
+                self.logger.info(f"💤 Unchanged since last crawl: {url}")
+                self.mark_url_done(url)
+                return
+            if page is None and self.wants_render(url):
+                request = self.build_request(url, render=True, depth=response.meta.get("crawl_depth"))
+                request.meta["recrawl_changed"] = True  # Its crawl was already recorded above
+                yield request
+                return
+        elif not response.meta.get("recrawl_changed"):
+            # Store validators and content hash so the next incremental run can revisit cheaply
+            yield self.recrawl.result_item(response)
+
+            # A variant of a page that is already crawled or queued: its links add nothing
+            if self.use_rel_canonical and self.is_canonical_duplicate(response):
+                self.logger.info(f"🔗 Duplicate of its rel=canonical URL, not expanding: {response.url}")
+                if page:
+                    await self.close_page(page, response)
+                self.mark_url_done(response.meta["frontier_url"])
+                return
+        # Confirm or reject the page as a product from its structured data (static HTML is enough)
+        product = self.confirm_product(response)
+        if product is not None:
+            yield product
+
+        links = LinkCollector()  # Static, rendered and sitemap links, deduplicated as they come in
+        # Content fingerprints are only claimed on first visits; a revisit would match itself
+        first_visit = "recrawl" not in response.meta and not response.meta.get("recrawl_changed")
+        duplicate = False
 
         # JavaScript Crawling
         try:
             # Static Crawling
-            extractor = LinkExtractor()
-            static_links = {urljoin(response.url, link.url) for link in extractor.extract_links(response)}
-            if page:
-                await page.wait_for_load_state("networkidle")
-                js_links = set(await page.evaluate("Array.from(document.querySelectorAll('a')).map(a => a.href)"))
-
-                await self.scroll_page(page)  # Call the function to scroll dynamically
+            with self.metrics.timer("link_extraction"):
+                links.add_response(response)
+            # A variant of a page already processed: skip rendering work and link expansion. A JavaScript
+            # shell is only fingerprinted once rendered; its static HTML looks like every other shell
+            settled = page is None or not (first_visit and self.near_dups.enabled) or self.near_dups.settled(response)
+            duplicate = first_visit and settled and self.is_near_duplicate(response, links, rendered=page is not None)
+            if page and not duplicate:
+                with self.metrics.timer("network_idle"):
+                    await page.wait_for_load_state("networkidle")
+                if not settled:
+                    rendered_response = response.replace(body=await page.content())
+                    duplicate = self.is_near_duplicate(rendered_response, links, rendered=True)
+            if page and not duplicate:
+                with self.metrics.timer("scroll"):
+                    await self.scroll_page(page, response.url)  # Call the function to scroll dynamically
+
+                # Collect anchors after scrolling so infinitely loaded links are included
+                with self.metrics.timer("js_anchors"):
+                    links.add_anchors(await page.evaluate(DOM_LINKS_JS))
         except Exception as e:
             self.logger.error(f"❌ Error while parsing page {response.url}: {e}")
         finally:
-                if page:
-                    try:
-                        await page.close()
-                    except Exception as e:
-                        self.logger.warning(f"⚠️ Failed to close Playwright page: {e}")
-
-        # Sitemap Parsing
-        if response.url.endswith("sitemap.xml") and "xml" in response.headers.get("Content-Type", "").decode():
-            sitemap_links = set(response.xpath("//url/loc/text()").getall())
+            if page:
+                await self.close_page(page, response)
 
-        new_links = {link.rstrip("/") for link in (static_links | js_links | sitemap_links)}
+        frontier_url = response.meta.get("frontier_url", response.url)
+        if duplicate:
+            self.scorer.record(frontier_url, 0)  # Variants yield nothing; their URL pattern should sink
+            self.templates.record_page(frontier_url, 0)
+            self.mark_url_done(frontier_url)
+            return
 
-        # Add new links to Redis queue
-        for link in new_links:
-            corresponding_seed = self.get_seed_url_for_link(link)
-            if not corresponding_seed:
-                self.logger.info(f"🚫 Skipping external domain: {link}")
-                continue
-            self.enqueue_url(link)  # Will handle visited check automatically
+        # Sitemap Parsing
+        if response.url.endswith("sitemap.xml") and "xml" in response.headers.get("Content-Type", b"").decode():
+            links.add_all(url.strip() for url in response.xpath("//*[local-name()='url']/*[local-name()='loc']/text()").getall())
+
+        new_links = self.canonicalize_links(links)
+
+        # Add new links to Redis queue in a single batched admission
+        in_scope_links = self.scope.in_scope(new_links)
+        if len(in_scope_links) < len(new_links):
+            self.crawler.stats.inc_value("scope/external_links", len(new_links) - len(in_scope_links))
+            self.logger.debug(f"🚫 Skipped {len(new_links) - len(in_scope_links)} external links on {response.url}")
+        # Templates over their budget (crawl traps) admit nothing more
+        with self.metrics.timer("budget"):
+            allowed = self.templates.admissible(in_scope_links)
+        if len(allowed) < len(in_scope_links):
+            dropped = len(in_scope_links) - len(allowed)
+            self.crawler.stats.inc_value("templates/dropped_links", dropped)
+            self.metrics.inc("crawler_template_links_dropped_total", dropped, domain=urlparse(response.url).netloc)
+            self.logger.debug(f"🪤 Dropped {dropped} links of capped URL templates on {response.url}")
+            in_scope_links = allowed
+        # Best-first: score the links before admission; this page's yield is recorded once they are in
+        depth = (response.meta.get("crawl_depth") or 0) + 1
+        with self.metrics.timer("scoring"):
+            priorities = self.scorer.score(
+                {url: links.anchor(new_links[url]) for url in in_scope_links},
+                depth,
+                parent_url=frontier_url,
+            )
+            self.templates.adjust(priorities)
+        with self.metrics.timer("admission"):
+            admitted = await self.enqueue_urls(in_scope_links, priorities, depth)  # Will handle visited check automatically
+
+        # Hand the new rows to the bulk writer pipeline instead of writing SQL inline
+        product_urls = []
+        for item in self.items_for_admitted(admitted):
+            if isinstance(item, ProductLinkItem):
+                product_urls.append(item["url"])
+            yield item
+        new_products = len(product_urls)
+        self.scorer.record(frontier_url, new_products, len(admitted) - new_products)
+        self.templates.record_admitted(admitted, product_urls)
+        self.templates.record_page(frontier_url, new_products)
 
         self.logger.info(f"✅ Processed {response.url} | Discovered {len(new_links)} new links")
-        self.logger.info(f"🔍 Queue size after parsing {response.url}: {self.redis_client.llen(self.QUEUE_NAME)}")
-
-        # Mark URL as processed
-        self.mark_url_done(response.url)
+        self.logger.info(f"🔍 Queue size after parsing {response.url}: {len(self.frontier)}")
 
-        # Yield new requests from the updated queue
-        for request in self.perform_bfs():
-            yield request
+        # Mark URL as processed (by its frontier URL, which survives redirects)
+        self.mark_url_done(frontier_url)
 
     async def closed(self, reason):
         """Ensure Playwright is properly closed when Scrapy stops"""
         """Ensure Playwright is properly closed when Scrapy stops"""
         self.logger.info(f"🚀 Closing Playwright due to: {reason}")
+
+        if self.lease_heartbeat.running:
+            self.lease_heartbeat.stop()
+
+        try:
+            self.scorer.flush()  # Yields of the last pages, for the next run sharing this namespace
+        except redis.RedisError as e:
+            self.logger.warning(f"⚠️ Could not save URL pattern yields: {e}")
+        try:
+            self.templates.flush()
+        except redis.RedisError as e:
+            self.logger.warning(f"⚠️ Could not save URL template counts: {e}")
         
         try:
             if hasattr(self, "browser") and self.browser:
@@ -375,13 +716,37 @@ class ProductSpider(scrapy.Spider):
         except Exception as e:
             self.logger.warning(f"⚠️ Playwright failed to exit: {e}")
 
-        # Save extracted links
-        visited_links = list(self.redis_client.smembers("visited_links"))  # Fetch from Redis
+        # Report how much memory the visited set costs per URL
+        try:
+            stats = self.dedup.stats()
+            self.logger.info(f"📊 Visited set stats: {stats}")
+        except redis.RedisError as e:
+            self.logger.warning(f"⚠️ Could not read visited set stats: {e}")
+            try:
+                stats = {"items": self.dedup.count()}  # MEMORY USAGE may be disabled while the set is readable
+            except redis.RedisError:
+                stats = {"items": 0}
+
+        # Exact URLs are only kept by the set backend; the others rely on crawled_data in PostgreSQL
+        if self.dedup.name != SetDedup.name:
+            self.logger.info("ℹ️ Visited set stores fingerprints only; exact URLs are in the crawled_data table")
+            return
 
-        if not visited_links:
+        if not stats["items"]:
             self.logger.warning("❌ No links found. Check your crawling logic.")
-        else:
-            with open("all_extracted_links.json", "w") as f:
-                json.dump(visited_links, f, indent=4)
-            self.logger.info(f"✅ Saved {len(visited_links)} unique links to all_extracted_links.json")
+            return
+        if not self.links_export_file:
+            return
 
+        # Stream the set with SSCAN instead of loading it all with SMEMBERS
+        output = self.links_export_file
+        if self.job_id:
+            root, ext = os.path.splitext(output)
+            output = f"{root}.job-{self.job_id}{ext}"
+        with open(output, "w") as f:
+            f.write("[")
+            for i, link in enumerate(self.redis_client.sscan_iter(self.dedup.key, count=1000)):
+                f.write(",\n    " if i else "\n    ")
+                json.dump(link, f)
+            f.write("\n]")
+        self.logger.info(f"✅ Saved {stats['items']} unique links to {output}")
@@ -0,0 +1,22 @@
+from scrapy.exceptions import DontCloseSpider
+
+from product_crawler.spiders.product_spider import ProductSpider
+
+
+class SitemapSpider(ProductSpider):
+    """
+    Sitemap-only stage: streams the seed domains' sitemaps (discovered from
+    robots.txt, recursing through sitemap indexes, gzip or plain) into the shared
+    Redis frontier and exits without fetching any page. Run it alongside
+    product_spider workers to pre-fill the frontier for very large shops.
+    """
+    name = "sitemap_spider"
+    # Never pull pages from the frontier it fills
+    custom_settings = {"SCHEDULER": "scrapy.core.scheduler.Scheduler"}
+
+    def start_requests(self):
+        return []
+
+    def spider_idle(self):
+        if self.sitemap_ingestion is not None and not self.sitemap_ingestion.called:
+            raise DontCloseSpider
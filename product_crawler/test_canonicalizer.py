@@ -0,0 +1,37 @@
+import pytest
+
+from product_crawler.utils.canonicalizer import UrlCanonicalizer, differs_by_pagination
+
+
+@pytest.fixture
+def canonicalizer():
+    return UrlCanonicalizer({"shop.example.com": {"strip": ["sort"], "keep": None}})
+
+
+@pytest.mark.parametrize("url, expected, rules", [
+    ("https://Example.com:443/a/?utm_source=x&b=2&a=1#top", "https://example.com/a?a=1&b=2",
+     ("fragment", "host_case", "default_port", "tracking_param", "param_order", "trailing_slash")),
+    ("https://example.com/p/1;jsessionid=ABC?sid=9", "https://example.com/p/1", ("session_id",)),
+    ("https://example.com:8080/a", "https://example.com:8080/a", ()),
+    ("https://shop.example.com/c?sort=price&page=2", "https://shop.example.com/c?page=2", ("domain_strip",)),
+    ("mailto:someone@example.com", "mailto:someone@example.com", ()),
+])
+def test_canonicalize(canonicalizer, url, expected, rules):
+    result = canonicalizer.canonicalize(url)
+    assert result.url == expected
+    assert set(result.rules) == set(rules)
+
+
+def test_canonicalize_all_collapses_variants(canonicalizer):
+    seen, rewritten, collapsed = canonicalizer.canonicalize_all([
+        "https://example.com/a", "https://example.com/a/", "https://example.com/a?utm_medium=mail",
+    ])
+    assert seen == {"https://example.com/a": "https://example.com/a"}
+    assert collapsed["trailing_slash"] == 1
+
+
+def test_differs_by_pagination():
+    assert differs_by_pagination("https://example.com/c?page=3", "https://example.com/c")
+    assert differs_by_pagination("https://example.com/c/page/2/", "https://example.com/c")
+    assert not differs_by_pagination("https://example.com/c?color=red", "https://example.com/c")
+    assert not differs_by_pagination("https://example.com/c", "https://example.com/c")
@@ -0,0 +1,94 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")  # fakeredis runs the frontier's Lua scripts with lupa
+
+from product_crawler.utils.dedup import FingerprintDedup, SetDedup
+from product_crawler.utils.frontier import RedisFrontier
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture(params=[SetDedup, FingerprintDedup])
+def frontier(request, redis_client):
+    # No politeness delay, so every ready host can be dequeued again at once
+    return RedisFrontier(redis_client, dedup=request.param(redis_client), host_delay=0, worker_id="w1")
+
+
+def test_admit_returns_only_new_urls(frontier):
+    assert frontier.admit(["https://a.com/1", "https://a.com/2"]) == ["https://a.com/1", "https://a.com/2"]
+    assert frontier.admit(["https://a.com/2", "https://b.com/1", "https://b.com/1"]) == ["https://b.com/1"]
+    assert len(frontier) == 3
+
+
+def test_push_queues_seen_urls_again(frontier):
+    frontier.admit(["https://a.com/1"])
+    frontier.dequeue_many(1)
+    frontier.push(["https://a.com/1"], depth=0)
+    assert frontier.dequeue_many(1) == [("https://a.com/1", 0)]
+    assert frontier.admit(["https://a.com/1"]) == []
+
+
+def test_dequeue_takes_highest_priority_with_depth(frontier):
+    urls = ["https://a.com/low", "https://a.com/high", "https://a.com/mid"]
+    frontier.admit(urls, priorities={"https://a.com/low": 1, "https://a.com/high": 9, "https://a.com/mid": 5}, depth=2)
+    assert [frontier.dequeue_many(1)[0] for _ in urls] == [
+        ("https://a.com/high", 2), ("https://a.com/mid", 2), ("https://a.com/low", 2),
+    ]
+    assert frontier.dequeue_many(1) == []
+    assert frontier.leased_count() == 3
+
+
+def test_returned_leases_keep_score_and_depth(frontier, redis_client):
+    frontier.admit(["https://a.com/1", "https://a.com/2"], priorities={"https://a.com/1": 5, "https://a.com/2": 1}, depth=3)
+    [(url, depth)] = frontier.dequeue_many(1)
+    assert (url, depth) == ("https://a.com/1", 3)
+
+    assert frontier.return_leases([url]) == 1
+    assert frontier.leased_count() == 0
+    assert len(frontier) == 2
+    assert redis_client.zscore("crawl_queue:hostq:a.com", url) == -5
+    assert frontier.dequeue_many(1) == [("https://a.com/1", 3)]
+
+
+def test_return_leaves_other_workers_leases(frontier, redis_client):
+    frontier.admit(["https://a.com/1"])
+    other = RedisFrontier(redis_client, dedup=frontier.dedup, host_delay=0, worker_id="w2")
+    [(url, _)] = other.dequeue_many(1)
+    assert frontier.return_leases([url]) == 0
+    assert not frontier.release(url)
+    assert frontier.leased_count() == 1
+    assert other.release(url)
+    assert frontier.leased_count() == 0
+
+
+def test_reaped_leases_keep_score_and_depth(redis_client):
+    frontier = RedisFrontier(redis_client, host_delay=0, worker_id="w1", lease_seconds=0)
+    frontier.admit(["https://a.com/1", "https://a.com/2"], priorities={"https://a.com/1": 1, "https://a.com/2": 4}, depth=1)
+    frontier.dequeue_many(2)
+    assert len(frontier) == 0
+
+    assert frontier.reap_expired() == 2
+    assert frontier.leased_count() == 0
+    assert len(frontier) == 2
+    assert [frontier.dequeue_many(1)[0] for _ in range(2)] == [("https://a.com/2", 1), ("https://a.com/1", 1)]
+
+
+def test_heartbeat_keeps_leases_from_being_reaped(redis_client):
+    frontier = RedisFrontier(redis_client, host_delay=0, worker_id="w1", lease_seconds=60)
+    frontier.admit(["https://a.com/1"])
+    [(url, _)] = frontier.dequeue_many(1)
+    assert frontier.heartbeat([url]) == 1
+    assert frontier.reap_expired() == 0
+    assert frontier.leased_count() == 1
+
+
+def test_host_delay_spaces_out_dequeues(redis_client):
+    frontier = RedisFrontier(redis_client, host_delay=60, worker_id="w1")
+    frontier.admit(["https://a.com/1", "https://a.com/2", "https://b.com/1"])
+    assert sorted(url for url, _ in frontier.dequeue_many(3)) == ["https://a.com/1", "https://b.com/1"]
+    assert frontier.dequeue_many(1) == []
+    assert 0 < frontier.seconds_until_ready() <= 60
@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+import pytest
+from scrapy.http import HtmlResponse, Response
+
+from product_crawler.utils.structured_data import MICRODATA, NO_EVIDENCE, extract_product, parse_price
+
+
+def page(body):
+    return HtmlResponse("https://shop.example.com/item", body=f"<html><body>{body}</body></html>", encoding="utf-8")
+
+
+def json_ld(data):
+    return f'<script type="application/ld+json">{data}</script>'
+
+
+def microdata(name, price, container="div"):
+    return (
+        f'<{container}><div itemscope itemtype="https://schema.org/Product"><span itemprop="name">{name}</span>'
+        f'<div itemprop="offers" itemscope itemtype="https://schema.org/Offer">'
+        f'<meta itemprop="price" content="{price}"><meta itemprop="priceCurrency" content="eur"></div>'
+        f"</div></{container}>"
+    )
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1,299.00", Decimal("1299.00")),
+    ("1.299,00", Decimal("1299.00")),
+    ("€ 12", Decimal("12")),
+    ("12.5", Decimal("12.5")),
+    (19.99, Decimal("19.99")),
+    ("free", None),
+    (True, None),
+    (None, None),
+    ("99999999999", None),  # Too large for product_links.price
+])
+def test_parse_price(value, expected):
+    assert parse_price(value) == expected
+
+
+def test_json_ld_product():
+    found = extract_product(page(json_ld(
+        '{"@context": "https://schema.org", "@type": "Product", "name": "Kettle",'
+        ' "offers": {"@type": "Offer", "price": "24.90", "priceCurrency": "EUR",'
+        ' "availability": "https://schema.org/InStock"}}'
+    )))
+    assert found.is_product is True
+    assert found.source == "json-ld"
+    assert (found.name, found.price, found.currency, found.availability) == ("Kettle", Decimal("24.90"), "EUR", "InStock")
+
+
+def test_microdata_product():
+    found = extract_product(page(microdata("Kettle", "24.90")))
+    assert found.is_product is True
+    assert (found.source, found.name, found.price, found.currency) == (MICRODATA, "Kettle", Decimal("24.90"), "EUR")
+
+
+def test_related_products_do_not_hide_the_main_one():
+    found = extract_product(page(microdata("Kettle", "24.90") + microdata("Toaster", "30", container="aside")))
+    assert found.is_product is True
+    assert found.name == "Kettle"
+
+
+def test_several_products_are_a_listing():
+    found = extract_product(page(microdata("Kettle", "24.90") + microdata("Toaster", "30")))
+    assert found.is_product is False
+    assert found.reason == "2 products"
+
+
+def test_declared_listing_with_one_product_is_rejected():
+    found = extract_product(page(json_ld(
+        '[{"@type": "ItemList"}, {"@type": "Product", "name": "Kettle", "offers": {"price": "24.90"}}]'
+    )))
+    assert found.is_product is False
+    assert found.reason == "ItemList"
+
+
+def test_article_is_rejected():
+    found = extract_product(page(json_ld('{"@type": "BlogPosting", "headline": "Ten kettles"}')))
+    assert found.is_product is False
+
+
+def test_opengraph_product():
+    found = extract_product(page(
+        '<meta property="og:type" content="product"><meta property="og:title" content="Kettle">'
+        '<meta property="product:price:amount" content="24.90">'
+    ))
+    assert found.is_product is True
+    assert (found.source, found.name, found.price) == ("opengraph", "Kettle", Decimal("24.90"))
+
+
+def test_no_evidence():
+    assert extract_product(page("<p>Hello</p>")) == NO_EVIDENCE
+    assert extract_product(Response("https://shop.example.com/file.pdf", body=b"%PDF")) == NO_EVIDENCE
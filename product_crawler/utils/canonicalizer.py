@@ -0,0 +1,203 @@
+import fnmatch
+import json
+import re
+from collections import Counter, namedtuple
+from urllib.parse import parse_qsl, unquote_plus, urljoin, urlsplit, urlunsplit
+
+from scrapy.http import TextResponse
+
+# Query parameters that never change what a page shows. Glob patterns, matched case-insensitively.
+DEFAULT_TRACKING_PARAMS = [
+    "utm_*", "gclid", "gclsrc", "dclid", "gbraid", "wbraid", "fbclid", "msclkid", "yclid",
+    "twclid", "ttclid", "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "mkt_tok", "srsltid",
+]
+DEFAULT_SESSION_PARAMS = [
+    "jsessionid", "phpsessid", "sid", "sessionid", "session_id", "aspsessionid*", "cfid", "cftoken",
+    "zenid", "oscsid",
+]
+
+# Servlet-style session IDs carried as a path parameter: /product/1;jsessionid=ABC
+SESSION_PATH_RE = re.compile(r";(?:jsessionid|phpsessid|sid|sessionid)=[^/?#]*", re.IGNORECASE)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters and path suffixes (/page/2/) that number the pages of a listing
+PAGINATION_PARAMS = {"page", "p", "pg", "offset", "start"}
+PAGINATION_PATH_RE = re.compile(r"/page/\d+/?$", re.IGNORECASE)
+
+# Rule names end up in crawl stats (canonical/rewritten/<rule>), so keep them stable
+Canonicalization = namedtuple("Canonicalization", ["url", "rules"])
+
+
+def compile_globs(patterns):
+    """Combine glob patterns into one case-insensitive regex, or None when there are none."""
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns), re.IGNORECASE)
+
+
+class ParamRules:
+    """Which query parameters one domain drops, and the rule each one is dropped by."""
+
+    def __init__(self, tracking, session, strip=None, keep=None):
+        self.tracking_re = compile_globs(tracking)
+        self.session_re = compile_globs(session)
+        self.strip_re = compile_globs(strip)
+        self.keep_re = compile_globs(keep)
+
+    def strip_rule(self, name):
+        """Return the rule that drops parameter ``name``, or None to keep it."""
+        if self.keep_re is not None and self.keep_re.match(name):
+            return None  # Listed params are never dropped, even if a default rule matches
+        if self.tracking_re is not None and self.tracking_re.match(name):
+            return "tracking_param"
+        if self.session_re is not None and self.session_re.match(name):
+            return "session_id"
+        if self.strip_re is not None and self.strip_re.match(name):
+            return "domain_strip"
+        if self.keep_re is not None:
+            return "unlisted_param"
+        return None
+
+
+class UrlCanonicalizer:
+    """
+    Rewrites URLs to one canonical form before they are deduplicated and classified.
+
+    Fragments, host case, default ports, session IDs, tracking parameters, query
+    parameter order and trailing slashes are normalized for every http(s) URL;
+    other schemes are returned unchanged. Domain rules look like::
+
+        {"shop.example.com": {"strip": ["sort", "view", "filter_*"], "keep": ["page", "q"]}}
+
+    ``strip`` drops more parameters. ``keep`` turns the query into an allowlist:
+    unlisted parameters are dropped, and listed ones survive the default rules.
+    """
+
+    def __init__(self, domain_rules=None, tracking_params=None, session_params=None):
+        self.tracking_params = DEFAULT_TRACKING_PARAMS if tracking_params is None else tracking_params
+        self.session_params = DEFAULT_SESSION_PARAMS if session_params is None else session_params
+        self.default_rules = ParamRules(self.tracking_params, self.session_params)
+        self.domain_rules = {
+            domain.lower(): ParamRules(
+                self.tracking_params, self.session_params,
+                strip=override.get("strip"), keep=override.get("keep"),
+            )
+            for domain, override in (domain_rules or {}).items()
+        }
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build a canonicalizer from CANONICAL_URL_RULES and/or a CANONICAL_URL_RULES_FILE JSON file."""
+        domain_rules = dict(settings.getdict("CANONICAL_URL_RULES"))
+        rules_file = settings.get("CANONICAL_URL_RULES_FILE")
+        if rules_file:
+            with open(rules_file) as f:
+                domain_rules.update(json.load(f))
+        return cls(
+            domain_rules,
+            tracking_params=settings.getlist("CANONICAL_TRACKING_PARAMS") or None,
+            session_params=settings.getlist("CANONICAL_SESSION_PARAMS") or None,
+        )
+
+    def canonicalize(self, url):
+        """Return the canonical form of ``url`` and the rules that changed it."""
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            return Canonicalization(url, ())  # Malformed netloc or port: leave it to the scope check
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return Canonicalization(url, ())
+
+        rules = []
+        if "#" in url:
+            rules.append("fragment")
+
+        userinfo, _, host_port = parts.netloc.rpartition("@")
+        if parts.scheme != scheme or host_port != host_port.lower():
+            rules.append("host_case")
+        host = parts.hostname  # Already lowercased
+        if ":" in host:
+            host = f"[{host}]"  # IPv6 literal
+        if port is not None and port != DEFAULT_PORTS[scheme]:
+            host = f"{host}:{port}"
+        elif port is not None:
+            rules.append("default_port")
+        netloc = f"{userinfo}@{host}" if userinfo else host
+
+        path = parts.path
+        if SESSION_PATH_RE.search(path):
+            path = SESSION_PATH_RE.sub("", path)
+            rules.append("session_id")
+
+        param_rules = self.domain_rules.get(parts.hostname, self.default_rules)
+        kept = []
+        for pair in parts.query.split("&"):
+            if not pair:
+                continue
+            # Match on the decoded name but keep the pair as written, so values are never re-encoded
+            rule = param_rules.strip_rule(unquote_plus(pair.partition("=")[0]))
+            if rule is None:
+                kept.append(pair)
+            elif rule not in rules:
+                rules.append(rule)
+        # Sort by name only; repeated parameters keep their relative order
+        ordered = sorted(kept, key=lambda pair: unquote_plus(pair.partition("=")[0]))
+        if ordered != kept:
+            rules.append("param_order")
+
+        if path.endswith("/"):
+            path = path.rstrip("/")
+            rules.append("trailing_slash")
+
+        return Canonicalization(urlunsplit((scheme, netloc, path, "&".join(ordered), "")), tuple(rules))
+
+    def canonicalize_all(self, urls):
+        """
+        Canonicalize a batch of URLs and return (unique canonical URLs in first-seen
+        order, mapped to the first URL that produced each; URLs rewritten per rule;
+        URLs collapsed into another one per rule).
+        """
+        seen = {}
+        rewritten, collapsed = Counter(), Counter()
+        for raw in urls:
+            url, rules = self.canonicalize(raw)
+            rewritten.update(rules)
+            if url in seen:
+                collapsed.update(rules)
+            else:
+                seen[url] = raw
+        return seen, rewritten, collapsed
+
+
+def rel_canonical(response):
+    """Absolute URL of the page's ``<link rel="canonical">``, or None."""
+    if not isinstance(response, TextResponse):
+        return None
+    href = response.xpath(
+        "//head/link[contains(concat(' ', normalize-space(translate(@rel, 'CANONICAL', 'canonical')), ' '),"
+        " ' canonical ')]/@href"
+    ).get()
+    if not href or not href.strip():
+        return None
+    return urljoin(response.url, href.strip())
+
+
+def without_pagination(url):
+    parts = urlsplit(url)
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if name.lower() not in PAGINATION_PARAMS
+    )
+    return parts.netloc.lower(), PAGINATION_PATH_RE.sub("", parts.path).rstrip("/"), query
+
+
+def differs_by_pagination(url, canonical):
+    """
+    Whether two URLs differ only in their page number, e.g. ``?page=3`` declaring
+    page 1 as its canonical URL. Such a page lists other products than its
+    canonical one, however much the shop says they are the same.
+    """
+    return url != canonical and without_pagination(url) == without_pagination(canonical)
@@ -0,0 +1,282 @@
+import argparse
+import hashlib
+import time
+
+import redis
+
+DEDUP_BATCH_SIZE = 1000
+
+# Dedup backends are Lua chunks defining setup(header) and add_new(i, member), the latter
+# true when the i-th member of the call was not seen before. The chunks run inside a
+# script (ADD_NEW_DRIVER here, the frontier's admission script there), so a URL is
+# marked visited in the same atomic call that decides what to do with it: when several
+# workers race on one member exactly one of them sees it as new.
+
+# Exact and fingerprint sets: KEYS[i] is the set the i-th member belongs to.
+SET_ADD_NEW_LUA = """
+local function setup(header)
+end
+
+local function add_new(i, member)
+    return redis.call('SADD', KEYS[i], member) == 1
+end
+"""
+
+# Scalable Bloom filter (Almeida et al.) on Redis bitmaps under KEYS[1]. Layer i holds
+# capacity * growth^i items at error_rate * (1 - tightening) * tightening^i, so the
+# compound false-positive rate stays below error_rate however many layers are added.
+# Hash positions come from sha1 split into two 32-bit halves (double hashing).
+# Header: capacity, error_rate, growth, tightening.
+BLOOM_ADD_NEW_LUA = """
+local base = KEYS[1]
+local meta = base .. ':meta'
+local capacity, error_rate, growth, tightening
+local ln2 = math.log(2)
+local layers, last_count
+
+local function params(i)
+    local n = math.floor(capacity * growth ^ i)
+    local p = error_rate * (1 - tightening) * tightening ^ i
+    local m = math.min(math.ceil(-n * math.log(p) / (ln2 * ln2)), 4294967295)
+    local k = math.max(1, math.ceil(m / n * ln2))
+    return n, m, k
+end
+
+local function setup(header)
+    capacity = tonumber(header[1])
+    error_rate = tonumber(header[2])
+    growth = tonumber(header[3])
+    tightening = tonumber(header[4])
+    layers = tonumber(redis.call('HGET', meta, 'layers') or '0')
+    last_count = 0
+    if layers > 0 then
+        last_count = tonumber(redis.call('HGET', meta, 'count:' .. (layers - 1)) or '0')
+    end
+end
+
+local function add_new(i, member)
+    local digest = redis.sha1hex(member)
+    local h1 = tonumber(string.sub(digest, 1, 8), 16)
+    local h2 = tonumber(string.sub(digest, 9, 16), 16)
+
+    for layer = 0, layers - 1 do
+        local _, m, k = params(layer)
+        local all_set = true
+        for j = 0, k - 1 do
+            if redis.call('GETBIT', base .. ':' .. layer, (h1 + j * h2) % m) == 0 then
+                all_set = false
+                break
+            end
+        end
+        if all_set then
+            return false
+        end
+    end
+
+    local n = 0
+    if layers > 0 then
+        n = params(layers - 1)
+    end
+    if layers == 0 or last_count >= n then
+        layers = layers + 1
+        last_count = 0
+        redis.call('HSET', meta, 'layers', layers)
+    end
+    local layer = layers - 1
+    local _, m, k = params(layer)
+    for j = 0, k - 1 do
+        redis.call('SETBIT', base .. ':' .. layer, (h1 + j * h2) % m, 1)
+    end
+    last_count = last_count + 1
+    redis.call('HSET', meta, 'count:' .. layer, last_count)
+    redis.call('HINCRBY', meta, 'items', 1)
+    return true
+end
+"""
+
+# ARGV: header length, header..., members... Returns the 1-based indexes of the new members.
+ADD_NEW_DRIVER = """
+local header_length = tonumber(ARGV[1])
+local header = {}
+for i = 1, header_length do
+    header[i] = ARGV[i + 1]
+end
+setup(header)
+local added = {}
+for i = header_length + 2, #ARGV do
+    local index = i - header_length - 1
+    if add_new(index, ARGV[i]) then
+        added[#added + 1] = index
+    end
+end
+return added
+"""
+
+
+def url_fingerprint(url):
+    """Return a signed 64-bit fingerprint of a URL (fits Redis' integer set encoding)."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+class SetDedup:
+    """Exact dedup: every full URL string in one Redis set."""
+
+    name = "set"
+    add_new_lua = SET_ADD_NEW_LUA
+
+    def __init__(self, redis_client, key="visited_links"):
+        self.redis_client = redis_client
+        self.key = key
+        self._script = redis_client.register_script(self.add_new_lua + ADD_NEW_DRIVER)
+
+    def script_input(self, urls):
+        """KEYS, header and one member per URL for the ``add_new_lua`` chunk."""
+        return [self.key] * len(urls), [], urls
+
+    def add_new(self, urls):
+        """Mark URLs as seen and return the ones that were not seen before."""
+        urls = list(dict.fromkeys(urls))
+        added = []
+        for start in range(0, len(urls), DEDUP_BATCH_SIZE):
+            chunk = urls[start:start + DEDUP_BATCH_SIZE]
+            keys, header, members = self.script_input(chunk)
+            added.extend(chunk[i - 1] for i in self._script(keys=keys, args=[len(header), *header, *members]))
+        return added
+
+    def _memory_keys(self):
+        return [self.key]
+
+    def count(self):
+        return self.redis_client.scard(self.key)
+
+    def stats(self):
+        """Report item count and Redis memory so backends can be compared per URL."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in self._memory_keys():
+            pipe.memory_usage(key, samples=0)  # Every element, not the default 5-element estimate
+        memory = sum(usage or 0 for usage in pipe.execute())
+        items = self.count()
+        return {
+            "backend": self.name,
+            "items": items,
+            "memory_bytes": memory,
+            "bytes_per_url": round(memory / items, 2) if items else 0.0,
+        }
+
+
+class FingerprintDedup(SetDedup):
+    """
+    Approximate dedup on 64-bit URL fingerprints, sharded over 2**shard_bits sets.
+
+    Keep each shard under Redis' ``set-max-intset-entries`` so it stays an
+    intset at 8 bytes per fingerprint; e.g. with the default 12 shard bits and
+    ``set-max-intset-entries 4096`` that covers ~16M URLs. Collisions are
+    possible but negligible (~N^2 / 2^65).
+    """
+
+    name = "fingerprint"
+
+    def __init__(self, redis_client, key="visited_fp", shard_bits=12):
+        super().__init__(redis_client, key)
+        self.shard_bits = shard_bits
+
+    def _shard_key(self, fingerprint):
+        return f"{self.key}:{(fingerprint & 0xFFFFFFFFFFFFFFFF) >> (64 - self.shard_bits)}"
+
+    def script_input(self, urls):
+        fingerprints = [url_fingerprint(url) for url in urls]
+        return [self._shard_key(fp) for fp in fingerprints], [], fingerprints
+
+    def _memory_keys(self):
+        return list(self.redis_client.scan_iter(match=f"{self.key}:*", count=1000))
+
+    def count(self):
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in self._memory_keys():
+            pipe.scard(key)
+        return sum(pipe.execute())
+
+
+class BloomDedup(SetDedup):
+    """
+    Scalable Bloom filter on Redis bitmaps with a bounded false-positive rate.
+
+    A false positive means a never-seen URL is treated as visited and skipped.
+    The filter grows by adding layers, so ``capacity`` only sizes the first one.
+    """
+
+    name = "bloom"
+    add_new_lua = BLOOM_ADD_NEW_LUA
+
+    def __init__(self, redis_client, key="visited_bloom", capacity=1_000_000,
+                 error_rate=0.001, growth=2, tightening=0.5):
+        super().__init__(redis_client, key)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+
+    def script_input(self, urls):
+        return [self.key], [self.capacity, self.error_rate, self.growth, self.tightening], urls
+
+    def _memory_keys(self):
+        layers = int(self.redis_client.hget(f"{self.key}:meta", "layers") or 0)
+        return [f"{self.key}:meta"] + [f"{self.key}:{i}" for i in range(layers)]
+
+    def count(self):
+        return int(self.redis_client.hget(f"{self.key}:meta", "items") or 0)
+
+
+DEDUP_BACKENDS = {
+    SetDedup.name: SetDedup,
+    FingerprintDedup.name: FingerprintDedup,
+    BloomDedup.name: BloomDedup,
+}
+
+
+def dedup_from_settings(redis_client, settings, key_prefix=""):
+    """Build the dedup backend selected by the DEDUP_BACKEND setting."""
+    backend = settings.get("DEDUP_BACKEND", "set")
+    if backend == SetDedup.name:
+        return SetDedup(redis_client, f"{key_prefix}visited_links")
+    if backend == FingerprintDedup.name:
+        return FingerprintDedup(
+            redis_client, f"{key_prefix}visited_fp",
+            shard_bits=settings.getint("DEDUP_FINGERPRINT_SHARD_BITS", 12),
+        )
+    if backend == BloomDedup.name:
+        return BloomDedup(
+            redis_client, f"{key_prefix}visited_bloom",
+            capacity=settings.getint("DEDUP_BLOOM_CAPACITY", 1_000_000),
+            error_rate=settings.getfloat("DEDUP_BLOOM_ERROR_RATE", 0.001),
+        )
+    raise ValueError(f"Unknown DEDUP_BACKEND '{backend}', expected one of {sorted(DEDUP_BACKENDS)}")
+
+
+def main():
+    """Fill a backend with a synthetic frontier and print its memory stats."""
+    parser = argparse.ArgumentParser(description="Compare visited-set backends on synthetic URLs")
+    parser.add_argument("--backend", choices=sorted(DEDUP_BACKENDS), default="set")
+    parser.add_argument("--urls", type=int, default=10_000_000)
+    parser.add_argument("--redis-url", default="redis://localhost:6379/15")
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    dedup = DEDUP_BACKENDS[args.backend](client, key=f"dedup_bench:{args.backend}")
+    started = time.perf_counter()
+    batch = []
+    for i in range(args.urls):
+        batch.append(f"https://shop{i % 50}.example.com/category/{i % 997}/product/item-{i}?ref=list")
+        if len(batch) == DEDUP_BATCH_SIZE:
+            dedup.add_new(batch)
+            batch = []
+    if batch:
+        dedup.add_new(batch)
+
+    stats = dedup.stats()
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    print(stats)
+
+
+if __name__ == "__main__":
+    main()
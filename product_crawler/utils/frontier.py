@@ -0,0 +1,385 @@
+import random
+from urllib.parse import urlparse
+
+from product_crawler.utils.dedup import SetDedup
+
+PUSH_BATCH_SIZE = 1000
+
+# Puts a URL on its host queue. A URL's score orders it within its host queue (lowest
+# first, so callers pass the negated priority); an empty depth is not stored. New hosts
+# become ready immediately; hosts that already have a "next allowed" time keep it (ZADD
+# NX). URLs already queued keep their score. Returns 1 if the URL was not queued yet.
+PUSH_LUA = """
+local function push(prefix, now, host, url, score, depth)
+    local pushed = redis.call('ZADD', prefix .. ':hostq:' .. host, 'NX', score, url)
+    if depth ~= '' then
+        redis.call('HSET', prefix .. ':depth', url, depth)
+    end
+    redis.call('ZADD', prefix .. ':ready', 'NX', now, host)
+    return pushed
+end
+"""
+
+# ARGV: key prefix, then host/url/score/depth groups.
+PUSH_SCRIPT = PUSH_LUA + """
+local prefix = ARGV[1]
+local now = tonumber(redis.call('TIME')[1])
+local pushed = 0
+for i = 2, #ARGV, 4 do
+    pushed = pushed + push(prefix, now, ARGV[i], ARGV[i + 1], ARGV[i + 2], ARGV[i + 3])
+end
+redis.call('INCRBY', prefix .. ':size', pushed)
+return pushed
+"""
+
+# Appended to a dedup backend's add_new chunk (utils/dedup.py), so marking URLs visited
+# and queueing them is one atomic call: a URL is never visited but lost between the two.
+# ARGV: key prefix, force ("1" queues URLs that were seen before too), header length,
+# dedup header..., then member/host/url/score/depth groups. Returns the 1-based indexes
+# of the URLs that were new.
+ADMIT_DRIVER = """
+local prefix = ARGV[1]
+local force = ARGV[2] == '1'
+local header_length = tonumber(ARGV[3])
+local header = {}
+for i = 1, header_length do
+    header[i] = ARGV[i + 3]
+end
+setup(header)
+local now = tonumber(redis.call('TIME')[1])
+local added = {}
+local pushed = 0
+local index = 0
+for i = header_length + 4, #ARGV, 5 do
+    index = index + 1
+    local new = add_new(index, ARGV[i])
+    if new then
+        added[#added + 1] = index
+    end
+    if new or force then
+        pushed = pushed + push(prefix, now, ARGV[i + 1], ARGV[i + 2], ARGV[i + 3], ARGV[i + 4])
+    end
+end
+redis.call('INCRBY', prefix .. ':size', pushed)
+return added
+"""
+
+# Puts a leased URL back on its host queue with the score and depth it was leased
+# with (stored as "score|depth" in <prefix>:lease_meta), then drops the lease. Leases
+# taken before the metadata existed go back with the lowest possible score, so they
+# are retried before any other URL. Returns 1 if the URL was not queued yet.
+UNLEASE_LUA = PUSH_LUA + """
+local function unlease(prefix, now, url)
+    local meta = redis.call('HGET', prefix .. ':lease_meta', url)
+    local score, depth = '-inf', ''
+    if meta then
+        score, depth = string.match(meta, '^([^|]*)|(.*)$')
+    end
+    local host = string.match(url, '^%a[%w+.-]*://([^/?#]+)') or ''
+    local pushed = push(prefix, now, host, url, score, depth)
+    redis.call('ZREM', prefix .. ':leases', url)
+    redis.call('HDEL', prefix .. ':lease_owner', url)
+    redis.call('HDEL', prefix .. ':lease_meta', url)
+    return pushed
+end
+"""
+
+# ARGV: key prefix, default per-host delay, worker id, lease seconds, max URLs, number
+# of exploration picks. Pops the best-scored URL of each host whose next allowed fetch
+# time has passed (the first picks take a random URL of the host instead), pushes that
+# host's time forward by its delay and leases the URL to the worker until now + lease
+# seconds, until max URLs are leased or no host is ready. The URL's score and depth
+# move to the lease, so returning or reaping it restores both. Returns url/depth
+# pairs, with an empty depth when none was stored. Hosts found empty are dropped from
+# the ready set; their delay has already elapsed.
+DEQUEUE_SCRIPT = """
+local prefix = ARGV[1]
+local default_delay = tonumber(ARGV[2])
+local count = tonumber(ARGV[5])
+local explore = tonumber(ARGV[6])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local leased = {}
+local n = 0
+while n < count do
+    local hosts = redis.call('ZRANGEBYSCORE', prefix .. ':ready', '-inf', now, 'LIMIT', 0, 10)
+    if #hosts == 0 then
+        break
+    end
+    for _, host in ipairs(hosts) do
+        local queue = prefix .. ':hostq:' .. host
+        local url, score
+        if explore > 0 then
+            url = redis.call('ZRANDMEMBER', queue, 1)[1]
+            if url then
+                score = redis.call('ZSCORE', queue, url)
+                redis.call('ZREM', queue, url)
+                explore = explore - 1
+            end
+        else
+            local popped = redis.call('ZPOPMIN', queue)
+            url, score = popped[1], popped[2]
+        end
+        if url then
+            local delay = tonumber(redis.call('HGET', prefix .. ':delay', host) or default_delay)
+            redis.call('ZADD', prefix .. ':ready', now + delay, host)
+            redis.call('DECR', prefix .. ':size')
+            redis.call('ZADD', prefix .. ':leases', now + tonumber(ARGV[4]), url)
+            redis.call('HSET', prefix .. ':lease_owner', url, ARGV[3])
+            local depth = redis.call('HGET', prefix .. ':depth', url) or ''
+            redis.call('HDEL', prefix .. ':depth', url)
+            redis.call('HSET', prefix .. ':lease_meta', url, score .. '|' .. depth)
+            leased[#leased + 1] = url
+            leased[#leased + 1] = depth
+            n = n + 1
+            if n >= count then
+                break
+            end
+        else
+            redis.call('ZREM', prefix .. ':ready', host)
+        end
+    end
+end
+return leased
+"""
+
+# ARGV: key prefix, worker id, lease seconds, urls... Extends only leases the worker still owns.
+HEARTBEAT_SCRIPT = """
+local prefix = ARGV[1]
+local t = redis.call('TIME')
+local deadline = tonumber(t[1]) + tonumber(t[2]) / 1000000 + tonumber(ARGV[3])
+local extended = 0
+for i = 4, #ARGV do
+    if redis.call('HGET', prefix .. ':lease_owner', ARGV[i]) == ARGV[2] then
+        redis.call('ZADD', prefix .. ':leases', 'XX', deadline, ARGV[i])
+        extended = extended + 1
+    end
+end
+return extended
+"""
+
+# ARGV: key prefix, worker id, url. Drops the lease only if the worker still owns it,
+# so a stalled worker cannot release a URL that was reaped and leased to another.
+RELEASE_SCRIPT = """
+local prefix = ARGV[1]
+if redis.call('HGET', prefix .. ':lease_owner', ARGV[3]) == ARGV[2] then
+    redis.call('ZREM', prefix .. ':leases', ARGV[3])
+    redis.call('HDEL', prefix .. ':lease_owner', ARGV[3])
+    redis.call('HDEL', prefix .. ':lease_meta', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+# ARGV: key prefix, worker id, urls... Puts back the URLs whose lease the worker still
+# owns, so a worker that stops early hands its unstarted URLs to the others at once.
+RETURN_SCRIPT = UNLEASE_LUA + """
+local prefix = ARGV[1]
+local now = tonumber(redis.call('TIME')[1])
+local returned, pushed = 0, 0
+for i = 3, #ARGV do
+    if redis.call('HGET', prefix .. ':lease_owner', ARGV[i]) == ARGV[2] then
+        pushed = pushed + unlease(prefix, now, ARGV[i])
+        returned = returned + 1
+    end
+end
+redis.call('INCRBY', prefix .. ':size', pushed)
+return returned
+"""
+
+# ARGV: key prefix, max leases to reap. Expired leases go back to their host queue.
+REAP_SCRIPT = UNLEASE_LUA + """
+local prefix = ARGV[1]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local expired = redis.call('ZRANGEBYSCORE', prefix .. ':leases', '-inf', now, 'LIMIT', 0, tonumber(ARGV[2]))
+local pushed = 0
+for _, url in ipairs(expired) do
+    pushed = pushed + unlease(prefix, now, url)
+end
+redis.call('INCRBY', prefix .. ':size', pushed)
+return #expired
+"""
+
+
+class RedisFrontier:
+    """
+    Per-host politeness frontier in Redis, crawled best-first.
+
+    Every host has its own queue (``<name>:hostq:<host>``), a sorted set ordered by
+    the negated priority each URL was admitted with, and an entry in the
+    ``<name>:ready`` sorted set scored by the earliest time it may be fetched
+    again, so a slow or rate-limited host never blocks the others. Times come from
+    the Redis server clock, which keeps workers on different machines consistent.
+    A share of dequeues (``exploration_share``) takes a random URL of the host
+    instead of its best one, so low-scored parts of a site are still reached.
+    URLs admitted without a priority all score 0; ``push``/``admit`` callers that
+    want breadth-first order pass ``-depth``.
+
+    Dequeued URLs are leased to the calling worker in ``<name>:leases`` (scored by
+    deadline), together with the score and depth they were queued with. Workers
+    heartbeat their leases while processing and may return unstarted ones; any
+    worker may reap expired leases. Both put only those URLs back on their host
+    queues, where they rank as before.
+    """
+
+    def __init__(self, redis_client, queue_name="crawl_queue", dedup=None, host_delay=1.0,
+                 worker_id="worker", lease_seconds=300, exploration_share=0.0):
+        self.redis_client = redis_client
+        self.queue_name = queue_name
+        self.dedup = dedup or SetDedup(redis_client)
+        self.host_delay = host_delay
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.exploration_share = exploration_share
+        self.ready_key = f"{queue_name}:ready"
+        self.delay_key = f"{queue_name}:delay"
+        self.size_key = f"{queue_name}:size"
+        self.leases_key = f"{queue_name}:leases"
+        self.lease_owner_key = f"{queue_name}:lease_owner"
+        self._push_script = redis_client.register_script(PUSH_SCRIPT)
+        self._admit_script = redis_client.register_script(self.dedup.add_new_lua + PUSH_LUA + ADMIT_DRIVER)
+        self._dequeue_script = redis_client.register_script(DEQUEUE_SCRIPT)
+        self._release_script = redis_client.register_script(RELEASE_SCRIPT)
+        self._heartbeat_script = redis_client.register_script(HEARTBEAT_SCRIPT)
+        self._return_script = redis_client.register_script(RETURN_SCRIPT)
+        self._reap_script = redis_client.register_script(REAP_SCRIPT)
+
+    def admit(self, urls, priorities=None, depth=None):
+        """
+        Dedup, mark visited and enqueue a batch of URLs; return only the newly admitted ones.
+
+        ``priorities`` maps URLs to their priority (higher is crawled sooner) and
+        ``depth`` is the click depth shared by the batch, handed back on dequeue.
+        The visited check and the push are one script per chunk, so only the
+        worker that actually marked a URL visited pushes it, and a failure cannot
+        leave a URL visited but never queued.
+        """
+        return self._admit(urls, priorities, depth, force=False)
+
+    def push(self, urls, priorities=None, depth=None):
+        """Enqueue URLs unconditionally (used for seeds) and mark them visited."""
+        self._admit(urls, priorities, depth, force=True)
+
+    def _admit(self, urls, priorities, depth, force):
+        urls = list(dict.fromkeys(urls))
+        priorities = priorities or {}
+        depth = "" if depth is None else depth
+        admitted = []
+        for start in range(0, len(urls), PUSH_BATCH_SIZE):
+            chunk = urls[start:start + PUSH_BATCH_SIZE]
+            keys, header, members = self.dedup.script_input(chunk)
+            args = [self.queue_name, 1 if force else 0, len(header), *header]
+            for url, member in zip(chunk, members):
+                args.extend((member, urlparse(url).netloc, url, -priorities.get(url, 0.0), depth))
+            admitted.extend(chunk[i - 1] for i in self._admit_script(keys=keys, args=args))
+        return admitted
+
+    def requeue(self, urls, priorities=None, depth=None):
+        """Put URLs on their host queues without touching the visited set."""
+        urls = list(urls)
+        priorities = priorities or {}
+        depth = "" if depth is None else depth
+        for start in range(0, len(urls), PUSH_BATCH_SIZE):
+            args = [self.queue_name]
+            for url in urls[start:start + PUSH_BATCH_SIZE]:
+                args.extend((urlparse(url).netloc, url, -priorities.get(url, 0.0), depth))
+            self._push_script(args=args)
+
+    def dequeue(self):
+        """Lease a URL from a host that may be fetched now, or return None if no host is ready."""
+        leased = self.dequeue_many(1)
+        return leased[0][0] if leased else None
+
+    def dequeue_many(self, count):
+        """
+        Lease up to ``count`` URLs from hosts that may be fetched now, in one round-trip.
+
+        Returns (url, depth) pairs; depth is None for URLs queued without one.
+        """
+        explore = sum(random.random() < self.exploration_share for _ in range(count)) if self.exploration_share else 0
+        flat = self._dequeue_script(args=[
+            self.queue_name, self.host_delay, self.worker_id, self.lease_seconds, count, explore,
+        ])
+        return [(flat[i], int(flat[i + 1]) if flat[i + 1] != "" else None) for i in range(0, len(flat), 2)]
+
+    def release(self, url):
+        """Drop this worker's lease on a URL once it has been processed."""
+        return bool(self._release_script(args=[self.queue_name, self.worker_id, url]))
+
+    def return_leases(self, urls):
+        """Put URLs this worker leased but never processed back on their host queues; return how many it still owned."""
+        urls = list(urls)
+        if not urls:
+            return 0
+        return self._return_script(args=[self.queue_name, self.worker_id] + urls)
+
+    def heartbeat(self, urls):
+        """Extend this worker's leases on the given URLs; return how many it still owns."""
+        urls = list(urls)
+        if not urls:
+            return 0
+        return self._heartbeat_script(args=[self.queue_name, self.worker_id, self.lease_seconds] + urls)
+
+    def reap_expired(self, limit=1000):
+        """Requeue URLs whose lease expired (their worker died or stalled); return the count."""
+        reaped = 0
+        while True:
+            count = self._reap_script(args=[self.queue_name, limit])
+            reaped += count
+            if count < limit:
+                return reaped
+
+    def seconds_until_ready(self):
+        """Seconds until the next queued host may be fetched (0 if one is ready), or None if none is queued."""
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.time()
+        pipe.zrange(self.ready_key, 0, 0, withscores=True)
+        (seconds, microseconds), first = pipe.execute()
+        if not first:
+            return None
+        return max(0.0, first[0][1] - (seconds + microseconds / 1_000_000))
+
+    def leased_count(self):
+        return self.redis_client.zcard(self.leases_key)
+
+    def set_host_delay(self, host, seconds):
+        """Override the politeness delay for one host (e.g. from robots.txt Crawl-delay)."""
+        self.redis_client.hset(self.delay_key, host, seconds)
+
+    def import_legacy_queue(self):
+        """Move URLs from the old single ``crawl_queue`` list onto the per-host queues."""
+        if self.redis_client.type(self.queue_name) != "list":
+            return 0
+        moved = 0
+        while True:
+            # Oldest entries sit at the tail of the legacy LPUSH/RPOP list
+            chunk = self.redis_client.lrange(self.queue_name, -PUSH_BATCH_SIZE, -1)
+            if not chunk:
+                break
+            self.requeue(reversed(chunk))
+            self.redis_client.ltrim(self.queue_name, 0, -len(chunk) - 1)
+            moved += len(chunk)
+        return moved
+
+    def import_host_lists(self):
+        """Move URLs from the FIFO host lists used before best-first ordering onto the scored host queues."""
+        moved = 0
+        for key in self.redis_client.scan_iter(match=f"{self.queue_name}:host:*", count=1000):
+            if self.redis_client.type(key) != "list":
+                continue
+            while True:
+                # Oldest entries sit at the tail (LPUSH/RPOP); they all get priority 0
+                chunk = self.redis_client.lrange(key, -PUSH_BATCH_SIZE, -1)
+                if not chunk:
+                    break
+                self.requeue(reversed(chunk))
+                pipe = self.redis_client.pipeline()
+                pipe.ltrim(key, 0, -len(chunk) - 1)
+                pipe.decrby(self.size_key, len(chunk))  # Already counted while they sat in the list
+                pipe.execute()
+                moved += len(chunk)
+        return moved
+
+    def __len__(self):
+        return int(self.redis_client.get(self.size_key) or 0)
@@ -0,0 +1,31 @@
+from product_crawler.utils.metrics import load_snapshots
+
+
+def job_key_prefix(job_id):
+    """Redis key prefix of a crawl job's frontier, visited set, metrics and other crawl state."""
+    return f"job:{job_id}:" if job_id else ""
+
+
+def read_progress(redis_client, key_prefix="", queue_name="crawl_queue"):
+    """
+    Progress of the crawl living under ``key_prefix``: frontier depth, URLs in
+    flight, and the pages counted by its workers' latest metrics snapshots.
+    """
+    queue = f"{key_prefix}{queue_name}"
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.get(f"{queue}:size")
+    pipe.zcard(f"{queue}:leases")
+    depth, leased = pipe.execute()
+
+    snapshots = load_snapshots(redis_client, key_prefix)
+    totals = {}
+    for snapshot in snapshots:
+        for name, _, value in snapshot["counters"]:
+            totals[name] = totals.get(name, 0) + value
+    return {
+        "frontier_depth": int(depth or 0),
+        "in_flight": leased,
+        "pages_crawled": totals.get("crawler_pages_total", 0),
+        "pages_rendered": totals.get("crawler_playwright_pages_total", 0),
+        "live_workers": len(snapshots),
+    }
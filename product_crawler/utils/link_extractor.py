@@ -0,0 +1,87 @@
+from posixpath import splitext
+from urllib.parse import urljoin
+
+from scrapy.http import TextResponse
+from scrapy.linkextractors import IGNORED_EXTENSIONS
+from scrapy.utils.response import get_base_url
+
+# Same filter as Scrapy's LinkExtractor: links to images, archives, documents, ...
+IGNORED_SUFFIXES = frozenset(f".{extension}" for extension in IGNORED_EXTENSIONS)
+
+# hrefs that never lead to another page; skipped before paying for urljoin
+SKIPPED_PREFIXES = ("#", "javascript:", "mailto:", "tel:")
+
+# Anchor text is kept for link scoring, cut to this many characters
+MAX_ANCHOR_LENGTH = 100
+
+# document.links holds every <a>/<area> with an href, already resolved; dedup in the browser,
+# keeping the first non-empty anchor text (or <area> alt) of each URL
+DOM_LINKS_JS = f"""() => {{
+    const links = new Map();
+    for (const a of document.links) {{
+        const text = (a.textContent || a.alt || "").replace(/\\s+/g, " ").trim().slice(0, {MAX_ANCHOR_LENGTH});
+        if (!links.get(a.href)) links.set(a.href, text);
+    }}
+    return Array.from(links);
+}}"""
+
+
+class LinkCollector:
+    """
+    A page's outgoing links, deduplicated as they are collected.
+
+    ``add_response`` walks the lxml tree Scrapy already parsed for the response
+    once, resolving each distinct href against the page's ``<base>``. Links
+    from the rendered DOM or a sitemap go through ``add_all`` into the same
+    ordered set, so the sources never have to be unioned afterwards. The first
+    non-empty anchor text seen for each URL is kept for link scoring.
+    """
+
+    def __init__(self):
+        self.links = {}  # URL -> anchor text, in discovery order
+
+    def __iter__(self):
+        return iter(self.links)
+
+    def __len__(self):
+        return len(self.links)
+
+    def add(self, url, text=""):
+        if url in self.links:
+            if text and not self.links[url]:
+                self.links[url] = text
+            return
+        if not url[:8].lower().startswith(("http://", "https://")):
+            return
+        path = url.split("#", 1)[0].split("?", 1)[0]
+        if splitext(path.partition("://")[2])[1].lower() in IGNORED_SUFFIXES:
+            return
+        self.links[url] = text
+
+    def add_all(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def add_anchors(self, anchors):
+        """Collect (url, anchor text) pairs, as returned by ``DOM_LINKS_JS``."""
+        for url, text in anchors:
+            self.add(url, text)
+
+    def anchor(self, url):
+        return self.links.get(url, "")
+
+    def add_response(self, response):
+        """Collect the ``<a>`` and ``<area>`` links of an HTML response in one pass."""
+        if not isinstance(response, TextResponse):
+            return
+        base_url = get_base_url(response)
+        hrefs = set()
+        for element in response.selector.root.iter("a", "area"):
+            href = element.get("href")
+            if not href or href in hrefs:
+                continue
+            hrefs.add(href)
+            href = href.strip()
+            if href and not href.startswith(SKIPPED_PREFIXES):
+                text = element.get("alt") if element.tag == "area" else " ".join("".join(element.itertext()).split())
+                self.add(urljoin(base_url, href), (text or "")[:MAX_ANCHOR_LENGTH])
@@ -0,0 +1,174 @@
+import math
+import re
+from collections import Counter
+from urllib.parse import urlsplit
+
+# Token -> weight added when the token appears in a link's path/query or anchor text.
+# Listing words pull links forward; account, content and policy pages push them back.
+# Product pages are covered by the product URL rules. Settings can add tokens or
+# override weights (0 disables one).
+DEFAULT_TOKEN_WEIGHTS = {
+    "category": 2.0, "categories": 2.0, "collection": 2.0, "collections": 2.0, "catalog": 2.0,
+    "shop": 1.0, "store": 1.0, "page": 1.0, "sale": 1.0, "brand": 1.0, "more": 1.0, "next": 1.0,
+    "blog": -4.0, "news": -3.0, "press": -3.0, "help": -4.0, "faq": -4.0, "support": -3.0,
+    "about": -3.0, "contact": -3.0, "careers": -4.0, "jobs": -4.0,
+    "terms": -4.0, "privacy": -4.0, "policy": -3.0, "legal": -4.0, "cookies": -4.0,
+    "returns": -2.0, "shipping": -2.0, "search": -2.0, "author": -3.0, "tag": -1.0,
+    "account": -5.0, "login": -5.0, "signin": -5.0, "register": -5.0, "cart": -5.0,
+    "checkout": -5.0, "wishlist": -3.0,
+}
+
+# How much each signal contributes to a link's priority (higher is crawled sooner). The
+# observed yields dominate once a few pages of a pattern were crawled: a product page is
+# already recorded when its link is admitted, so fetching it early only pays off when
+# pages like it turn out to link to new products.
+DEFAULT_WEIGHTS = {
+    "product": 1.0,  # Matches a product URL rule
+    "excluded": -5.0,  # Matches a product rule but also an exclude rule (cart, checkout, ...)
+    "tokens": 1.0,  # Multiplies the summed token weights
+    "depth": -1.0,  # Per click from the seed
+    "parent_yield": 1.0,  # Times log(1 + new product links per page) of the parent page's URL pattern
+    "pattern_yield": 3.0,  # Same, for the link's own URL pattern once pages of it were crawled
+}
+
+# Unexplored URL patterns start as if PRIOR_PAGES pages had yielded prior_yield new product
+# links each. Priorities are fixed at admission, so a pessimistic start would leave links
+# admitted before any yield was known behind everything scored later.
+PRIOR_PAGES = 2
+
+# A new non-product link counts as this much of a product link in a page's yield: hub
+# pages (categories of categories) add no product links themselves, only paths to them.
+NEW_LINK_CREDIT = 0.5
+
+TOKEN_RE = re.compile(r"[a-z]+")
+
+# Path segments that vary between pages of one template: anything with a digit, or long slugs
+VARIABLE_SEGMENT_RE = re.compile(r"\d|^[^/]{40,}$")
+
+
+def url_pattern(url):
+    """
+    Template of a URL: host and path with variable segments replaced by ``*``, plus
+    the sorted query parameter names, e.g. ``shop.com/category/*?page`` for
+    ``https://shop.com/category/12?page=3``.
+    """
+    parts = urlsplit(url)
+    segments = ["*" if VARIABLE_SEGMENT_RE.search(segment) else segment for segment in parts.path.split("/")]
+    pattern = parts.netloc.lower() + "/".join(segments)
+    if parts.query:
+        names = sorted({pair.partition("=")[0] for pair in parts.query.split("&") if pair})
+        pattern += "?" + "&".join(names)
+    return pattern
+
+
+class LinkScorer:
+    """
+    Scores links before admission so the frontier serves the most promising URLs first.
+
+    A link's priority adds up: a product URL rule match, weighted tokens of its URL
+    and anchor text, its click depth, and how many new product links pages of its
+    parent's URL pattern (and of its own pattern) have yielded so far; other new
+    links count for ``NEW_LINK_CREDIT`` of a product link each. Yields are
+    counted per pattern in a Redis hash shared by all workers
+    (``<pattern>|pages`` and ``<pattern>|products``). ``record`` only buffers a
+    page's counts; they are written with the next ``score`` call, so scoring and
+    bookkeeping cost one round-trip per parsed page.
+
+    With ``enabled`` False every link scores ``-depth``, i.e. plain breadth-first.
+    """
+
+    def __init__(self, classifier, redis_client, key="scorer:yield", weights=None, token_weights=None,
+                 prior_yield=2.0, enabled=True):
+        self.classifier = classifier
+        self.redis_client = redis_client
+        self.key = key
+        self.weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+        self.token_weights = {**DEFAULT_TOKEN_WEIGHTS, **(token_weights or {})}
+        self.prior_yield = prior_yield
+        self.enabled = enabled
+        self.pending = Counter()  # Yield counts not written to Redis yet
+
+    @classmethod
+    def from_settings(cls, classifier, redis_client, settings, key_prefix=""):
+        return cls(
+            classifier,
+            redis_client,
+            key=f"{key_prefix}scorer:yield",
+            weights=settings.getdict("LINK_SCORER_WEIGHTS"),
+            token_weights=settings.getdict("LINK_SCORER_TOKENS"),
+            prior_yield=settings.getfloat("LINK_SCORER_PRIOR_YIELD", 2.0),
+            enabled=settings.getbool("FRONTIER_BEST_FIRST", True),
+        )
+
+    def tokens(self, url, anchor):
+        parts = urlsplit(url)
+        return set(TOKEN_RE.findall(f"{parts.path} {parts.query} {anchor or ''}".lower()))
+
+    def token_score(self, url, anchor=""):
+        return sum(self.token_weights.get(token, 0.0) for token in self.tokens(url, anchor))
+
+    def record(self, url, new_products, new_links=0):
+        """Count a crawled page, the product links and the other links it added against its URL pattern."""
+        if not self.enabled:
+            return
+        pattern = url_pattern(url)
+        self.pending[f"{pattern}|pages"] += 1
+        # Yields are kept in tenths so the hash holds integers for HINCRBY
+        self.pending[f"{pattern}|products"] += round((new_products + NEW_LINK_CREDIT * new_links) * 10)
+
+    def flush(self):
+        """Write buffered yield counts now (``score`` does it as part of its round-trip)."""
+        if self.pending:
+            pipe = self.redis_client.pipeline(transaction=False)
+            self._write_pending(pipe)
+            pipe.execute()
+
+    def _write_pending(self, pipe):
+        for field, count in self.pending.items():
+            if count:
+                pipe.hincrby(self.key, field, count)
+        self.pending.clear()
+
+    def score(self, links, depth, parent_url=None):
+        """
+        Priorities of links found on one page, as a dict. ``links`` maps URLs to
+        their anchor text; ``depth`` is their click depth and ``parent_url`` the
+        page they were found on, if any.
+        """
+        links = dict(links)
+        if not self.enabled:
+            return {url: -float(depth) for url in links}
+        if not links:
+            return {}
+
+        classified = self.classifier.classify(list(links))
+        patterns = {url: url_pattern(url) for url in links}
+        parent_pattern = url_pattern(parent_url) if parent_url else None
+        distinct = sorted(set(patterns.values()) | ({parent_pattern} if parent_pattern else set()))
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        self._write_pending(pipe)
+        fields = [f"{pattern}|{kind}" for pattern in distinct for kind in ("pages", "products")]
+        pipe.hmget(self.key, fields)
+        values = pipe.execute()[-1]
+        yields = {}
+        for i, pattern in enumerate(distinct):
+            pages, products = int(values[2 * i] or 0), int(values[2 * i + 1] or 0) / 10
+            products += self.prior_yield * PRIOR_PAGES
+            yields[pattern] = math.log1p(products / (pages + PRIOR_PAGES))
+
+        weights = self.weights
+        base = weights["depth"] * depth
+        if parent_pattern:
+            base += weights["parent_yield"] * yields[parent_pattern]
+        priorities = {}
+        for result in classified:
+            url = result.url
+            priority = base + weights["tokens"] * self.token_score(url, links[url])
+            priority += weights["pattern_yield"] * yields[patterns[url]]
+            if result.is_product:
+                priority += weights["product"]
+            elif result.exclude_rule:
+                priority += weights["excluded"]
+            priorities[url] = round(priority, 3)
+        return priorities
@@ -0,0 +1,194 @@
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import redis
+
+# Upper bounds (seconds) shared by every stage histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    "crawler_stage_seconds": ("histogram", "Time spent per crawl stage (download, network_idle, scroll, ...)."),
+    "crawler_pages_total": ("counter", "Pages downloaded, by domain; rate() gives pages per second."),
+    "crawler_playwright_pages_total": ("counter", "Pages rendered with Playwright, by domain."),
+    "crawler_redis_roundtrips_total": ("counter", "Redis round-trips; divide by crawler_pages_total for per page."),
+    "crawler_db_roundtrips_total": ("counter", "PostgreSQL statements and commits sent by the bulk writer."),
+    "crawler_db_rows_failed_total": ("counter", "Rows the bulk writer could not write, by table; kept in the dead-letter file."),
+    "crawler_near_duplicates_total": ("counter", "Pages not expanded because they nearly duplicate an earlier page."),
+    "crawler_near_duplicate_links_skipped_total": ("counter", "Links of near-duplicate pages that were not expanded."),
+    "crawler_structured_products_total": ("counter", "Pages judged by their structured data, by source (rejected: not a product after all)."),
+    "crawler_template_links_dropped_total": ("counter", "Links not admitted because their URL template used up its budget."),
+    "crawler_frontier_depth": ("gauge", "URLs waiting in the Redis frontier (shared by all workers)."),
+    "crawler_frontier_leased": ("gauge", "URLs leased to workers, i.e. in flight."),
+    "crawler_playwright_open_pages": ("gauge", "Playwright pages currently open in the worker."),
+    "crawler_playwright_max_concurrent_pages": ("gauge", "Most Playwright pages open at once in the worker."),
+}
+
+
+class CountingConnection(redis.Connection):
+    """Redis connection that counts round-trips (one per command or pipeline sent)."""
+
+    _lock = threading.Lock()
+    roundtrips = 0
+
+    def send_packed_command(self, command, check_health=True):
+        with CountingConnection._lock:
+            CountingConnection.roundtrips += 1
+        return super().send_packed_command(command, check_health)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def to_dict(self):
+        return {"counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class CrawlMetrics:
+    """
+    In-process crawl metrics: stage latency histograms, counters and gauges.
+
+    Each worker publishes a JSON snapshot to ``<prefix>metrics:<worker_id>`` (with
+    a TTL, so dead workers drop out) and indexes it in ``<prefix>metrics:workers``.
+    The Flask ``/metrics`` route merges the snapshots into one Prometheus text page,
+    labelled by worker.
+    """
+
+    def __init__(self, redis_client, worker_id, key_prefix="", ttl=120):
+        self.redis_client = redis_client  # A plain client, so publishing is not counted as crawl traffic
+        self.worker_id = worker_id
+        self.key = f"{key_prefix}metrics:{worker_id}"
+        self.index_key = f"{key_prefix}metrics:workers"
+        self.ttl = ttl
+        self.lock = threading.Lock()  # The bulk writer records from a worker thread
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.counters = {}
+        self.gauges = {}
+
+    @classmethod
+    def from_settings(cls, settings, worker_id, key_prefix=""):
+        client = redis.Redis(
+            host=settings.get("REDIS_HOST", "localhost"),
+            port=settings.getint("REDIS_PORT", 6379),
+            db=0,
+            decode_responses=True,
+        )
+        return cls(client, worker_id, key_prefix=key_prefix, ttl=settings.getint("METRICS_TTL", 120))
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, stage, seconds):
+        key = self._key("crawler_stage_seconds", {"stage": stage})
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def snapshot(self):
+        def dump(metrics, encode=lambda v: v):
+            return [[name, dict(labels), encode(value)] for (name, labels), value in metrics.items()]
+
+        with self.lock:
+            return {
+                "worker": self.worker_id,
+                "buckets": list(LATENCY_BUCKETS),
+                "histograms": dump(self.histograms, Histogram.to_dict),
+                "counters": dump(self.counters),
+                "gauges": dump(self.gauges),
+            }
+
+    def publish(self):
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.set(self.key, json.dumps(self.snapshot()), ex=self.ttl)
+        pipe.sadd(self.index_key, self.key)
+        pipe.execute()
+
+
+def load_snapshots(redis_client, key_prefix="", labels=None):
+    """
+    Read every live worker's snapshot, dropping index entries whose key expired.
+    ``labels`` (e.g. the crawl job) are kept with each snapshot and added to all of
+    its series by render_prometheus.
+    """
+    index_key = f"{key_prefix}metrics:workers"
+    keys = sorted(redis_client.smembers(index_key))
+    if not keys:
+        return []
+    snapshots = []
+    for key, raw in zip(keys, redis_client.mget(keys)):
+        if raw is None:
+            redis_client.srem(index_key, key)
+        else:
+            snapshot = json.loads(raw)
+            snapshot["labels"] = labels or {}
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+def render_prometheus(snapshots, extra_gauges=()):
+    """Render worker snapshots (plus ``(name, labels, value)`` gauges) in the Prometheus text format."""
+    families = {}  # name -> list of lines
+    for snapshot in snapshots:
+        worker = {**snapshot.get("labels", {}), "worker": snapshot["worker"]}
+        bounds = snapshot["buckets"]
+        for name, labels, value in snapshot["histograms"]:
+            lines = families.setdefault(name, [])
+            labels = {**worker, **labels}
+            cumulative = 0
+            for bound, count in zip(bounds + ["+Inf"], value["counts"]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        for name, labels, value in snapshot["counters"] + snapshot["gauges"]:
+            families.setdefault(name, []).append(f"{name}{_format_labels({**worker, **labels})} {value}")
+    for name, labels, value in extra_gauges:
+        families.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value}")
+
+    out = []
+    for name in sorted(families):
+        kind, help_text = METRIC_HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(families[name])
+    return "\n".join(out) + "\n"
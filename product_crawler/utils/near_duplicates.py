@@ -0,0 +1,152 @@
+import hashlib
+
+from scrapy.http import TextResponse
+
+BANDS = 4  # 16-bit bands: two fingerprints within 3 bits of each other agree on at least one
+MAX_DISTANCE_LIMIT = BANDS - 1
+SHINGLE_SIZE = 4  # Words per text shingle
+
+# Page chrome is shared by every page of a site; fingerprinting it would make unrelated
+# pages look alike. Only the main content counts.
+BOILERPLATE = "ancestor::nav or ancestor::header or ancestor::footer or ancestor::aside"
+TEXT_XPATH = (
+    "//body//text()[not(ancestor::script or ancestor::style or ancestor::noscript or ancestor::template"
+    f" or {BOILERPLATE})]"
+)
+HREF_XPATH = f"//body//a[not({BOILERPLATE})]/@href"
+
+# ARGV: key prefix, fingerprint (16 hex digits), max Hamming distance, max candidates per
+# band. Looks for an indexed fingerprint within the distance in the four band buckets and
+# returns it; otherwise indexes this one and returns nil. Atomic, so of two workers
+# holding near-identical pages exactly one sees the other as a duplicate.
+CHECK_SCRIPT = """
+local prefix = ARGV[1]
+local fp = ARGV[2]
+local max_distance = tonumber(ARGV[3])
+local limit = tonumber(ARGV[4])
+
+local function distance(a, b)
+    local d = 0
+    for i = 1, 16, 4 do
+        local x = tonumber(string.sub(a, i, i + 3), 16)
+        local y = tonumber(string.sub(b, i, i + 3), 16)
+        while x ~= y do
+            if x % 2 ~= y % 2 then
+                d = d + 1
+            end
+            x = math.floor(x / 2)
+            y = math.floor(y / 2)
+        end
+    end
+    return d
+end
+
+local keys = {}
+for band = 0, 3 do
+    keys[band + 1] = prefix .. ':band:' .. band .. ':' .. string.sub(fp, band * 4 + 1, band * 4 + 4)
+    for _, other in ipairs(redis.call('SRANDMEMBER', keys[band + 1], limit)) do
+        if other == fp or distance(fp, other) <= max_distance then
+            return other
+        end
+    end
+end
+for _, key in ipairs(keys) do
+    redis.call('SADD', key, fp)
+end
+redis.call('INCR', prefix .. ':count')
+return false
+"""
+
+
+def simhash(features):
+    """64-bit SimHash of a set of string features (each weighs the same)."""
+    rows = [
+        format(int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big"), "064b")
+        for feature in features
+    ]
+    half = len(rows) / 2
+    fingerprint = 0
+    # zip(*rows) walks the bit columns in C; a column is set when most features set it
+    for column in zip(*rows):
+        fingerprint = (fingerprint << 1) | (column.count("1") > half)
+    return fingerprint
+
+
+def page_features(response):
+    """
+    Word shingles of the page's visible main-content text plus the hrefs it links to.
+
+    Shingles never span two text nodes, so a grid sorted differently yields the same set.
+    """
+    root = response.selector.root
+    features = set()
+    for text in root.xpath(TEXT_XPATH):
+        words = text.lower().split()
+        if len(words) <= SHINGLE_SIZE:
+            if words:
+                features.add("t:" + " ".join(words))
+            continue
+        features.update("t:" + " ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+    features.update("a:" + href.strip() for href in root.xpath(HREF_XPATH))
+    return features
+
+
+class NearDuplicateIndex:
+    """
+    Finds pages whose content nearly duplicates a page already processed.
+
+    Faceted listings, print views and sort or view variants render the same
+    product grid under different URLs. Each page gets a SimHash of its main
+    content (text shingles and links, outside nav/header/footer/aside); two
+    pages within ``max_distance`` bits are near-duplicates. Fingerprints are
+    indexed in Redis by four 16-bit bands (``<key>:band:<n>:<bits>``), so a
+    lookup only compares against pages sharing a band, and the check-and-insert
+    is one atomic round-trip shared by all workers.
+
+    Pages with fewer than ``min_features`` features (empty JavaScript shells,
+    error pages) are never fingerprinted. Rendered pages whose static HTML has
+    fewer than ``min_links`` main-content links are shells whose grid arrives
+    by XHR: ``settled`` tells the spider to fingerprint them once rendered.
+    """
+
+    def __init__(self, redis_client, key="neardup", max_distance=3, min_features=16, max_candidates=64,
+                 min_links=5, enabled=True):
+        if not 0 <= max_distance <= MAX_DISTANCE_LIMIT:
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE_LIMIT}")
+        self.redis_client = redis_client
+        self.key = key
+        self.max_distance = max_distance
+        self.min_features = min_features
+        self.max_candidates = max_candidates
+        self.min_links = min_links
+        self.enabled = enabled
+        self._check_script = redis_client.register_script(CHECK_SCRIPT)
+
+    @classmethod
+    def from_settings(cls, redis_client, settings, key_prefix=""):
+        return cls(
+            redis_client,
+            key=f"{key_prefix}neardup",
+            max_distance=settings.getint("NEARDUP_MAX_DISTANCE", 3),
+            min_features=settings.getint("NEARDUP_MIN_FEATURES", 16),
+            max_candidates=settings.getint("NEARDUP_MAX_CANDIDATES", 64),
+            min_links=settings.getint("HYBRID_MIN_ANCHORS", 5),
+            enabled=settings.getbool("NEARDUP_ENABLED", True),
+        )
+
+    def fingerprint(self, response):
+        """SimHash of the response as 16 hex digits, or None if it is not HTML or has too little content."""
+        if not isinstance(response, TextResponse):
+            return None
+        features = page_features(response)
+        if len(features) < self.min_features:
+            return None
+        return format(simhash(features), "016x")
+
+    def settled(self, response):
+        """Whether the static HTML already holds the page's content: enough main-content links to fingerprint."""
+        return isinstance(response, TextResponse) and len(response.xpath(HREF_XPATH)) >= self.min_links
+
+    def check(self, fingerprint):
+        """Return the indexed fingerprint this one nearly duplicates, or None after indexing it."""
+        return self._check_script(args=[self.key, fingerprint, self.max_distance, self.max_candidates])
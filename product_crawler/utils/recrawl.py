@@ -0,0 +1,190 @@
+import hashlib
+import json
+import re
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+import psycopg2
+
+from product_crawler.items import CrawlResultItem
+
+# Claims a batch of due rows by pushing their next_crawl_at out by the claim period, so
+# concurrent workers (SKIP LOCKED) and later runs pass over them until the revisit result
+# sets the real next visit, or the claim lapses if the URL is never fetched
+CLAIM_DUE_URLS_QUERY = """
+    UPDATE crawled_data SET next_crawl_at = %s
+    WHERE url IN (
+        SELECT url FROM crawled_data
+        WHERE domain = ANY(%s) AND next_crawl_at <= %s
+        ORDER BY next_crawl_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING url, etag, last_modified, content_hash, crawl_count, change_count
+"""
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+# Marks hashes of a rendered DOM, which revisits (plain GETs) cannot be compared with; the
+# prefixed hash keeps 62 hex digits to fit the 64-character column. Static bodies keep all 64
+RENDERED_PREFIX = "r:"
+
+
+class RecrawlState:
+    """
+    Incremental recrawl support: conditional GETs, change detection and revisit scheduling.
+
+    crawled_data keeps each URL's ETag, Last-Modified, content hash and how often it
+    was crawled / found changed. At the start of an incremental run the URLs that are
+    due are claimed in batches (so each is queued by one worker only), streamed into
+    the frontier and their validators parked in a Redis hash until the URL is fetched. Revisit intervals follow the observed change rate:
+    ``base_interval / rate`` clamped to [min_interval, max_interval].
+
+    Revisits are plain GETs, so their hash is of the static body. A first visit
+    stores the static body's hash when the spider passes it along
+    (``static_hash`` in the request meta); otherwise the hash of the rendered
+    DOM is stored marked as such and never compared with a static one.
+    """
+
+    def __init__(self, redis_client, key="recrawl:validators", base_interval=86400,
+                 min_interval=3600, max_interval=30 * 86400, claim_seconds=6 * 3600):
+        self.redis_client = redis_client
+        self.key = key
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.claim_seconds = claim_seconds
+
+    @classmethod
+    def from_settings(cls, redis_client, settings, key_prefix=""):
+        return cls(
+            redis_client,
+            key=f"{key_prefix}recrawl:validators",
+            base_interval=settings.getint("RECRAWL_BASE_INTERVAL", 86400),
+            min_interval=settings.getint("RECRAWL_MIN_INTERVAL", 3600),
+            max_interval=settings.getint("RECRAWL_MAX_INTERVAL", 30 * 86400),
+            claim_seconds=settings.getint("RECRAWL_CLAIM_SECONDS", 6 * 3600),
+        )
+
+    def iter_due(self, database_url, domains, limit=1_000_000, batch_size=1000):
+        """Claim due URLs in batches and yield them, parking their validators in Redis. Blocking; run in a thread."""
+        conn = psycopg2.connect(database_url)
+        try:
+            claimed = 0
+            while claimed < limit:
+                now = datetime.utcnow()
+                size = min(batch_size, limit - claimed)
+                with conn, conn.cursor() as cursor:  # One transaction per batch releases its row locks
+                    cursor.execute(CLAIM_DUE_URLS_QUERY, (
+                        now + timedelta(seconds=self.claim_seconds), list(domains), now, size,
+                    ))
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                batch = {
+                    url: json.dumps({
+                        "etag": etag,
+                        "last_modified": last_modified,
+                        "content_hash": content_hash,
+                        "crawl_count": crawl_count or 0,
+                        "change_count": change_count or 0,
+                    })
+                    for url, etag, last_modified, content_hash, crawl_count, change_count in rows
+                }
+                self.redis_client.hset(self.key, mapping=batch)
+                yield list(batch)
+                claimed += len(rows)
+                if len(rows) < size:
+                    break
+        finally:
+            conn.close()
+
+    def validators(self, url):
+        """Return the stored validators for a due URL, or None if it is not being revisited."""
+        raw = self.redis_client.hget(self.key, url)
+        return json.loads(raw) if raw else None
+
+    def forget(self, url):
+        self.redis_client.hdel(self.key, url)
+
+    @staticmethod
+    def conditional_headers(validators):
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    @staticmethod
+    def content_hash(response):
+        """Hash the page's visible text, so tokens in attributes or scripts do not count as changes."""
+        if not hasattr(response, "xpath"):
+            return hashlib.sha256(response.body).hexdigest()
+        texts = response.xpath("//body//text()[not(ancestor::script) and not(ancestor::style)]").getall()
+        text = WHITESPACE_RE.sub(" ", " ".join(texts)).strip()
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if response.meta.get("playwright"):
+            return RENDERED_PREFIX + digest[:64 - len(RENDERED_PREFIX)]
+        return digest
+
+    def is_changed(self, response, validators):
+        """
+        Whether a revisited page changed: True, False, or None when the stored
+        hash cannot tell (none stored, or it is of a rendered DOM).
+        """
+        if response.status == 304:
+            return False
+        stored = validators.get("content_hash")
+        current = self.content_hash(response)
+        if not stored or stored.startswith(RENDERED_PREFIX) != current.startswith(RENDERED_PREFIX):
+            return None
+        return current != stored
+
+    def next_interval(self, crawl_count, change_count):
+        """Seconds until the next visit, from the Laplace-smoothed observed change rate."""
+        rate = (change_count + 1) / (crawl_count + 2)
+        return max(self.min_interval, min(self.max_interval, self.base_interval / rate))
+
+    def result_item(self, response, validators=None, changed=True):
+        """Build the crawled_data update for a fetched page (first visit or revisit)."""
+        validators = validators or {}
+        crawl_count = validators.get("crawl_count", 0) + 1
+        change_count = validators.get("change_count", 0) + (1 if changed else 0)
+        now = datetime.utcnow()
+
+        item = CrawlResultItem(
+            domain=urlparse(response.url).netloc,
+            url=response.meta.get("frontier_url", response.url),
+            status_code=response.status,
+            changed=changed,
+            last_crawled_at=now,
+            next_crawl_at=now + timedelta(seconds=self.next_interval(crawl_count, change_count)),
+        )
+        if response.status != 304:
+            headers = response.headers
+            item["etag"] = headers.get("ETag", b"").decode("latin-1") or None
+            item["last_modified"] = headers.get("Last-Modified", b"").decode("latin-1") or None
+            item["content_hash"] = response.meta.get("static_hash") or self.content_hash(response)
+            if hasattr(response, "xpath"):
+                item["title"] = (response.xpath("normalize-space(//title)").get() or "")[:255] or None
+        return item
+
+    def error_item(self, url, validators, status=None):
+        """
+        Build the crawled_data update for a revisit that failed (an HTTP error, or no
+        response at all): the stored validators and hash are kept, and the next visit is
+        scheduled as if the page had not changed, so repeated failures back off.
+        """
+        crawl_count = validators.get("crawl_count", 0) + 1
+        interval = self.max_interval if status in (404, 410) else self.next_interval(
+            crawl_count, validators.get("change_count", 0))
+        now = datetime.utcnow()
+        return CrawlResultItem(
+            domain=urlparse(url).netloc,
+            url=url,
+            status_code=status,
+            changed=False,
+            last_crawled_at=now,
+            next_crawl_at=now + timedelta(seconds=interval),
+        )
@@ -0,0 +1,118 @@
+import random
+import re
+import time
+from urllib.parse import urlparse
+
+from scrapy.http import HtmlResponse
+
+# Markers that a page is a client-side rendered app shell
+SPA_MARKERS = (
+    'id="root"></div>',
+    'id="app"></div>',
+    "<app-root></app-root>",
+    "ng-app",
+    "enable javascript",
+)
+
+# <noscript> fallbacks ("please enable JavaScript") are on server-rendered pages too
+NOSCRIPT_RE = re.compile(r"<noscript\b.*?</noscript\s*>", re.IGNORECASE | re.DOTALL)
+
+# Product grids/lists that were shipped empty and get filled in by JavaScript (whole class tokens only)
+GRID_CLASSES = ("product-grid", "products", "product-list")
+EMPTY_GRID_XPATH = "//*[{}][not(.//a)]".format(
+    " or ".join(f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')" for name in GRID_CLASSES)
+)
+
+# KEYS[1]: verdict hash. ARGV: domain, verdict ("js" or "static"), window. Counts the
+# verdict and halves the domain's counts once they exceed the window, so recent pages
+# outweigh old ones and a site that changes how it renders is re-learned.
+RECORD_SCRIPT = """
+local js_field = ARGV[1] .. ':js'
+local static_field = ARGV[1] .. ':static'
+redis.call('HINCRBY', KEYS[1], ARGV[1] .. ':' .. ARGV[2], 1)
+local js = tonumber(redis.call('HGET', KEYS[1], js_field) or 0)
+local static = tonumber(redis.call('HGET', KEYS[1], static_field) or 0)
+if js + static > tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[1], js_field, math.floor(js / 2), static_field, math.floor(static / 2))
+end
+"""
+
+
+class RenderDetector:
+    """
+    Decides whether a statically fetched page needs a Playwright render.
+
+    Verdicts are counted per domain in a Redis hash so every worker learns
+    from earlier pages: once a domain has ``min_samples`` verdicts and at
+    least ``js_ratio`` of them needed JavaScript, its pages go straight to
+    Playwright without the static attempt.
+
+    Counts are halved past ``window`` verdicts, a worker re-reads a domain's
+    flag every ``recheck_interval`` seconds, and ``probe_ratio`` of a JS
+    domain's pages are still fetched statically (``probe``), so a domain that
+    stops needing JavaScript keeps producing verdicts and is re-learned.
+    """
+
+    def __init__(self, redis_client, key="render:needs_js", min_anchors=5, min_samples=5, js_ratio=0.8,
+                 window=200, recheck_interval=300.0, probe_ratio=0.05):
+        self.redis_client = redis_client
+        self.key = key
+        self.min_anchors = min_anchors
+        self.min_samples = min_samples
+        self.js_ratio = js_ratio
+        self.window = window
+        self.recheck_interval = recheck_interval
+        self.probe_ratio = probe_ratio
+        self.domain_flags = {}  # domain -> (needs JS, monotonic time it was read), cached per process
+        self._record_script = redis_client.register_script(RECORD_SCRIPT)
+
+    @classmethod
+    def from_settings(cls, redis_client, settings, key_prefix=""):
+        return cls(
+            redis_client,
+            key=f"{key_prefix}render:needs_js",
+            min_anchors=settings.getint("HYBRID_MIN_ANCHORS", 5),
+            min_samples=settings.getint("HYBRID_LEARN_MIN_SAMPLES", 5),
+            js_ratio=settings.getfloat("HYBRID_JS_RATIO", 0.8),
+            window=settings.getint("HYBRID_LEARN_WINDOW", 200),
+            recheck_interval=settings.getfloat("HYBRID_RECHECK_INTERVAL", 300.0),
+            probe_ratio=settings.getfloat("HYBRID_PROBE_RATIO", 0.05),
+        )
+
+    def domain_needs_js(self, url):
+        """Return True if earlier pages of this domain mostly needed rendering."""
+        domain = urlparse(url).netloc
+        cached = self.domain_flags.get(domain)
+        if cached and time.monotonic() - cached[1] < self.recheck_interval:
+            return cached[0]
+
+        js, static = self.redis_client.hmget(self.key, f"{domain}:js", f"{domain}:static")
+        js, static = int(js or 0), int(static or 0)
+        if js + static < self.min_samples:
+            return False
+        needs_js = js / (js + static) >= self.js_ratio
+        self.domain_flags[domain] = (needs_js, time.monotonic())
+        return needs_js
+
+    def probe(self, url):
+        """Whether to fetch this page of a JS domain statically anyway, to keep checking that it needs JS."""
+        return self.probe_ratio > 0 and self.domain_needs_js(url) and random.random() < self.probe_ratio
+
+    def needs_rendering(self, response):
+        """Return the reason a static response needs Playwright, or None if it is usable as is."""
+        if not isinstance(response, HtmlResponse):
+            return None  # Not HTML (e.g. sitemap XML or a binary file)
+
+        reason = None
+        if len(response.xpath("//a[@href]")) < self.min_anchors:
+            reason = "few_anchors"
+        elif response.xpath(EMPTY_GRID_XPATH):
+            reason = "empty_product_grid"
+        else:
+            head = NOSCRIPT_RE.sub("", response.text[:20000]).lower()
+            if any(marker.lower() in head for marker in SPA_MARKERS):
+                reason = "spa_marker"
+
+        domain = urlparse(response.url).netloc
+        self._record_script(keys=[self.key], args=[domain, "js" if reason else "static", self.window])
+        return reason
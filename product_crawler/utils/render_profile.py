@@ -0,0 +1,116 @@
+import re
+from collections import Counter
+
+# Resource types the spider never needs to find anchors
+DEFAULT_BLOCKED_RESOURCE_TYPES = ["image", "media", "font", "texttrack", "eventsource", "manifest"]
+
+# Ads, analytics and tracking hosts
+DEFAULT_URL_BLOCKLIST = [
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"googlesyndication\.com",
+    r"doubleclick\.net",
+    r"facebook\.(net|com)/tr",
+    r"connect\.facebook\.net",
+    r"hotjar\.com",
+    r"clarity\.ms",
+    r"segment\.(io|com)",
+    r"newrelic\.com",
+    r"nr-data\.net",
+    r"criteo\.(com|net)",
+    r"taboola\.com",
+    r"outbrain\.com",
+]
+
+
+# Chromium switch that turns off image decoding for the whole browser
+IMAGES_DISABLED_ARG = "--blink-settings=imagesEnabled=false"
+
+
+class RenderProfile:
+    """
+    Route-interception profile for Playwright pages.
+
+    ``install`` is used as scrapy-playwright's ``playwright_page_init_callback``:
+    it aborts sub-requests by resource type or URL blocklist and keeps per-request
+    counters in ``request.meta["render_stats"]``. The main document is never
+    blocked. Aborted requests have no size, so ``blocked_bytes`` is only filled
+    in ``dry_run`` mode, where would-be-blocked requests are let through and measured.
+    """
+
+    def __init__(self, blocked_resource_types=None, url_blocklist=None, disable_css_images=False, dry_run=False):
+        self.blocked_resource_types = set(
+            DEFAULT_BLOCKED_RESOURCE_TYPES if blocked_resource_types is None else blocked_resource_types
+        )
+        if disable_css_images:
+            self.blocked_resource_types.update({"image", "stylesheet"})
+        patterns = DEFAULT_URL_BLOCKLIST if url_blocklist is None else url_blocklist
+        self.url_blocklist = re.compile("|".join(patterns), re.IGNORECASE) if patterns else None
+        self.dry_run = dry_run
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            blocked_resource_types=settings.getlist("RENDER_BLOCKED_RESOURCE_TYPES") or None,
+            url_blocklist=settings.getlist("RENDER_URL_BLOCKLIST") or None,
+            disable_css_images=settings.getbool("RENDER_DISABLE_CSS_IMAGES"),
+            dry_run=settings.getbool("RENDER_PROFILE_DRY_RUN"),
+        )
+
+    @staticmethod
+    def launch_options(settings):
+        """PLAYWRIGHT_LAUNCH_OPTIONS with the browser args this profile needs added."""
+        options = dict(settings.getdict("PLAYWRIGHT_LAUNCH_OPTIONS"))
+        args = list(options.get("args") or [])
+        if settings.getbool("RENDER_DISABLE_CSS_IMAGES") and IMAGES_DISABLED_ARG not in args:
+            args.append(IMAGES_DISABLED_ARG)
+        options["args"] = args
+        return options
+
+    def block_reason(self, playwright_request):
+        """Return why a sub-request should be blocked, or None to let it through."""
+        resource_type = playwright_request.resource_type
+        if resource_type == "document" and playwright_request.is_navigation_request():
+            return None
+        if resource_type in self.blocked_resource_types:
+            return resource_type
+        if self.url_blocklist and self.url_blocklist.search(playwright_request.url):
+            return "blocklist"
+        return None
+
+    async def install(self, page, request):
+        """Page init callback: attach the route handler and the per-request counters."""
+        stats = {
+            "allowed_requests": 0,
+            "allowed_bytes": 0,
+            "blocked_requests": 0,
+            "blocked_bytes": 0,
+            "blocked_by_reason": Counter(),
+        }
+        request.meta["render_stats"] = stats
+        blocked_urls = set()
+
+        async def handle_route(route):
+            reason = self.block_reason(route.request)
+            if reason is None:
+                stats["allowed_requests"] += 1
+                await route.fallback()  # Let scrapy-playwright's own handler continue it
+                return
+
+            stats["blocked_requests"] += 1
+            stats["blocked_by_reason"][reason] += 1
+            if self.dry_run:
+                blocked_urls.add(route.request.url)
+                await route.fallback()
+            else:
+                await route.abort()
+
+        def count_response(response):
+            size = int(response.headers.get("content-length") or 0)
+            if response.url in blocked_urls:
+                stats["blocked_bytes"] += size
+            else:
+                stats["allowed_bytes"] += size
+
+        page.on("response", count_response)
+        await page.route("**/*", handle_route)
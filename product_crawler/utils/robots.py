@@ -0,0 +1,135 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+import scrapy
+from protego import Protego
+from scrapy.utils.defer import maybe_deferred_to_future
+
+
+def origin_of(url):
+    """Return ``scheme://netloc`` for a URL; robots.txt rules apply per origin."""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+class RobotsService:
+    """
+    Shared robots.txt rules for all crawler workers.
+
+    robots.txt bodies are fetched through the crawler's own downloader (so they
+    get the same middlewares, proxies and concurrency limits as pages), stored in
+    Redis with a TTL so every worker reuses them, and parsed with Protego. A
+    Crawl-delay becomes the host's politeness delay in the frontier.
+    """
+
+    def __init__(self, crawler, redis_client, frontier=None, key_prefix="robots:", ttl=86400,
+                 error_ttl=3600, user_agent="*", min_delay=0.0):
+        self.crawler = crawler
+        self.redis_client = redis_client
+        self.frontier = frontier
+        self.key_prefix = key_prefix
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.user_agent = user_agent
+        self.min_delay = min_delay
+        self.rules = {}  # origin -> (Protego, expires_at)
+        self.inflight = {}  # origin -> task fetching its robots.txt
+
+    @classmethod
+    def from_crawler(cls, crawler, redis_client, frontier=None, key_prefix=""):
+        settings = crawler.settings
+        return cls(
+            crawler,
+            redis_client,
+            frontier=frontier,
+            key_prefix=f"{key_prefix}robots:",
+            ttl=settings.getint("ROBOTS_CACHE_TTL", 86400),
+            error_ttl=settings.getint("ROBOTS_ERROR_TTL", 3600),
+            user_agent=settings.get("ROBOTSTXT_USER_AGENT") or "*",
+            min_delay=settings.getfloat("FRONTIER_HOST_DELAY", 0.0),
+        )
+
+    async def allowed(self, urls):
+        """Return one bool per URL, loading any missing robots.txt rules first."""
+        urls = list(urls)
+        await self.load({origin_of(url) for url in urls})
+        results = []
+        for url in urls:
+            rules, _ = self.rules.get(origin_of(url), (None, 0))
+            ok = rules is None or rules.can_fetch(url, self.user_agent)
+            if not ok:
+                self.crawler.stats.inc_value("robots/blocked")
+            results.append(ok)
+        return results
+
+    async def load(self, origins):
+        """Make sure rules for the given origins are in the local cache."""
+        now = time.monotonic()
+        missing = [o for o in origins if self.rules.get(o, (None, 0))[1] <= now]
+        if not missing:
+            return
+
+        # Shared cache: one MGET for every origin this process has not parsed yet
+        bodies = self.redis_client.mget([f"{self.key_prefix}{o}" for o in missing])
+        to_fetch = []
+        for origin, body in zip(missing, bodies):
+            if body is None:
+                to_fetch.append(origin)
+            else:
+                self.crawler.stats.inc_value("robots/cache_hit/redis")
+                self._store(origin, body)
+
+        if to_fetch:
+            await asyncio.gather(*(self._fetch_once(origin) for origin in to_fetch))
+
+    def sitemaps(self, origin):
+        """Sitemap URLs declared in an already loaded robots.txt."""
+        rules, _ = self.rules.get(origin, (None, 0))
+        return list(rules.sitemaps) if rules is not None else []
+
+    async def _fetch_once(self, origin):
+        # Concurrent pages on a new origin share a single robots.txt download
+        fetch = self.inflight.get(origin)
+        if fetch is None:
+            fetch = self.inflight[origin] = asyncio.ensure_future(self._fetch(origin))
+            fetch.add_done_callback(lambda _: self.inflight.pop(origin, None))
+        await fetch
+
+    async def _fetch(self, origin):
+        request = scrapy.Request(
+            f"{origin}/robots.txt",
+            meta={"dont_obey_robotstxt": True, "handle_httpstatus_all": True},
+            priority=1000,
+            dont_filter=True,
+        )
+        started = time.perf_counter()
+        ttl = self.ttl
+        try:
+            response = await maybe_deferred_to_future(self.crawler.engine.download(request))
+            if response.status == 200:
+                body = response.body.decode("utf-8", errors="ignore")
+            else:
+                # Missing robots.txt (4xx) allows everything; retry 5xx sooner
+                body = ""
+                if response.status >= 500:
+                    ttl = self.error_ttl
+        except Exception as e:
+            self.crawler.spider.logger.warning(f"⚠️ Failed to fetch robots.txt for {origin}: {e}")
+            body, ttl = "", self.error_ttl
+        finally:
+            self.crawler.stats.inc_value("robots/fetches")
+            self.crawler.stats.inc_value("robots/fetch_time_seconds", time.perf_counter() - started)
+
+        self.redis_client.set(f"{self.key_prefix}{origin}", body, ex=ttl)
+        self._store(origin, body, ttl)
+        self.crawler.spider.logger.info(f"✅ Loaded robots.txt for {origin}")
+
+    def _store(self, origin, body, ttl=None):
+        rules = Protego.parse(body) if body else None
+        self.rules[origin] = (rules, time.monotonic() + (ttl or self.ttl))
+
+        if rules is not None and self.frontier is not None:
+            delay = rules.crawl_delay(self.user_agent)
+            if delay is not None:
+                self.frontier.set_host_delay(urlparse(origin).netloc, max(float(delay), self.min_delay))
@@ -0,0 +1,55 @@
+import re
+
+# Origin ("scheme://host:port") and the rest of the URL (path, query, fragment)
+ORIGIN_RE = re.compile(r"^([A-Za-z][A-Za-z0-9+.-]*://[^/?#]*)(.*)$", re.DOTALL)
+
+SEED = object()  # Trie key marking the end of a seed's path
+
+
+class ScopeMatcher:
+    """
+    Finds the seed URL a link falls under, in time independent of the number of seeds.
+
+    Seeds are indexed by origin, then by a character trie of their path, so a link
+    only walks its own path. A link is in scope when it starts with a seed URL, as
+    with a plain ``startswith`` scan, except that the host must match exactly:
+    ``https://shop.com.evil.net`` is not under ``https://shop.com``.
+    """
+
+    def __init__(self, seed_urls=()):
+        self.origins = {}  # origin -> path trie
+        for seed in seed_urls:
+            self.add(seed)
+
+    def add(self, seed):
+        match = ORIGIN_RE.match(seed)
+        if not match:
+            return
+        origin, rest = match.groups()
+        node = self.origins.setdefault(origin.lower(), {})
+        for char in rest:
+            node = node.setdefault(char, {})
+        node.setdefault(SEED, seed)
+
+    def seed_for(self, url):
+        """Return the seed ``url`` falls under (the shortest, if several do), or None."""
+        match = ORIGIN_RE.match(url)
+        if not match:
+            return None
+        origin, rest = match.groups()
+        node = self.origins.get(origin.lower())
+        if node is None:
+            return None
+        if SEED in node:
+            return node[SEED]
+        for char in rest:
+            node = node.get(char)
+            if node is None:
+                return None
+            if SEED in node:
+                return node[SEED]
+        return None
+
+    def in_scope(self, urls):
+        """Return the URLs that fall under a seed, in order."""
+        return [url for url in urls if self.seed_for(url) is not None]
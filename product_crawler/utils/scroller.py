@@ -0,0 +1,127 @@
+import asyncio
+import time
+from urllib.parse import urlparse
+
+# Resolves true once the DOM has been quiet for quietMs after a mutation,
+# or false if nothing changed within timeoutMs.
+WAIT_FOR_MUTATIONS_JS = """
+([timeoutMs, quietMs]) => new Promise(resolve => {
+    let quietTimer = null;
+    const finish = (changed) => { observer.disconnect(); clearTimeout(deadline); clearTimeout(quietTimer); resolve(changed); };
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(() => finish(true), quietMs);
+    });
+    observer.observe(document.body, {childList: true, subtree: true});
+    const deadline = setTimeout(() => finish(quietTimer !== null), timeoutMs);
+})
+"""
+
+COUNT_ANCHORS_JS = "new Set(Array.from(document.querySelectorAll('a[href]'), a => a.href)).size"
+
+
+class NetworkTracker:
+    """Counts a page's in-flight requests so we can wait for the network to go idle."""
+
+    def __init__(self, page):
+        self.inflight = 0
+        page.on("request", self._started)
+        page.on("requestfinished", self._finished)
+        page.on("requestfailed", self._finished)
+
+    def _started(self, request):
+        self.inflight += 1
+
+    def _finished(self, request):
+        self.inflight = max(0, self.inflight - 1)
+
+    async def wait_idle(self, timeout):
+        deadline = time.monotonic() + timeout
+        while self.inflight and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+
+class InfiniteScroller:
+    """
+    Scrolls a Playwright page until scrolling stops producing new anchors.
+
+    Each step waits for DOM mutations and network idle rather than a fixed
+    sleep, and scrolling is bounded by a per-page and a per-domain wall-clock
+    budget. Per-domain results are kept in a Redis hash shared by all workers;
+    a domain whose first ``min_samples`` scrolled pages never gained a link is
+    not scrolled again.
+    """
+
+    def __init__(self, redis_client, key="scroll:stats", page_budget=15.0, domain_budget=600.0,
+                 step_timeout=3.0, quiet_ms=300, patience=2, min_samples=5):
+        self.redis_client = redis_client
+        self.key = key
+        self.page_budget = page_budget
+        self.domain_budget = domain_budget
+        self.step_timeout = step_timeout
+        self.quiet_ms = quiet_ms
+        self.patience = patience
+        self.min_samples = min_samples
+
+    @classmethod
+    def from_settings(cls, redis_client, settings, key_prefix=""):
+        return cls(
+            redis_client,
+            key=f"{key_prefix}scroll:stats",
+            page_budget=settings.getfloat("SCROLL_PAGE_BUDGET", 15.0),
+            domain_budget=settings.getfloat("SCROLL_DOMAIN_BUDGET", 600.0),
+            step_timeout=settings.getfloat("SCROLL_STEP_TIMEOUT", 3.0),
+            quiet_ms=settings.getint("SCROLL_QUIET_MS", 300),
+            patience=settings.getint("SCROLL_PATIENCE", 2),
+            min_samples=settings.getint("SCROLL_MIN_SAMPLES", 5),
+        )
+
+    def should_scroll(self, domain):
+        """Skip domains that exhausted their budget or where scrolling never added links."""
+        pages, productive, seconds = self.redis_client.hmget(
+            self.key, f"{domain}:pages", f"{domain}:productive_pages", f"{domain}:seconds"
+        )
+        if float(seconds or 0) >= self.domain_budget:
+            return False
+        return not (int(pages or 0) >= self.min_samples and int(productive or 0) == 0)
+
+    async def scroll(self, page, url):
+        """Scroll the page and return the number of new links each scroll step produced."""
+        domain = urlparse(url).netloc
+        if not self.should_scroll(domain):
+            return []
+
+        network = NetworkTracker(page)
+        started = time.monotonic()
+        anchors = await page.evaluate(COUNT_ANCHORS_JS)
+        steps = []
+        idle_steps = 0
+
+        while idle_steps < self.patience:
+            remaining = self.page_budget - (time.monotonic() - started)
+            if remaining <= 0:
+                break
+            step_timeout = min(self.step_timeout, remaining)
+
+            await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+            changed = await page.evaluate(WAIT_FOR_MUTATIONS_JS, [int(step_timeout * 1000), self.quiet_ms])
+            if changed:
+                await network.wait_idle(min(step_timeout, self.page_budget - (time.monotonic() - started)))
+
+            count = await page.evaluate(COUNT_ANCHORS_JS)
+            steps.append(count - anchors)
+            anchors = count
+            idle_steps = idle_steps + 1 if steps[-1] <= 0 else 0
+
+        self._record(domain, steps, time.monotonic() - started)
+        return steps
+
+    def _record(self, domain, steps, seconds):
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hincrby(self.key, f"{domain}:pages", 1)
+        pipe.hincrby(self.key, f"{domain}:steps", len(steps))
+        pipe.hincrby(self.key, f"{domain}:links", sum(s for s in steps if s > 0))
+        if any(s > 0 for s in steps):
+            pipe.hincrby(self.key, f"{domain}:productive_pages", 1)
+        pipe.hincrbyfloat(self.key, f"{domain}:seconds", round(seconds, 3))
+        pipe.execute()
@@ -0,0 +1,115 @@
+import gzip
+import logging
+
+import requests
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class PrefixedStream:
+    """Minimal file object that replays already-read bytes before the rest of a stream."""
+
+    def __init__(self, prefix, raw):
+        self.prefix = prefix
+        self.raw = raw
+
+    def read(self, size=-1):
+        if not self.prefix:
+            return self.raw.read(size) if size and size > 0 else self.raw.read()
+        if size is None or size < 0:
+            data, self.prefix = self.prefix + self.raw.read(), b""
+            return data
+        data, self.prefix = self.prefix[:size], self.prefix[size:]
+        if len(data) < size:
+            data += self.raw.read(size - len(data))
+        return data
+
+
+class SitemapStreamer:
+    """
+    Streams URLs out of sitemaps without ever holding a whole sitemap in memory.
+
+    Responses are read straight off the socket, gunzipped on the fly when needed
+    and parsed with ``iterparse``; every finished ``<url>``/``<sitemap>`` element
+    is cleared together with its preceding siblings. ``<sitemapindex>`` files are
+    followed recursively (up to ``max_depth``). URLs are handed to ``sink`` in
+    batches of ``batch_size``, so memory stays bounded by the batch size no matter
+    how large the sitemap is. This is blocking code; run it in a worker thread.
+    """
+
+    def __init__(self, sink, batch_size=1000, timeout=30, max_depth=3, session=None):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_depth = max_depth
+        self.session = session or requests.Session()
+
+    def ingest(self, sitemap_urls):
+        """Stream every page URL from the given sitemaps into the sink; return how many were read."""
+        seen_sitemaps = set()
+        batch = []
+        total = 0
+        for url in self._iter_page_urls(list(sitemap_urls), seen_sitemaps, depth=0):
+            batch.append(url)
+            if len(batch) >= self.batch_size:
+                self.sink(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            self.sink(batch)
+            total += len(batch)
+        return total
+
+    def _iter_page_urls(self, sitemap_urls, seen_sitemaps, depth):
+        for sitemap_url in sitemap_urls:
+            if sitemap_url in seen_sitemaps:
+                continue
+            seen_sitemaps.add(sitemap_url)
+
+            child_sitemaps = []
+            try:
+                for kind, loc in self._iter_locs(sitemap_url):
+                    if kind == "url":
+                        yield loc
+                    else:
+                        child_sitemaps.append(loc)  # Index files are small; recurse once this one is closed
+            except (requests.RequestException, etree.XMLSyntaxError, OSError, EOFError) as e:
+                logger.warning(f"⚠️ Failed to read sitemap {sitemap_url}: {e}")
+                continue
+
+            logger.info(f"✅ Read sitemap {sitemap_url} ({len(child_sitemaps)} child sitemaps)")
+            if child_sitemaps and depth < self.max_depth:
+                yield from self._iter_page_urls(child_sitemaps, seen_sitemaps, depth + 1)
+
+    def _iter_locs(self, sitemap_url):
+        """Yield ("url" | "sitemap", loc) pairs while the sitemap streams in."""
+        with self.session.get(sitemap_url, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True  # Undo Content-Encoding: gzip transparently
+            head = response.raw.read(2)
+            stream = PrefixedStream(head, response.raw)
+            if head == GZIP_MAGIC:
+                stream = gzip.GzipFile(fileobj=stream)  # .xml.gz served as a plain file
+
+            context = etree.iterparse(
+                stream,
+                events=("end",),
+                tag=("{*}url", "{*}sitemap"),
+                resolve_entities=False,
+                no_network=True,
+                huge_tree=True,
+            )
+            for _, elem in context:
+                name = etree.QName(elem)
+                # <loc> in the element's own namespace (skips e.g. <image:loc> extensions)
+                loc = elem.findtext(f"{{{name.namespace}}}loc" if name.namespace else "loc")
+                if loc and loc.strip():
+                    yield name.localname, loc.strip()
+
+                # Free the element and everything parsed before it
+                elem.clear()
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
@@ -0,0 +1,271 @@
+import json
+import re
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+from scrapy.http import TextResponse
+
+# Sources, in the order their fields are trusted
+JSON_LD = "json-ld"
+MICRODATA = "microdata"
+OPENGRAPH = "opengraph"
+
+# One pass over the document: JSON-LD blocks, microdata Product scopes and OpenGraph tags
+STRUCTURED_XPATH = (
+    "//script[@type='application/ld+json']"
+    " | //*[@itemscope and contains(@itemtype, 'schema.org/Product')]"
+    " | //meta[starts-with(@property, 'og:') or starts-with(@property, 'product:')]"
+)
+
+# schema.org types of top-level JSON-LD entities that say the page is not one product
+NON_PRODUCT_TYPES = {
+    "ItemList", "CollectionPage", "SearchResultsPage", "OfferCatalog",
+    "Article", "BlogPosting", "NewsArticle", "FAQPage", "AboutPage", "ContactPage",
+}
+
+# Of which these declare a listing: several products there really are several products
+LISTING_TYPES = {"ItemList", "CollectionPage", "SearchResultsPage", "OfferCatalog"}
+
+# Blocks whose products are not what the page is about: "related products" carousels and the like
+SIDE_TAGS = {"nav", "aside", "footer"}
+SIDE_MARKERS = ("related", "recommend", "similar", "upsell", "cross-sell", "crosssell", "carousel", "also-")
+
+PRICE_RE = re.compile(r"[\d.,]+")
+
+# product_links.price is Numeric(12, 2): prices are stored to the cent and must stay below this
+MAX_PRICE = Decimal(10) ** 10
+CENT = Decimal("0.01")
+
+StructuredProduct = namedtuple(
+    "StructuredProduct", ["is_product", "source", "name", "price", "currency", "availability", "reason"]
+)
+NO_EVIDENCE = StructuredProduct(None, None, None, None, None, None, None)
+
+
+def parse_price(value):
+    """
+    A price as a Decimal from a number or a string like "1,299.00", "1.299,00"
+    or "€ 12"; None if unreadable, negative or too large to store (MAX_PRICE).
+    """
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return bounded_price(Decimal(str(value)))
+    match = PRICE_RE.search(str(value))
+    if not match:
+        return None
+    text = match.group().strip(".,")
+    # The last separator is the decimal one when it has one or two digits after it
+    last = max(text.rfind("."), text.rfind(","))
+    if last != -1 and len(text) - last - 1 in (1, 2):
+        text = text[:last].replace(".", "").replace(",", "") + "." + text[last + 1:]
+    else:
+        text = text.replace(".", "").replace(",", "")
+    try:
+        return bounded_price(Decimal(text))
+    except InvalidOperation:
+        return None
+
+
+def bounded_price(price):
+    # Compared before rounding too: quantize fails on numbers with more digits than the context allows
+    if not price.is_finite() or price < 0 or price >= MAX_PRICE or price.quantize(CENT) >= MAX_PRICE:
+        return None
+    return price
+
+
+def short_availability(value):
+    """``https://schema.org/InStock`` -> ``InStock``; other values are kept as given."""
+    if not value:
+        return None
+    return str(value).strip().rstrip("/").rsplit("/", 1)[-1][:32] or None
+
+
+def types_of(entity):
+    types = entity.get("@type") or []
+    types = types if isinstance(types, list) else [types]
+    return {str(t).rsplit("/", 1)[-1] for t in types}
+
+
+def first(value):
+    return value[0] if isinstance(value, list) and value else value
+
+
+def json_ld_entities(text):
+    """Top-level entities of a JSON-LD block: the block itself, its @graph and a WebPage's mainEntity."""
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return []
+    entities = []
+    for entity in data if isinstance(data, list) else [data]:
+        if not isinstance(entity, dict):
+            continue
+        graph = entity.get("@graph")
+        for member in (graph if isinstance(graph, list) else [entity]):
+            if isinstance(member, dict):
+                entities.append(member)
+                if isinstance(member.get("mainEntity"), dict):
+                    entities.append(member["mainEntity"])
+    return entities
+
+
+def json_ld_fields(product):
+    offer = first(product.get("offers")) or {}
+    if not isinstance(offer, dict):
+        offer = {}
+    spec = first(offer.get("priceSpecification")) or {}
+    price = offer.get("price", offer.get("lowPrice"))
+    if price is None and isinstance(spec, dict):
+        price = spec.get("price")
+    currency = offer.get("priceCurrency") or (spec.get("priceCurrency") if isinstance(spec, dict) else None)
+    name = first(product.get("name"))
+    return {
+        "name": str(name).strip() if name else None,
+        "price": parse_price(price),
+        "currency": str(currency).strip().upper()[:3] if currency else None,
+        "availability": short_availability(first(offer.get("availability"))),
+    }
+
+
+def microdata_properties(scope):
+    """itemprop -> element of a microdata scope, descending into its Offer but not other nested scopes."""
+    properties = {}
+    stack = list(reversed(scope))
+    while stack:
+        element = stack.pop()
+        prop = element.get("itemprop")
+        if prop and prop not in properties:
+            properties[prop] = element
+        nested = "itemscope" in element.attrib
+        if not nested or prop == "offers":
+            stack.extend(reversed(element))
+    return properties
+
+
+def microdata_value(element):
+    if element is None:
+        return None
+    for attribute in ("content", "href", "src"):
+        if element.get(attribute):
+            return element.get(attribute).strip()
+    return " ".join("".join(element.itertext()).split()) or None
+
+
+def microdata_fields(scope):
+    properties = microdata_properties(scope)
+    currency = microdata_value(properties.get("priceCurrency"))
+    return {
+        "name": microdata_value(properties.get("name")),
+        "price": parse_price(microdata_value(properties.get("price")) or microdata_value(properties.get("lowPrice"))),
+        "currency": currency.upper()[:3] if currency else None,
+        "availability": short_availability(microdata_value(properties.get("availability"))),
+    }
+
+
+def in_side_block(element):
+    """Whether a microdata scope sits in navigation, an aside or a related-products block."""
+    for parent in element.iterancestors():
+        if parent.tag in SIDE_TAGS:
+            return True
+        marker = f"{parent.get('class') or ''} {parent.get('id') or ''}".lower()
+        if any(word in marker for word in SIDE_MARKERS):
+            return True
+    return False
+
+
+def main_product(found):
+    """
+    The product a page declaring several is about: the only one with a price
+    outside side blocks, else the only one outside side blocks. None when it
+    cannot be told apart from the others.
+    """
+    own = [fields for fields, side in found if not side]
+    priced = [fields for fields in own if fields["price"] is not None]
+    for group in (priced, own):
+        if len(group) == 1:
+            return group[0]
+    return None
+
+
+def extract_product(response):
+    """
+    Confirm or reject a page as one product from its JSON-LD, microdata and
+    OpenGraph markup, in one pass over the static HTML.
+
+    A page is a product when exactly one schema.org Product is declared by JSON-LD
+    or microdata, or when ``og:type`` is ``product``. Of several products, the
+    main one (see main_product) stands for the page, so a "related products"
+    carousel does not hide the product it sits next to. Side blocks are only
+    recognised around microdata scopes; JSON-LD carries no page position, so its
+    products never count as side products. A page declaring a listing type
+    (LISTING_TYPES) gets no product from JSON-LD or microdata, however many it
+    lists. It is rejected when its markup describes something else: several
+    products and no main one (a listing), a top-level JSON-LD entity of a
+    NON_PRODUCT_TYPES type, or ``og:type`` ``article``.
+    Without any of these, ``is_product`` is None and the URL rules decide.
+    Fields are taken from JSON-LD first, then microdata, then OpenGraph.
+    """
+    if not isinstance(response, TextResponse):
+        return NO_EVIDENCE
+    products = {JSON_LD: [], MICRODATA: []}
+    other_types = set()
+    og = {}
+    for element in response.selector.root.xpath(STRUCTURED_XPATH):
+        if element.tag == "script":
+            for entity in json_ld_entities(element.text or ""):
+                types = types_of(entity)
+                if types & {"Product", "ProductGroup", "IndividualProduct"}:
+                    products[JSON_LD].append((json_ld_fields(entity), False))  # Never a side product
+                else:
+                    other_types |= types & NON_PRODUCT_TYPES
+        elif element.tag == "meta":
+            og.setdefault(element.get("property"), (element.get("content") or "").strip())
+        elif not any("schema.org/Product" in (parent.get("itemtype") or "") for parent in element.iterancestors()):
+            products[MICRODATA].append((microdata_fields(element), in_side_block(element)))
+
+    og_type = og.get("og:type", "").lower()
+    og_fields = {
+        "name": og.get("og:title") or None,
+        "price": parse_price(og.get("product:price:amount") or og.get("og:price:amount")),
+        "currency": (og.get("product:price:currency") or og.get("og:price:currency") or "").upper()[:3] or None,
+        "availability": short_availability(og.get("product:availability") or og.get("og:availability")),
+    }
+
+    # Products declared under several names (e.g. variants) count once, as a side product only if always one
+    for source in products:
+        distinct = {}
+        for fields, side in products[source]:
+            key = (fields["name"], fields["price"])
+            if key in distinct:
+                side = side and distinct[key][1]
+            distinct[key] = (fields, side)
+        products[source] = list(distinct.values())
+
+    listing_declared = bool(other_types & LISTING_TYPES)
+    candidates = []
+    for source, found in products.items():
+        if listing_declared or not found:
+            continue
+        main = found[0][0] if len(found) == 1 else main_product(found)
+        if main:
+            candidates.append((source, main))
+    if og_type in ("product", "og:product", "product.item"):
+        candidates.append((OPENGRAPH, og_fields))
+    if candidates:
+        source = candidates[0][0]
+        merged = {}
+        for _, fields in candidates:
+            for key, value in fields.items():
+                if merged.get(key) is None:
+                    merged[key] = value
+        return StructuredProduct(True, source, reason=None, **merged)
+
+    listing = next((source for source, found in products.items() if len(found) > 1), None)
+    if listing:
+        return StructuredProduct(False, listing, None, None, None, None, f"{len(products[listing])} products")
+    if other_types:
+        return StructuredProduct(False, JSON_LD, None, None, None, None, ", ".join(sorted(other_types)))
+    if og_type == "article":
+        return StructuredProduct(False, OPENGRAPH, None, None, None, None, "og:type article")
+    return NO_EVIDENCE
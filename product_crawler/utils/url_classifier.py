@@ -0,0 +1,131 @@
+import json
+import re
+from collections import namedtuple
+from urllib.parse import urlparse
+
+# Rule name -> pattern. Names show up in Classification results, so keep them stable.
+DEFAULT_INCLUDE_RULES = {
+    "product_path": r"/product/[\w-]+",      # /product/iphone-13
+    "p_path": r"/p/[\w-]+",                  # /p/iphone-13
+    "item_path": r"/item/[\w-]+",            # /item/12345
+    "dp_path": r"/dp/[\w-]+",                # Amazon-style /dp/B09G3HRMVS
+    "store_path": r"/store/[\w-]+",          # /store/shoes
+    "products_path": r"/products/[\w-]+",    # /products/laptop
+    "product_id_param": r"\?product_id=\d+",  # ?product_id=12345
+    "sku_param": r"\?sku=[\w-]+",            # ?sku=ABC123
+}
+
+# Exclude common non-product pages
+DEFAULT_EXCLUDE_RULES = {
+    "cart": r"/cart",
+    "checkout": r"/checkout",
+    "login": r"/login",
+    "register": r"/register",
+    "search": r"/search",
+    "category": r"/category",
+    "shop_root": r"/shop$",
+    "collections": r"/collections",
+}
+
+Classification = namedtuple("Classification", ["url", "is_product", "include_rule", "exclude_rule"])
+
+
+def compile_rules(rules):
+    """Combine a {name: pattern} mapping into one alternation with a named group per rule."""
+    if not rules:
+        return None
+    groups = [f"(?P<{name}>{pattern})" for name, pattern in rules.items()]
+    return re.compile("|".join(groups), re.IGNORECASE)
+
+
+class RuleSet:
+    """Precompiled include/exclude alternations for one domain."""
+
+    def __init__(self, include_rules, exclude_rules):
+        self.include_rules = dict(include_rules)
+        self.exclude_rules = dict(exclude_rules)
+        self.include_re = compile_rules(self.include_rules)
+        self.exclude_re = compile_rules(self.exclude_rules)
+
+    def classify(self, url):
+        include = self.include_re.search(url) if self.include_re else None
+        if not include:
+            return Classification(url, False, None, None)
+
+        exclude = self.exclude_re.search(url) if self.exclude_re else None
+        if exclude:
+            return Classification(url, False, include.lastgroup, exclude.lastgroup)
+        return Classification(url, True, include.lastgroup, None)
+
+
+class UrlClassifier:
+    """
+    Labels URLs as product pages using one combined regex per rule kind.
+
+    Domain overrides look like::
+
+        {"shop.example.com": {"include": {"ref_param": "\\\\?ref=\\\\d+"},
+                              "exclude": {"store_path": null},
+                              "inherit": true}}
+
+    With ``inherit`` (the default) the override is merged over the default
+    rules, and a ``null`` pattern removes a default rule for that domain.
+    """
+
+    def __init__(self, domain_rules=None, include_rules=None, exclude_rules=None):
+        self.default_rules = RuleSet(
+            DEFAULT_INCLUDE_RULES if include_rules is None else include_rules,
+            DEFAULT_EXCLUDE_RULES if exclude_rules is None else exclude_rules,
+        )
+        self.domain_rules = {}
+        for domain, override in (domain_rules or {}).items():
+            self.domain_rules[domain.lower()] = self._build_override(override)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build a classifier from PRODUCT_URL_RULES and/or a PRODUCT_URL_RULES_FILE JSON file."""
+        domain_rules = dict(settings.getdict("PRODUCT_URL_RULES"))
+        rules_file = settings.get("PRODUCT_URL_RULES_FILE")
+        if rules_file:
+            with open(rules_file) as f:
+                domain_rules.update(json.load(f))
+        return cls(domain_rules)
+
+    def _build_override(self, override):
+        include, exclude = {}, {}
+        if override.get("inherit", True):
+            include.update(self.default_rules.include_rules)
+            exclude.update(self.default_rules.exclude_rules)
+        for rules, updates in ((include, override.get("include", {})), (exclude, override.get("exclude", {}))):
+            for name, pattern in updates.items():
+                if pattern is None:
+                    rules.pop(name, None)
+                else:
+                    rules[name] = pattern
+        return RuleSet(include, exclude)
+
+    def rules_for(self, url):
+        domain = urlparse(url).netloc.lower()
+        return self.domain_rules.get(domain, self.default_rules)
+
+    def classify_url(self, url):
+        """Classify a single URL."""
+        return self.rules_for(url).classify(url)
+
+    def classify(self, urls):
+        """Classify a page's whole link set, resolving each domain's rules only once."""
+        rule_cache = {}
+        results = []
+        for url in urls:
+            domain = urlparse(url).netloc.lower()
+            rules = rule_cache.get(domain)
+            if rules is None:
+                rules = rule_cache[domain] = self.domain_rules.get(domain, self.default_rules)
+            results.append(rules.classify(url))
+        return results
+
+    def is_product_url(self, url):
+        return self.classify_url(url).is_product
+
+
+default_classifier = UrlClassifier()
@@ -1,10 +1,5 @@
-import re
+from product_crawler.utils.url_classifier import default_classifier
 
-PRODUCT_PATTERNS = [
-    r"/product/.*",
-    r"/p/.*",
-    r"/item/.*",
-]
 
 def is_product_url(url):
-    return any(re.search(pattern, url) for pattern in PRODUCT_PATTERNS)
+    return default_classifier.is_product_url(url)
@@ -0,0 +1,207 @@
+import time
+from collections import Counter
+
+from product_crawler.utils.link_scorer import url_pattern
+
+# Per-template counters, stored as "<template>|<field>" in one Redis hash
+FIELDS = ("admitted", "products", "pages", "found", "dropped")
+
+# Template statuses, in the order template_status checks them
+PRODUCT = "product"  # Mostly product links: never capped
+CAPPED = "capped"  # Admits no more URLs
+LEARNING = "learning"  # Too few pages crawled to judge
+PRODUCTIVE = "productive"
+LOW_YIELD = "low_yield"  # Still admitted, behind everything else
+
+
+def template_status(counts, policy):
+    """Status of a template from its counters and the budget policy (both dicts)."""
+    admitted = counts["admitted"]
+    if admitted and counts["products"] * 2 > admitted:
+        return PRODUCT
+    if policy["max_urls"] and admitted >= policy["max_urls"]:
+        return CAPPED
+    if counts["pages"] < policy["min_pages"]:
+        return LEARNING
+    if counts["found"] / counts["pages"] >= policy["min_yield"]:
+        return PRODUCTIVE
+    if admitted >= policy["low_yield_urls"]:
+        return CAPPED
+    return LOW_YIELD
+
+
+def parse_counts(fields):
+    """Group "<template>|<field>" hash entries into {template: {field: count}}."""
+    templates = {}
+    for name, value in fields.items():
+        template, _, field = name.rpartition("|")
+        if field in FIELDS:
+            templates.setdefault(template, dict.fromkeys(FIELDS, 0))[field] = int(value)
+    return templates
+
+
+def read_templates(redis_client, key="templates"):
+    """
+    Every template of the crawl living under ``key``, with its counters, yield
+    and status under the policy its workers enforce, most admitted first.
+    Returns (policy, templates); policy is None if no worker has run yet.
+    """
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hgetall(key)
+    pipe.hgetall(f"{key}:policy")
+    fields, stored_policy = pipe.execute()
+    if not stored_policy:
+        return None, []
+    policy = {
+        name: int(value) if value.lstrip("-").isdigit() else float(value) for name, value in stored_policy.items()
+    }
+
+    templates = []
+    for template, counts in parse_counts(fields).items():
+        templates.append({
+            "template": template,
+            **counts,
+            "yield": round(counts["found"] / counts["pages"], 3) if counts["pages"] else None,
+            "status": template_status(counts, policy),
+        })
+    templates.sort(key=lambda row: (-row["admitted"], row["template"]))
+    return policy, templates
+
+
+class TemplateBudget:
+    """
+    Clusters admitted URLs into templates and stops templates that no longer lead to products.
+
+    A URL's template is its ``url_pattern`` (``shop.com/events/*/*?view``), the
+    clustering the link scorer also uses, so calendars, endless ``?page=N`` chains
+    and parameter permutations each collapse into a few templates. A Redis hash
+    shared by all workers counts per template the URLs admitted, how many of them
+    are product links, pages crawled, the new product links those pages found and
+    the URLs dropped by the budget.
+
+    Once ``min_pages`` pages of a template were crawled, a template finding fewer
+    than ``min_yield`` new product links per page is low-yield: its links get
+    ``penalty`` added to their priority, and are dropped once the template has
+    admitted ``low_yield_urls`` URLs. ``max_urls`` caps every template (0: no
+    cap). Templates that are mostly product links are never capped; they are what
+    the crawl is for.
+
+    Counters are buffered and synced with Redis every ``sync_interval`` seconds
+    rather than on every page, so caps can overshoot by what all workers admit in
+    one interval.
+    """
+
+    def __init__(self, redis_client, key="templates", min_pages=20, min_yield=0.1, low_yield_urls=100,
+                 max_urls=0, penalty=-5.0, sync_interval=2.0, enabled=True):
+        self.redis_client = redis_client
+        self.key = key
+        self.policy = {
+            "min_pages": min_pages,
+            "min_yield": min_yield,
+            "low_yield_urls": low_yield_urls,
+            "max_urls": max_urls,
+            "penalty": penalty,
+        }
+        self.sync_interval = sync_interval
+        self.enabled = enabled
+        self.shared = {}  # template -> counters as of the last sync
+        self.pending = Counter()  # "<template>|<field>" increments not written to Redis yet
+        self.synced_at = None
+
+    @classmethod
+    def from_settings(cls, redis_client, settings, key_prefix=""):
+        return cls(
+            redis_client,
+            key=f"{key_prefix}templates",
+            min_pages=settings.getint("TEMPLATE_BUDGET_MIN_PAGES", 20),
+            min_yield=settings.getfloat("TEMPLATE_BUDGET_MIN_YIELD", 0.1),
+            low_yield_urls=settings.getint("TEMPLATE_BUDGET_LOW_YIELD_URLS", 100),
+            max_urls=settings.getint("TEMPLATE_BUDGET_MAX_URLS", 0),
+            penalty=settings.getfloat("TEMPLATE_BUDGET_PENALTY", -5.0),
+            sync_interval=settings.getfloat("TEMPLATE_BUDGET_SYNC_INTERVAL", 2.0),
+            enabled=settings.getbool("TEMPLATE_BUDGET_ENABLED", True),
+        )
+
+    def counts(self, template):
+        shared = self.shared.get(template)
+        return {
+            field: (shared[field] if shared else 0) + self.pending[f"{template}|{field}"]
+            for field in FIELDS
+        }
+
+    def status(self, url):
+        return template_status(self.counts(url_pattern(url)), self.policy)
+
+    def admissible(self, urls):
+        """The URLs whose template may still admit links; the others are counted as dropped."""
+        if not self.enabled:
+            return list(urls)
+        self.maybe_sync()
+        allowed = []
+        batch = {}  # Counters including the URLs of this batch allowed so far
+        for url in urls:
+            template = url_pattern(url)
+            if template not in batch:
+                batch[template] = self.counts(template)
+            counts = batch[template]
+            if template_status(counts, self.policy) == CAPPED:
+                self.pending[f"{template}|dropped"] += 1
+            else:
+                counts["admitted"] += 1
+                allowed.append(url)
+        return allowed
+
+    def adjust(self, priorities):
+        """Add the low-yield penalty to the priorities (a dict, changed in place) of low-yield templates."""
+        if not self.enabled:
+            return priorities
+        for url in priorities:
+            if self.status(url) == LOW_YIELD:
+                priorities[url] += self.policy["penalty"]
+        return priorities
+
+    def record_admitted(self, urls, product_urls=()):
+        if not self.enabled:
+            return
+        for url in urls:
+            self.pending[f"{url_pattern(url)}|admitted"] += 1
+        for url in product_urls:
+            self.pending[f"{url_pattern(url)}|products"] += 1
+
+    def record_page(self, url, new_products):
+        """Count a crawled page and the new product links it found against its template."""
+        if not self.enabled:
+            return
+        template = url_pattern(url)
+        self.pending[f"{template}|pages"] += 1
+        self.pending[f"{template}|found"] += new_products
+
+    def maybe_sync(self):
+        if self.synced_at is None or time.monotonic() - self.synced_at >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """Write buffered counters and read back the shared counters of every template seen, in one round-trip."""
+        templates = sorted(set(self.shared) | {name.rpartition("|")[0] for name in self.pending})
+        pipe = self.redis_client.pipeline(transaction=False)
+        if self.synced_at is None:
+            pipe.hset(f"{self.key}:policy", mapping=self.policy)  # Lets the API report statuses
+        for name, count in self.pending.items():
+            if count:
+                pipe.hincrby(self.key, name, count)
+        fields = [f"{template}|{field}" for template in templates for field in FIELDS]
+        if fields:
+            pipe.hmget(self.key, fields)
+        results = pipe.execute()
+        self.pending.clear()
+        self.synced_at = time.monotonic()
+        if fields:
+            values = iter(results[-1])
+            self.shared = {
+                template: {field: int(next(values) or 0) for field in FIELDS} for template in templates
+            }
+
+    def flush(self):
+        """Write buffered counters now."""
+        if self.enabled and self.pending:
+            self.sync()